@@ -0,0 +1,79 @@
+"""Routing of database reads to a read replica.
+
+If the ``replica`` database is configured (see ``SS_DB_READ_REPLICA_URL``),
+the reads made inside ``use_read_replica`` go to it, e.g. in the views
+decorated with ``common.decorators.read_replica``. Everything else uses the
+``default`` database.
+
+To read what was written in the same request, reads go back to the
+``default`` database once a write has been made inside
+``use_read_replica``, or while a transaction is open. Writes made by
+other requests may take a while to reach the replica, depending on its
+replication lag.
+"""
+
+import contextlib
+import contextvars
+
+from django.db import DEFAULT_DB_ALIAS
+from django.db import connections
+
+REPLICA_DB_ALIAS = "replica"
+
+_state = contextvars.ContextVar("read_replica_state", default=None)
+
+
+class _ReadReplicaState:
+    def __init__(self):
+        self.written = False
+
+
+@contextlib.contextmanager
+def use_read_replica(state=None):
+    """Send the reads made in this context to the read replica until a write
+    is made. ``state`` can be used to continue a previous context, e.g. while
+    a streaming response is consumed.
+    """
+    if state is None:
+        state = _ReadReplicaState()
+    token = _state.set(state)
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+
+
+class ReadReplicaRouter:
+    """Database router for the ``replica`` database, see the module
+    docstring.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if (
+            state is None
+            or state.written
+            or REPLICA_DB_ALIAS not in connections.databases
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return None
+        return REPLICA_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.written = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same data as the default database.
+        databases = {DEFAULT_DB_ALIAS, REPLICA_DB_ALIAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is migrated by replicating the default database.
+        if db == REPLICA_DB_ALIAS:
+            return False
+        return None
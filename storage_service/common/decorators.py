@@ -2,6 +2,8 @@ from functools import wraps
 
 from django.shortcuts import render
 
+from common import db_routers
+
 
 # Requires confirmation from a prompt page before executing a request
 # (see http://djangosnippets.org/snippets/1922/)
@@ -49,3 +51,37 @@ def confirm_required(template_name, context_creator, key="__confirm__"):
         return wraps(func)(inner)
 
     return decorator
+
+
+def read_replica(view):
+    """
+    Decorator for views that only read from the database. The reads made by
+    safe (GET, HEAD or OPTIONS) requests go to the read replica database, if
+    it is configured, until the view writes to the database. See
+    ``common.db_routers``.
+    """
+
+    @wraps(view)
+    def inner(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD", "OPTIONS"):
+            return view(request, *args, **kwargs)
+        with db_routers.use_read_replica() as state:
+            response = view(request, *args, **kwargs)
+        if getattr(response, "streaming", False):
+            response.streaming_content = _stream_from_read_replica(
+                response.streaming_content, state
+            )
+        return response
+
+    return inner
+
+
+def _stream_from_read_replica(streaming_content, state):
+    # Streaming responses are consumed after the view returns.
+    iterator = iter(streaming_content)
+    while True:
+        with db_routers.use_read_replica(state):
+            chunk = next(iterator, None)
+        if chunk is None:
+            return
+        yield chunk
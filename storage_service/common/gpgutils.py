@@ -8,6 +8,7 @@ manage (i.e., list, created, import, delete) GPG keys.
 
 """
 
+import copy
 import logging
 from pathlib import Path
 from shutil import which
@@ -221,6 +222,55 @@ def gpg_decrypt_file(path, decr_path):
         return gpg().decrypt_file(stream, output=decr_path)
 
 
+def gpg_decrypt_stream(path, on_data, stop=None):
+    """Use GPG to decrypt the file at ``path`` without writing or buffering
+    the decrypted data: each chunk read from GPG is passed to ``on_data`` as
+    it is produced, followed by an empty chunk once GPG is done. ``on_data``
+    is called from a separate thread and should return ``False``.
+
+    Once the ``threading.Event`` ``stop`` is set, GPG is fed no more of the
+    file, so it stops early and the decryption fails.
+    """
+    # A copy of the shared instance so ``on_data`` does not leak into other
+    # calls to GPG.
+    decrypter = copy.copy(gpg())
+    decrypter.on_data = on_data
+    with Path(path).open("rb") as stream:
+        if stop is not None:
+            stream = _StoppableReader(stream, stop)
+        return decrypter.decrypt_file(stream)
+
+
+class _StoppableReader:
+    """Reads from ``stream`` until the ``stop`` event is set, and then reads
+    as if the end of ``stream`` was reached.
+    """
+
+    def __init__(self, stream, stop):
+        self._stream = stream
+        self._stop = stop
+
+    def read(self, size=-1):
+        if self._stop.is_set():
+            return b""
+        return self._stream.read(size)
+
+
+def gpg_encrypt_stream(stream, encr_path, recipient_fingerprint):
+    """Use GPG to encrypt the data read from the file-like object ``stream``
+    (e.g., the stdout of a pipe) into ``encr_path``, making it decryptable
+    only with the key with fingerprint ``recipient_fingerprint``. Returns the
+    Python-GnuPG encryption result <gnupg.Crypt> object.
+    """
+    return gpg().encrypt_file(
+        stream,
+        [recipient_fingerprint],
+        armor=False,
+        always_trust=True,  # so we can use imported keys
+        output=encr_path,
+    )
+
+
 def gpg_encrypt_file(path, recipient_fingerprint):
     """Use GPG to encrypt the file at ``path`` and make it decryptable only
     with the key with fingerprint ``recipient_fingerprint``. The encrypted file
@@ -229,11 +279,5 @@ def gpg_encrypt_file(path, recipient_fingerprint):
     """
     encr_path = path + ".gpg"
     with Path(path).open("rb") as stream:
-        result = gpg().encrypt_file(
-            stream,
-            [recipient_fingerprint],
-            armor=False,
-            always_trust=True,  # so we can use imported keys
-            output=encr_path,
-        )
+        result = gpg_encrypt_stream(stream, encr_path, recipient_fingerprint)
     return encr_path, result
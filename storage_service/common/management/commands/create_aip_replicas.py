@@ -8,36 +8,84 @@ If an AIP Store location is not specified with the --location argument,
 the task will create replicas for all AIPs in the default AIP Storage
 location.
 
+AIPs are not replicated to the Replicator locations that already hold a
+replica of them, unless the -d/--delete argument is used.
+
+AIPs are replicated by --jobs concurrent workers. When the --checkpoint-file
+argument is used, the UUIDs of the AIPs that were replicated are added to
+that file along with the UUIDs of the Replicator locations they were
+replicated to, and AIPs are not replicated again to the locations it lists
+for them. An interrupted run can be resumed by running the command again with
+the same checkpoint file.
+
+The --bandwidth-limit argument limits the average rate, in MB per second, at
+which AIPs are replicated to each Replicator location. With the --plan
+argument, the command only reports the number and total size of the AIPs
+that would be replicated to each Replicator location, and the time it would
+take at that rate.
+
 Execution example:
 ./manage.py create_aip_replicas --location <UUID>
 """
 
+import concurrent.futures
+import datetime
 import logging
+import pathlib
+import threading
+import time
 
 from administration.models import Settings
 from django.core.management.base import CommandError
+from django.db import connection
+from locations.models.location import Location
 from locations.models.package import Package
 
 from common.management.commands import StorageServiceCommand
 
-# Suppress the logging from models/package.py.
-logging.config.dictConfig({"version": 1, "disable_existing_loggers": True})
+# Replication rate, in MB per second, used to estimate replication times in
+# --plan mode when no --bandwidth-limit is given.
+ESTIMATED_THROUGHPUT = 100
 
 
 class ReplicaDeleteException(Exception):
     pass
 
 
-def get_replica_count(aip_uuid):
-    """Return number of replicas for given AIP
+class BandwidthLimiter:
+    """Limit the average rate at which packages are copied to a location by
+    delaying the start of each copy until the previous ones would have been
+    copied at ``rate`` bytes per second.
+    """
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.next_start = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, size):
+        """Reserve the bandwidth to copy ``size`` bytes and return the
+        number of seconds to wait before copying them.
+        """
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_start)
+            self.next_start = start + size / self.rate
+        return start - now
+
+
+def get_replica_locations(aip_uuid):
+    """Return the locations of the replicas of given AIP
 
     :param aip_uuid: AIP UUID
 
-    :returns: Number of replicas (int)
+    :returns: Dict of replica UUIDs to the UUIDs of their locations
     """
-    return Package.objects.filter(
-        replicated_package=aip_uuid, status=Package.UPLOADED
-    ).count()
+    return dict(
+        Package.objects.filter(
+            replicated_package=aip_uuid, status=Package.UPLOADED
+        ).values_list("uuid", "current_location")
+    )
 
 
 class Command(StorageServiceCommand):
@@ -67,8 +115,36 @@ class Command(StorageServiceCommand):
             help="UUID for Replicator location to create replicas"
             " Defaults to all configured Replicators for AIP Store.",
         )
+        parser.add_argument(
+            "--jobs",
+            type=int,
+            default=1,
+            help="Number of AIPs to replicate concurrently. Defaults to 1.",
+        )
+        parser.add_argument(
+            "--checkpoint-file",
+            help="File recording the AIPs that have been replicated, which"
+            " are skipped when the command is run again.",
+            default=None,
+        )
+        parser.add_argument(
+            "--plan",
+            action="store_true",
+            help="Report the AIPs that would be replicated to each Replicator"
+            " location and the estimated time, without replicating them.",
+        )
+        parser.add_argument(
+            "--bandwidth-limit",
+            type=float,
+            default=None,
+            help="Maximum average rate, in MB per second, at which AIPs are"
+            " replicated to each Replicator location.",
+        )
 
     def handle(self, *args, **options):
+        # Suppress the logging from models/package.py.
+        logging.config.dictConfig({"version": 1, "disable_existing_loggers": True})
+
         delete_existing_replicas = False
         if options["delete"]:
             delete_existing_replicas = True
@@ -97,56 +173,183 @@ class Command(StorageServiceCommand):
         if not aips:
             raise CommandError(f"No AIPs to replicate in location {aip_store_uuid}")
 
-        aips_count = len(aips)
-        success_count = 0
-        deleted_count = 0
-
-        self.info(f"AIPs to replicate: {aips_count}")
+        replicators = Location.objects.get(uuid=aip_store_uuid).replicators.all()
+        if replicator_uuid:
+            replicators = replicators.filter(uuid=replicator_uuid)
+        replicators = list(replicators)
+
+        # Pairs of AIP and Replicator location UUIDs already replicated.
+        replicated = set()
+        checkpoint_file = options["checkpoint_file"]
+        if checkpoint_file:
+            checkpoint_file = pathlib.Path(checkpoint_file)
+            if checkpoint_file.exists():
+                replicated = {
+                    tuple(line.split())
+                    for line in checkpoint_file.read_text().splitlines()
+                    if line.strip()
+                }
+        if not delete_existing_replicas:
+            replicated.update(
+                (str(aip_uuid), str(location_uuid))
+                for aip_uuid, location_uuid in Package.objects.filter(
+                    replicated_package__in=aips,
+                    current_location__in=replicators,
+                    status=Package.UPLOADED,
+                ).values_list("replicated_package", "current_location")
+            )
 
+        # AIPs and the Replicator locations they are still to be replicated to.
+        pending = []
         for aip in aips:
-            if delete_existing_replicas:
-                self.info(f"Deleting existing replicas of AIP {aip.uuid}")
-                aip_deleted_replicas_count = self._delete_replicas(
-                    aip.uuid, replicator_uuid
-                )
-                deleted_count += aip_deleted_replicas_count
+            aip_replicators = [
+                replicator
+                for replicator in replicators
+                if (str(aip.uuid), str(replicator.uuid)) not in replicated
+            ]
+            if aip_replicators:
+                pending.append((aip, aip_replicators))
+        if len(pending) < len(aips):
+            self.info(f"AIPs already replicated: {len(aips) - len(pending)}")
+
+        bandwidth_limit = options["bandwidth_limit"]
+        if options["plan"]:
+            self._plan(pending, replicators, bandwidth_limit or ESTIMATED_THROUGHPUT)
+            return
+
+        aips_count = len(pending)
+        self.success_count = 0
+        self.deleted_count = 0
+        self.lock = threading.Lock()
+        self.limiters = {}
+        if bandwidth_limit:
+            self.limiters = {
+                replicator.uuid: BandwidthLimiter(bandwidth_limit * 10**6)
+                for replicator in replicators
+            }
 
-            replicas_initial_count = get_replica_count(aip.uuid)
+        self.info(f"AIPs to replicate: {aips_count}")
 
-            self.info(f"Creating new replicas for AIP {aip.uuid}")
-            aip.create_replicas(replicator_uuid=replicator_uuid, delete_replicas=False)
+        def replicate(item):
+            aip, aip_replicators = item
+            self._replicate_aip(
+                aip, aip_replicators, delete_existing_replicas, checkpoint_file
+            )
 
-            # Validate that new replicas were created.
-            replicas_count = get_replica_count(aip.uuid)
-            if not replicas_count > replicas_initial_count:
-                self.error(f"Replicas not created for AIP {aip.uuid}")
-                continue
+        jobs = options["jobs"]
+        if jobs <= 1:
+            for item in pending:
+                replicate(item)
+        else:
 
-            self.info(f"AIP {aip.uuid} successfully replicated")
-            success_count += 1
+            def run(item):
+                try:
+                    replicate(item)
+                finally:
+                    # Threads get their own database connection.
+                    connection.close()
+
+            with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+                for future in [executor.submit(run, item) for item in pending]:
+                    future.result()
 
         self.success(
-            f"Replica creation complete. {deleted_count} existing replicas deleted. "
-            f"New replicas created for {success_count} of {aips_count} AIPs in location."
+            f"Replica creation complete. {self.deleted_count} existing replicas deleted. "
+            f"New replicas created for {self.success_count} of {aips_count} AIPs in location."
         )
 
-    def _delete_replicas(self, aip_uuid, replicator_uuid):
+    def _plan(self, pending, replicators, throughput):
+        """Report the number and total size of the AIPs to replicate to each
+        Replicator location, and the time it would take at ``throughput`` MB
+        per second.
+        """
+        for replicator in replicators:
+            aips = [
+                aip for aip, aip_replicators in pending if replicator in aip_replicators
+            ]
+            total_size = sum(aip.size or 0 for aip in aips)
+            estimated_time = datetime.timedelta(
+                seconds=round(total_size / (throughput * 10**6))
+            )
+            self.info(
+                f"Replicator location {replicator.uuid}: {len(aips)} AIPs,"
+                f" {total_size} bytes, estimated time {estimated_time}"
+                f" at {throughput} MB/s"
+            )
+        self.success(f"Replication plan complete. AIPs to replicate: {len(pending)}")
+
+    def _replicate_aip(
+        self, aip, replicators, delete_existing_replicas, checkpoint_file
+    ):
+        """Create the replicas of ``aip`` in the ``replicators`` locations,
+        deleting its existing ones there first if ``delete_existing_replicas``
+        is set.
+        """
+        if delete_existing_replicas:
+            self.info(f"Deleting existing replicas of AIP {aip.uuid}")
+            aip_deleted_replicas_count = self._delete_replicas(aip.uuid, replicators)
+            with self.lock:
+                self.deleted_count += aip_deleted_replicas_count
+
+        initial_replicas = get_replica_locations(aip.uuid)
+
+        delay = max(
+            (
+                self.limiters[replicator.uuid].reserve(aip.size or 0)
+                for replicator in replicators
+                if replicator.uuid in self.limiters
+            ),
+            default=0,
+        )
+        if delay > 0:
+            time.sleep(delay)
+
+        self.info(f"Creating new replicas for AIP {aip.uuid}")
+        error = None
+        try:
+            aip.replicate_to(replicators)
+        except Exception as err:
+            error = err
+
+        # Record the replicas that were created, even if others failed.
+        replicated_locations = {
+            location_uuid
+            for replica_uuid, location_uuid in get_replica_locations(aip.uuid).items()
+            if replica_uuid not in initial_replicas
+        }
+        if checkpoint_file and replicated_locations:
+            with self.lock, checkpoint_file.open("a") as f:
+                for location_uuid in replicated_locations:
+                    f.write(f"{aip.uuid} {location_uuid}\n")
+
+        if error is not None:
+            self.error(f"Unable to replicate AIP {aip.uuid}. Details: {error}")
+            return
+
+        # Validate that new replicas were created.
+        if len(replicated_locations) < len(replicators):
+            self.error(f"Replicas not created for AIP {aip.uuid}")
+            return
+
+        self.info(f"AIP {aip.uuid} successfully replicated")
+        with self.lock:
+            self.success_count += 1
+
+    def _delete_replicas(self, aip_uuid, replicators):
         """Delete all existing replicas of an AIP
 
         :param aip_uuid: UUID of AIP whose replicas we are deleting.
-        :param replicator_uuid: UUID of Replicator in which to delete AIP
+        :param replicators: Replicator locations in which to delete AIP
             replicas.
 
         :returns: Number of replicas deleted (int)
         """
         deleted_count = 0
         existing_replicas = Package.objects.filter(
-            replicated_package=aip_uuid, status=Package.UPLOADED
-        ).all()
-        if replicator_uuid:
-            existing_replicas = existing_replicas.filter(
-                current_location__uuid=replicator_uuid
-            )
+            replicated_package=aip_uuid,
+            status=Package.UPLOADED,
+            current_location__in=replicators,
+        )
         for replica in existing_replicas:
             try:
                 self._delete_replica(replica)
@@ -10,19 +10,31 @@ used, uncompresed AIPs in remote storage locations (e.g. S3) will be downloaded
 and the hash computed. Otherwise, only locally stored uncompressed AIPs will
 have the Package.checksum and Package.checksum_algorithm fields populated.
 
+AIPs that already have a checksum are skipped unless the --force argument is
+used, so an interrupted run resumes where it stopped. With --jobs N, N
+uncompressed AIPs are downloaded and hashed concurrently.
+
 Execution example:
 ./manage.py populate_aip_checksums
 """
 
+import collections
+import concurrent.futures
 import pathlib
+import time
 
 from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import Q
 from locations.models.package import Package
 from locations.models.package import Space
 
 from common import utils
 from common.management.commands import StorageServiceCommand
 
+# Number of AIPs whose checksums are saved to the database at once.
+BATCH_SIZE = 100
+
 
 class Command(StorageServiceCommand):
     help = __doc__
@@ -40,6 +52,18 @@ class Command(StorageServiceCommand):
             help="Download remotely-stored uncompressed AIPs to calculate hash",
             default=False,
         )
+        parser.add_argument(
+            "--jobs",
+            type=int,
+            default=1,
+            help="Number of uncompressed AIPs to download and hash concurrently",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Update AIPs that already have a checksum",
+            default=False,
+        )
 
     @staticmethod
     def filter_aips_by_local_filesystem(aips):
@@ -62,6 +86,79 @@ class Command(StorageServiceCommand):
                 uncompressed_aips.append(aip)
         return (compressed_aips, uncompressed_aips)
 
+    @staticmethod
+    def generate_checksum(aip):
+        """Return the checksum of the uncompressed ``aip``, downloading it
+        first if it is not stored locally, and the number of bytes read to
+        compute it: the size of its tagmanifest, plus the size of the AIP if
+        it was downloaded.
+        """
+        try:
+            local_path = pathlib.Path(aip.fetch_local_path())
+            if local_path.is_dir():
+                local_path = utils.find_tagmanifest(local_path)
+            checksum = utils.generate_checksum(
+                local_path, Package.DEFAULT_CHECKSUM_ALGORITHM
+            ).hexdigest()
+            read_size = local_path.stat().st_size
+            if aip.local_tempdirs:
+                read_size += aip.size or 0
+            return checksum, read_size
+        finally:
+            if aip.local_tempdirs:
+                aip.clear_local_tempdirs()
+
+    def generate_checksums(self, aips, jobs):
+        """Yield ``(aip, checksum, read_size, error)`` for each of the
+        uncompressed ``aips``, in order. With more than one job, the next
+        AIPs are downloaded and hashed while the results of the previous ones
+        are handled, keeping at most ``2 * jobs`` AIPs in flight.
+        """
+        if jobs <= 1:
+            for aip in aips:
+                try:
+                    checksum, read_size = self.generate_checksum(aip)
+                except Exception as err:
+                    yield aip, None, 0, err
+                else:
+                    yield aip, checksum, read_size, None
+            return
+
+        def generate_checksum(aip):
+            try:
+                return self.generate_checksum(aip)
+            finally:
+                # Threads get their own database connection.
+                connection.close()
+
+        pending = collections.deque()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+            for aip in aips:
+                pending.append((aip, executor.submit(generate_checksum, aip)))
+                if len(pending) < 2 * jobs:
+                    continue
+                yield self._result(*pending.popleft())
+            while pending:
+                yield self._result(*pending.popleft())
+
+    @staticmethod
+    def _result(aip, future):
+        try:
+            checksum, read_size = future.result()
+        except Exception as err:
+            return aip, None, 0, err
+        return aip, checksum, read_size, None
+
+    def save(self, aip, batch, flush=False):
+        """Add ``aip`` to ``batch`` and save the checksums of the AIPs in
+        ``batch`` once it is full, or if ``flush`` is set.
+        """
+        if aip is not None:
+            batch.append(aip)
+        if batch and (flush or len(batch) >= BATCH_SIZE):
+            Package.objects.bulk_update(batch, ["checksum", "checksum_algorithm"])
+            batch.clear()
+
     def handle(self, *args, **options):
         aips = Package.objects.filter(
             package_type=Package.AIP,
@@ -73,8 +170,10 @@ class Command(StorageServiceCommand):
         location_uuid = options["location_uuid"]
         if location_uuid:
             aips = aips.filter(current_location=location_uuid)
+        if not options["force"]:
+            aips = aips.filter(Q(checksum__isnull=True) | Q(checksum=""))
 
-        aips = aips.all()
+        aips = aips.select_related("current_location__space")
 
         download_aips = options["download"]
 
@@ -86,47 +185,60 @@ class Command(StorageServiceCommand):
         total_aip_count = len(compressed_aips) + len(uncompressed_aips)
         success_count = 0
         error_count = 0
+        batch = []
 
-        for aip in compressed_aips:
-            checksum, checksum_algorithm = utils.get_compressed_package_checksum(
-                aip.full_pointer_file_path
-            )
-            if checksum is None:
-                self.error(
-                    f"Unable to retrieve checksum information from pointer file for compressed AIP {aip.uuid}"
+        try:
+            for aip in compressed_aips:
+                checksum, checksum_algorithm = utils.get_compressed_package_checksum(
+                    aip.full_pointer_file_path
                 )
-                error_count += 1
-                continue
-
-            aip.checksum = checksum
-            aip.checksum_algorithm = checksum_algorithm
-            aip.save()
-            self.info(
-                f"AIP {aip.uuid} updated with {aip.checksum_algorithm} checksum {aip.checksum}"
-            )
-            success_count += 1
-
-        for aip in uncompressed_aips:
-            local_path = aip.fetch_local_path()
-            tagmanifest_path = utils.find_tag_manifest(local_path)
-
-            checksum = utils.generate_checksum(
-                tagmanifest_path, Package.DEFAULT_CHECKSUM_ALGORITHM
-            ).hexdigest()
-            if checksum is None:
-                self.error(
-                    f"Unable to calculate tagmanifest checksum for uncompressed AIP {aip.uuid}"
+                if checksum is None:
+                    self.error(
+                        f"Unable to retrieve checksum information from pointer file for compressed AIP {aip.uuid}"
+                    )
+                    error_count += 1
+                    continue
+
+                aip.checksum = checksum
+                aip.checksum_algorithm = checksum_algorithm
+                self.save(aip, batch)
+                self.info(
+                    f"AIP {aip.uuid} updated with {aip.checksum_algorithm} checksum {aip.checksum}"
                 )
-                error_count += 1
-                continue
-
-            aip.checksum = checksum
-            aip.checksum_algorithm = Package.DEFAULT_CHECKSUM_ALGORITHM
-            aip.save()
+                success_count += 1
+
+            start_time = time.monotonic()
+            read_size = 0
+            for aip, checksum, aip_read_size, err in self.generate_checksums(
+                uncompressed_aips, options["jobs"]
+            ):
+                if checksum is None:
+                    details = f" Details: {err}" if err else ""
+                    self.error(
+                        f"Unable to calculate tagmanifest checksum for uncompressed AIP {aip.uuid}.{details}"
+                    )
+                    error_count += 1
+                    continue
+
+                aip.checksum = checksum
+                aip.checksum_algorithm = Package.DEFAULT_CHECKSUM_ALGORITHM
+                self.save(aip, batch)
+                self.info(
+                    f"AIP {aip.uuid} updated with {aip.checksum_algorithm} checksum {aip.checksum}"
+                )
+                success_count += 1
+                read_size += aip_read_size
+        finally:
+            # Save the checksums computed so far, even if interrupted.
+            self.save(None, batch, flush=True)
+
+        if uncompressed_aips:
+            elapsed = max(time.monotonic() - start_time, 0.001)
             self.info(
-                f"AIP {aip.uuid} updated with {aip.checksum_algorithm} checksum {aip.checksum}"
+                f"Processed {len(uncompressed_aips)} uncompressed AIPs in"
+                f" {elapsed:.1f} seconds ({len(uncompressed_aips) / elapsed:.2f} AIPs/s,"
+                f" {read_size / elapsed / 10**6:.2f} MB/s read)."
             )
-            success_count += 1
 
         if total_aip_count == 0:
             self.info("Complete. No matching AIPs identified.")
@@ -0,0 +1,63 @@
+"""Record the encrypted paths of the packages stored in GPG spaces.
+
+GPG spaces look up the package (and so the key it was encrypted with) of an
+encrypted path through the recorded package paths (GPGPackagePath), e.g. to
+browse or copy files out of encrypted packages. Paths are recorded when
+packages are encrypted, packages encrypted before that are looked up with a
+scan of the package table instead. This command records the paths of those
+packages.
+
+Packages that already have their path recorded are ignored unless the
+--force argument is used.
+
+Execution example:
+./manage.py populate_gpg_package_paths
+"""
+
+from locations.models.gpg import GPGPackagePath
+from locations.models.package import Package
+from locations.models.space import Space
+
+from common.management.commands import StorageServiceCommand
+
+
+class Command(StorageServiceCommand):
+    help = __doc__
+
+    def add_arguments(self, parser):
+        """Entry point to add custom arguments"""
+        parser.add_argument(
+            "--location-uuid",
+            help="UUID for specific GPG location",
+            default=None,
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Record the paths of packages that already have one",
+            default=False,
+        )
+
+    def handle(self, *args, **options):
+        packages = Package.objects.filter(
+            current_location__space__access_protocol=Space.GPG
+        ).exclude(status=Package.DELETED)
+
+        location_uuid = options["location_uuid"]
+        if location_uuid:
+            packages = packages.filter(current_location=location_uuid)
+        if not options["force"]:
+            packages = packages.filter(gpgpackagepath__isnull=True)
+
+        packages = packages.select_related("current_location__space")
+
+        package_count = 0
+        for package in packages.iterator():
+            package_count += 1
+            GPGPackagePath.record(package.full_path, package)
+            self.info(f"Package {package.uuid} recorded at {package.full_path}")
+
+        if package_count == 0:
+            self.success("Complete. No matching packages found.")
+        else:
+            self.success(f"Complete. Paths of {package_count} packages recorded.")
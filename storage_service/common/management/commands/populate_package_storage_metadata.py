@@ -0,0 +1,125 @@
+"""Populate the storage metadata fields of stored packages.
+
+Packages record how they are stored (Package.is_file, Package.compression,
+Package.encrypted and Package.base_directory) when they are stored, so that
+API requests can be answered without accessing them. This command fills in
+those fields for packages stored before they were recorded.
+
+Packages are inspected locally when possible. If the --download argument is
+used, packages in remote storage locations (e.g. S3) will be downloaded and
+encrypted packages decrypted to inspect them. Otherwise, remote packages are
+skipped and the metadata of encrypted packages is inferred from their names
+and pointer files (their base directory is only recorded if they are not
+compressed).
+
+Packages that already have their storage metadata are ignored unless the
+--force argument is used.
+
+Execution example:
+./manage.py populate_package_storage_metadata
+"""
+
+import pathlib
+
+from locations.models.package import Package
+
+from common.management.commands import StorageServiceCommand
+
+
+class Command(StorageServiceCommand):
+    help = __doc__
+
+    def add_arguments(self, parser):
+        """Entry point to add custom arguments"""
+        parser.add_argument(
+            "--location-uuid",
+            help="UUID for specific AIP Store or Replicator location",
+            default=None,
+        )
+        parser.add_argument(
+            "--download",
+            action="store_true",
+            help="Download remotely-stored and decrypt encrypted packages to inspect them",
+            default=False,
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Update packages that already have their storage metadata",
+            default=False,
+        )
+
+    @staticmethod
+    def record_encrypted_storage_metadata(package, encrypted_path):
+        """Record the storage metadata of an encrypted package without
+        decrypting it. Encrypted spaces keep uncompressed packages as
+        extensionless tar files.
+        """
+        encrypted_path = pathlib.Path(encrypted_path)
+        package.is_file = bool(encrypted_path.suffix)
+        package.compression = package.get_compression() if package.is_file else None
+        package.encrypted = True
+        package.base_directory = None if package.is_file else encrypted_path.name
+
+    def handle(self, *args, **options):
+        packages = Package.objects.filter(status=Package.UPLOADED)
+
+        location_uuid = options["location_uuid"]
+        if location_uuid:
+            packages = packages.filter(current_location=location_uuid)
+        if not options["force"]:
+            packages = packages.filter(is_file__isnull=True)
+
+        packages = packages.select_related("current_location__space")
+
+        download = options["download"]
+        package_count = 0
+        success_count = 0
+        skipped_count = 0
+
+        for package in packages.iterator():
+            package_count += 1
+            try:
+                local_path = package.get_local_path()
+                if local_path is not None and package.is_encrypted(local_path):
+                    if not download:
+                        self.record_encrypted_storage_metadata(package, local_path)
+                        local_path = None
+                    else:
+                        # Decrypt it into a temporary directory.
+                        local_path = package.fetch_local_path()
+                elif local_path is None:
+                    if not download:
+                        skipped_count += 1
+                        continue
+                    local_path = package.fetch_local_path()
+                if local_path is not None:
+                    package.record_storage_metadata(
+                        local_path,
+                        package.current_location.space,
+                        package.get_compression(),
+                    )
+            except Exception as err:
+                self.error(f"Unable to inspect package {package.uuid}. Details: {err}")
+                continue
+            finally:
+                if package.local_tempdirs:
+                    package.clear_local_tempdirs()
+
+            package.save(
+                update_fields=["is_file", "compression", "encrypted", "base_directory"]
+            )
+            self.info(
+                f"Package {package.uuid} updated: is_file={package.is_file},"
+                f" compression={package.compression},"
+                f" encrypted={package.encrypted},"
+                f" base_directory={package.base_directory}"
+            )
+            success_count += 1
+
+        if package_count == 0:
+            self.success("Complete. No matching packages found.")
+        else:
+            self.success(
+                f"Complete. Storage metadata for {success_count} of {package_count} identified packages added. {skipped_count} remote packages were skipped."
+            )
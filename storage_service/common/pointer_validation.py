@@ -0,0 +1,143 @@
+"""Validation of pointer files against the METS and PREMIS schemas and the
+Archivematica pointer file schematron.
+
+Compiling the schemas is much slower than validating a pointer file, so the
+validators are compiled once per process and shared by all threads. Pointer
+files can also be validated by a background thread, see
+``validate_in_background``.
+"""
+
+import logging
+import os
+import queue
+import threading
+
+import importlib_resources
+import metsrw
+from lxml import etree
+
+LOGGER = logging.getLogger(__name__)
+
+# Use local XML schemas for validation. libxml2 reads this when it first
+# resolves a schema, so it is set once, before any validator is compiled.
+os.environ["XML_CATALOG_FILES"] = str(
+    importlib_resources.files("common") / "assets" / "catalog.xml"
+)
+
+# Maximum number of pointer files waiting to be validated in the background.
+# Pointer files are validated inline when the queue is full.
+BACKGROUND_QUEUE_SIZE = 256
+
+_validators_lock = threading.Lock()
+# Compiled XMLSchema validators, keyed by the schema locations of the
+# documents they validate.
+_xmlschemas = {}
+_schematron = None
+
+_background_queue = queue.Queue(maxsize=BACKGROUND_QUEUE_SIZE)
+_background_thread = None
+
+
+class _Validator:
+    """Wrap a compiled lxml validator so it can be shared by threads: the
+    validation error log and report are stored in the validator, so only one
+    thread can use it at a time.
+    """
+
+    def __init__(self, validator):
+        self.validator = validator
+        self.lock = threading.Lock()
+
+
+def _get_xmlschema(mets_doc):
+    schema_locations = frozenset(
+        mets_doc.xpath("//*/@xsi:schemaLocation", namespaces=metsrw.NAMESPACES)
+    )
+    with _validators_lock:
+        validator = _xmlschemas.get(schema_locations)
+        if validator is None:
+            validator = _Validator(metsrw.get_xmlschema(metsrw.METS_XSD_PATH, mets_doc))
+            _xmlschemas[schema_locations] = validator
+    return validator
+
+
+def _get_schematron():
+    global _schematron
+    with _validators_lock:
+        if _schematron is None:
+            _schematron = _Validator(metsrw.get_schematron(metsrw.AM_PNTR_SCT_PATH))
+    return _schematron
+
+
+def validate(mets_doc):
+    """Validate the pointer file ``mets_doc`` (an lxml element or tree) like
+    ``metsrw.validate`` does, using validators compiled once per process.
+
+    :returns: tuple(bool: is_valid, dict: report), see ``metsrw.validate``.
+    :raises etree.XMLSchemaParseError: if the schemas cannot be compiled.
+    """
+    xmlschema = _get_xmlschema(mets_doc)
+    with xmlschema.lock:
+        is_xsd_valid = xmlschema.validator.validate(mets_doc)
+        xsd_error_log = xmlschema.validator.error_log
+    schematron = _get_schematron()
+    with schematron.lock:
+        is_sct_valid = schematron.validator.validate(mets_doc)
+        sct_report = schematron.validator.validation_report
+    report = {
+        "is_xsd_valid": is_xsd_valid,
+        "is_sct_valid": is_sct_valid,
+        "xsd_error_log": xsd_error_log,
+        "sct_report": sct_report,
+    }
+    report["report"] = metsrw.report_string(report)
+    return is_xsd_valid and is_sct_valid, report
+
+
+def validate_in_background(mets_doc, callback):
+    """Validate the pointer file ``mets_doc`` in a background thread and
+    call ``callback(is_valid, report)`` with the result. ``mets_doc`` must not
+    be modified afterwards. If too many pointer files are waiting to be
+    validated, ``mets_doc`` is validated before returning.
+    """
+    global _background_thread
+    try:
+        _background_queue.put_nowait((mets_doc, callback))
+    except queue.Full:
+        _validate_and_report(mets_doc, callback)
+        return
+    with _validators_lock:
+        if _background_thread is None or not _background_thread.is_alive():
+            _background_thread = threading.Thread(
+                target=_validate_queued_pointer_files,
+                name="pointer-file-validation",
+                daemon=True,
+            )
+            _background_thread.start()
+
+
+def wait_for_background_validation():
+    """Block until all the pointer files queued by ``validate_in_background``
+    have been validated.
+    """
+    _background_queue.join()
+
+
+def _validate_and_report(mets_doc, callback):
+    try:
+        is_valid, report = validate(mets_doc)
+    except etree.XMLSchemaParseError as err:
+        LOGGER.warning("Failed to parse validation schema: %s", err)
+        return
+    callback(is_valid, report)
+
+
+def _validate_queued_pointer_files():
+    while True:
+        mets_doc, callback = _background_queue.get()
+        try:
+            _validate_and_report(mets_doc, callback)
+        except Exception:
+            LOGGER.exception("Unable to validate pointer file")
+        finally:
+            _background_queue.task_done()
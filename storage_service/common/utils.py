@@ -1,4 +1,5 @@
 import ast
+import copy
 import datetime
 import hashlib
 import logging
@@ -9,7 +10,9 @@ import re
 import shutil
 import subprocess
 import tarfile
+import threading
 import uuid
+from collections import OrderedDict
 from collections import deque
 from collections import namedtuple
 from typing import Any
@@ -186,6 +189,21 @@ def download_file_stream(filepath, temp_dir=None):
     return response
 
 
+def download_iterator_stream(chunks, filename):
+    """
+    Returns the bytes yielded by `chunks` as a HttpResponse stream of a file
+    named `filename`.
+
+    The size is not known in advance so no Content-Length is sent.
+    """
+    response = http.StreamingHttpResponse(chunks)
+
+    response["Content-type"] = get_mimetype(filename)
+    response["Content-Disposition"] = 'attachment; filename="' + filename + '"'
+
+    return response
+
+
 # ########## XML & POINTER FILE ############
 
 
@@ -299,6 +317,110 @@ def mets_ss_agent(xml, digiprov_id, agent_value=None, agent_type="storage servic
     return digiprov_agent
 
 
+# Number of parsed pointer files kept in memory by ``read_pointer_file``.
+POINTER_CACHE_SIZE = 128
+
+# Facts extracted from a pointer file by ``get_pointer_file_facts``.
+PointerFileFacts = namedtuple(
+    "PointerFileFacts",
+    "format_registry_key checksum checksum_algorithm transform_algorithms event_types",
+)
+
+# Maps pointer file paths to (stat key, parsed tree, facts), least recently
+# used first.
+_pointer_cache = OrderedDict()
+_pointer_cache_lock = threading.Lock()
+
+
+def _pointer_stat_key(pointer_path):
+    stat = pointer_path.stat()
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+def _parse_pointer_file(source):
+    # Parse like ``metsrw.METSDocument.fromfile`` does.
+    return etree.parse(source, parser=etree.XMLParser(remove_blank_text=True))
+
+
+def _cached_pointer_file(pointer_path):
+    """Return the (parsed tree, facts) of the pointer file at
+    ``pointer_path``, parsing it only if it is not cached or has been modified
+    since it was cached. File-like objects are parsed but not cached. The
+    returned tree must not be modified.
+    """
+    if hasattr(pointer_path, "read"):
+        doc = _parse_pointer_file(pointer_path)
+        return doc, _get_pointer_file_facts(doc)
+    pointer_path = pathlib.Path(pointer_path).absolute()
+    key = _pointer_stat_key(pointer_path)
+    with _pointer_cache_lock:
+        cached = _pointer_cache.get(pointer_path)
+        if cached is not None and cached[0] == key:
+            _pointer_cache.move_to_end(pointer_path)
+            return cached[1:]
+    doc = _parse_pointer_file(str(pointer_path))
+    facts = _get_pointer_file_facts(doc)
+    with _pointer_cache_lock:
+        _pointer_cache[pointer_path] = (key, doc, facts)
+        _pointer_cache.move_to_end(pointer_path)
+        while len(_pointer_cache) > POINTER_CACHE_SIZE:
+            _pointer_cache.popitem(last=False)
+    return doc, facts
+
+
+def read_pointer_file(pointer_path):
+    """Return the pointer file at ``pointer_path`` as a parsed
+    ``etree._ElementTree``. Parsed pointer files are cached, so the tree
+    returned is a copy that the caller is free to modify.
+    """
+    doc, _facts = _cached_pointer_file(pointer_path)
+    return copy.deepcopy(doc)
+
+
+def get_pointer_file_facts(pointer_path):
+    """Return the ``PointerFileFacts`` documented in the pointer file at
+    ``pointer_path``.
+    """
+    _doc, facts = _cached_pointer_file(pointer_path)
+    return facts
+
+
+def forget_pointer_file(pointer_path):
+    """Drop the pointer file at ``pointer_path`` from the cache. Call this
+    after writing to a pointer file.
+    """
+    with _pointer_cache_lock:
+        _pointer_cache.pop(pathlib.Path(pointer_path).absolute(), None)
+
+
+def _findtext_premis(doc, path):
+    """Return the text of the PREMIS ``path`` element, trying the PREMIS3
+    namespace as the pointer file may be newer.
+    """
+    text = doc.findtext(f".//premis:{path}", namespaces=NSMAP)
+    if text is None:
+        text = doc.findtext(f".//premis3:{path}", namespaces=NSMAP)
+    return text
+
+
+def _get_pointer_file_facts(doc):
+    return PointerFileFacts(
+        format_registry_key=_findtext_premis(doc, "formatRegistryKey"),
+        checksum=_findtext_premis(doc, "messageDigest"),
+        checksum_algorithm=_findtext_premis(doc, "messageDigestAlgorithm"),
+        transform_algorithms=tuple(
+            transform.get("TRANSFORMALGORITHM")
+            for transform in doc.iterfind(".//mets:transformFile", namespaces=NSMAP)
+        ),
+        event_types=tuple(
+            event_type.text
+            for event_type in doc.xpath(
+                ".//premis:eventType|.//premis3:eventType", namespaces=NSMAP
+            )
+        ),
+    )
+
+
 def get_compression(pointer_path):
     """Return the compression algorithm used to compress the package, as
     documented in the pointer file at ``pointer_path``.
@@ -306,16 +428,10 @@ def get_compression(pointer_path):
     :param pointer_path: path to xml pointer file
     :returns: one of the constants in ``COMPRESSION_ALGORITHMS``.
     """
-    doc = etree.parse(pointer_path)
-
-    puid = doc.findtext(".//premis:formatRegistryKey", namespaces=NSMAP)
-    if puid is None:
-        # Try the PREMIS3 namespace as the pointer file may be newer.
-        puid = doc.findtext(".//premis3:formatRegistryKey", namespaces=NSMAP)
+    facts = get_pointer_file_facts(pointer_path)
+    puid = facts.format_registry_key
     if puid == PRONOM_7Z:  # 7 Zip
-        algo = doc.find(".//mets:transformFile", namespaces=NSMAP).get(
-            "TRANSFORMALGORITHM"
-        )
+        algo = next(iter(facts.transform_algorithms), None)
         if algo == COMPRESS_ALGO_BZIP2:
             return COMPRESSION_7Z_BZIP
         elif algo == COMPRESS_ALGO_LZMA:
@@ -413,21 +529,8 @@ def get_compressed_package_checksum(pointer_path):
     :param pointer_path: path to xml pointer file
     :returns: tuple(str: checksum, str: checksum_algorithm)`.
     """
-    doc = etree.parse(pointer_path)
-
-    checksum = doc.findtext(".//premis:messageDigest", namespaces=NSMAP)
-    if checksum is None:
-        # Try the PREMIS3 namespace as the pointer file may be newer.
-        checksum = doc.findtext(".//premis3:messageDigest", namespaces=NSMAP)
-    checksum_algorithm = doc.findtext(
-        ".//premis:messageDigestAlgorithm", namespaces=NSMAP
-    )
-    if checksum_algorithm is None:
-        checksum_algorithm = doc.findtext(
-            ".//premis3:messageDigestAlgorithm", namespaces=NSMAP
-        )
-
-    return (checksum, checksum_algorithm)
+    facts = get_pointer_file_facts(pointer_path)
+    return (facts.checksum, facts.checksum_algorithm)
 
 
 def get_tool_info_command(compression):
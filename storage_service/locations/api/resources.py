@@ -1,5 +1,6 @@
 # This file contains the base models that individual versioned models
 # are based on. They shouldn't be directly used with Api objects.
+import itertools
 import json
 import logging
 import os
@@ -13,12 +14,14 @@ from pathlib import Path
 import bagit
 import tastypie.exceptions
 from administration.models import Settings
+from common import decorators
 from common import utils
 from django.conf import settings
 from django.core.exceptions import MultipleObjectsReturned
 from django.core.exceptions import ObjectDoesNotExist
 from django.forms.models import model_to_dict
 from django.http import HttpResponseRedirect
+from django.http import StreamingHttpResponse
 from django.urls import re_path
 from django.urls import reverse
 from django.utils.translation import gettext as _
@@ -29,6 +32,7 @@ from tastypie.authentication import BasicAuthentication
 from tastypie.authentication import MultiAuthentication
 from tastypie.authentication import SessionAuthentication
 from tastypie.authorization import DjangoAuthorization
+from tastypie.paginator import Paginator
 from tastypie.resources import ALL
 from tastypie.resources import ALL_WITH_RELATIONS
 from tastypie.resources import ModelResource
@@ -53,9 +57,18 @@ from ..models import PosixMoveUnsupportedError
 from ..models import Space
 from ..models import StorageException
 from ..models.async_manager import AsyncManager
+from ..models.gpg import GPGMemberNotFoundException
 
 LOGGER = logging.getLogger(__name__)
 
+# Maximum number of packages whose status can be requested at once, see
+# ``PackageResource.bulk_status``.
+BULK_STATUS_MAX_PACKAGES = 10000
+
+# Number of File rows fetched at a time when streaming file metadata, see
+# ``PackageResource.file_data``.
+FILE_DATA_CHUNK_SIZE = 2000
+
 
 def _is_relative_path(path1, path2):
     """Ensure path2 is relative to path1"""
@@ -66,6 +79,56 @@ def _is_relative_path(path1, path2):
         return False
 
 
+def _get_limit_and_offset(request):
+    """Return the limit and offset GET parameters of ``request``, 0 when not
+    given. Responds with 400 if they are not positive integers.
+    """
+    try:
+        limit = int(request.GET.get("limit", 0))
+        offset = int(request.GET.get("offset", 0))
+        if limit < 0 or offset < 0:
+            raise ValueError
+    except ValueError:
+        response = {
+            "success": False,
+            "error": _("The limit and offset must be positive integers."),
+        }
+        raise tastypie.exceptions.ImmediateHttpResponse(
+            http.HttpBadRequest(
+                content=json.dumps(response), content_type="application/json"
+            )
+        )
+    return limit, offset
+
+
+def _file_chunks(files, limit=0, offset=0):
+    """Yield the rows of ``files``, a ``values()`` queryset including the id,
+    in lists of at most ``FILE_DATA_CHUNK_SIZE`` rows ordered by id. An
+    optional ``limit`` and ``offset`` select a page of the rows.
+
+    Every chunk is fetched with its own query starting after the last id of
+    the previous one, because ``QuerySet.iterator`` would make MySQL buffer
+    the whole result.
+    """
+    files = files.order_by("id")
+    remaining = limit or None
+    last_id = None
+    while remaining is None or remaining > 0:
+        size = FILE_DATA_CHUNK_SIZE
+        if remaining is not None:
+            size = min(remaining, size)
+            remaining -= size
+        if last_id is None:
+            chunk = list(files[offset : offset + size])
+        else:
+            chunk = list(files.filter(id__gt=last_id)[:size])
+        if chunk:
+            yield chunk
+        if len(chunk) < size:
+            return
+        last_id = chunk[-1]["id"]
+
+
 # FIXME ModelResources with ForeignKeys to another model don't work with
 # validation = CleanedDataFormValidation  On creation, it errors with:
 # "Select a valid choice. That choice is not one of the available choices."
@@ -240,9 +303,103 @@ class PipelineResource(ModelResource):
         return bundle
 
 
+class SpacePaginator(Paginator):
+    """Paginator that fetches the protocol-specific spaces of each page of
+    spaces at once, since ``SpaceResource`` serializes them.
+    """
+
+    def get_slice(self, limit, offset):
+        spaces = list(super().get_slice(limit, offset))
+        Space.prefetch_child_spaces(spaces)
+        return spaces
+
+
+class PackagePaginator(Paginator):
+    """Paginator that also supports keyset pagination of packages.
+
+    Offset pagination has to count and skip all the preceding packages, and
+    packages stored while a client pages through the list shift the pages.
+    If the ``cursor`` parameter is used (empty for the first page), packages
+    are ordered by ``id`` and each page starts after the last package of the
+    previous one, which the ``next`` link points to. ``total_count`` and
+    ``previous`` are not provided and ``order_by`` is not supported.
+    """
+
+    def get_cursor(self):
+        cursor = self.request_data.get("cursor")
+        if not cursor:
+            return None
+        try:
+            cursor = int(cursor)
+        except ValueError:
+            raise tastypie.exceptions.BadRequest(f"Invalid cursor '{cursor}' provided.")
+        return cursor
+
+    def page(self):
+        if "cursor" not in self.request_data:
+            return super().page()
+        if "order_by" in self.request_data:
+            raise tastypie.exceptions.BadRequest(
+                "The order_by parameter cannot be used with cursor pagination."
+            )
+
+        limit = self.get_limit()
+        cursor = self.get_cursor()
+        objects = self.objects.order_by("id")
+        if cursor is not None:
+            objects = objects.filter(id__gt=cursor)
+        if limit:
+            # Fetch one more package to know if there is a next page.
+            objects = list(objects[: limit + 1])
+            has_next = len(objects) > limit
+            objects = objects[:limit]
+        else:
+            objects = list(objects)
+            has_next = False
+
+        next_uri = None
+        if has_next:
+            next_uri = self._generate_cursor_uri(limit, objects[-1].id)
+
+        return {
+            self.collection_name: objects,
+            "meta": {
+                "limit": limit,
+                "next": next_uri,
+                "previous": None,
+                "total_count": None,
+            },
+        }
+
+    def _generate_cursor_uri(self, limit, cursor):
+        if self.resource_uri is None:
+            return None
+        request_params = self.request_data.copy()
+        for param in ("limit", "offset", "cursor"):
+            request_params.pop(param, None)
+        request_params.update({"limit": str(limit), "cursor": str(cursor)})
+        return f"{self.resource_uri}?{request_params.urlencode()}"
+
+
+class ReadReplicaMixin:
+    """Resource mixin that sends the database reads of the safe requests of
+    the views named in ``read_replica_views`` to the read replica, see
+    ``common.decorators.read_replica``.
+    """
+
+    read_replica_views = ("dispatch_list", "dispatch_detail")
+
+    def wrap_view(self, view):
+        wrapper = super().wrap_view(view)
+        if view in self.read_replica_views:
+            wrapper = decorators.read_replica(wrapper)
+        return wrapper
+
+
 class SpaceResource(ModelResource):
     class Meta:
         queryset = Space.objects.all()
+        paginator_class = SpacePaginator
         authentication = MultiAuthentication(
             BasicAuthentication(), ApiKeyAuthentication(), SessionAuthentication()
         )
@@ -300,8 +457,10 @@ class SpaceResource(ModelResource):
         model = PROTOCOL[access_protocol]["model"]
 
         try:
-            space = model.objects.get(space=bundle.obj.uuid)
+            space = bundle.obj.get_child_space()
         except model.DoesNotExist:
+            space = None
+        if space is None:
             LOGGER.error("Space matching UUID %s does not exist", bundle.obj.uuid)
             # TODO this should assert later once creation/deletion stuff works
         else:
@@ -361,7 +520,7 @@ class LocationResource(ModelResource):
     pipeline = fields.ToManyField(PipelineResource, "pipeline")
 
     class Meta:
-        queryset = Location.active.all()
+        queryset = Location.active.select_related("space").prefetch_related("pipeline")
         authentication = MultiAuthentication(
             BasicAuthentication(), ApiKeyAuthentication(), SessionAuthentication()
         )
@@ -700,7 +859,7 @@ class LocationResource(ModelResource):
         return sword_views.collection(request, location or kwargs["uuid"])
 
 
-class PackageResource(ModelResource):
+class PackageResource(ReadReplicaMixin, ModelResource):
     """Resource for managing Packages.
 
     List (api/v1/file/) supports:
@@ -745,8 +904,16 @@ class PackageResource(ModelResource):
         r"\/api\/v2\/location\/default\/(?P<purpose>[A-Z]{2})\/?"
     )
 
+    read_replica_views = ReadReplicaMixin.read_replica_views + (
+        "manage_contents",
+        "file_data",
+    )
+
     class Meta:
-        queryset = Package.objects.all()
+        queryset = Package.objects.select_related(
+            "current_location__space", "origin_pipeline", "replicated_package"
+        ).prefetch_related("related_packages", "replicas")
+        paginator_class = PackagePaginator
         authentication = MultiAuthentication(
             BasicAuthentication(), ApiKeyAuthentication(), SessionAuthentication()
         )
@@ -769,6 +936,8 @@ class PackageResource(ModelResource):
             "misc_attributes",
             "replicated_package",
             "replicas",
+            "last_fixity_at",
+            "last_fixity_success",
         ]
         list_allowed_methods = ["get", "post"]
         detail_allowed_methods = ["get", "put", "patch"]
@@ -782,6 +951,8 @@ class PackageResource(ModelResource):
             "uuid": ALL,
             "status": ALL,
             "stored_date": ALL,
+            "last_fixity_at": ALL,
+            "last_fixity_success": ALL,
             "related_packages": ALL_WITH_RELATIONS,
         }
 
@@ -899,6 +1070,12 @@ class PackageResource(ModelResource):
                 self.wrap_view("file_data"),
                 name="file_data",
             ),
+            re_path(
+                r"^(?P<resource_name>%s)/status%s$"
+                % (self._meta.resource_name, trailing_slash()),
+                self.wrap_view("bulk_status"),
+                name="bulk_status",
+            ),
             re_path(
                 r"^(?P<resource_name>%s)/(?P<%s>\w[\w/-]*)/reindex%s$"
                 % (
@@ -1311,9 +1488,12 @@ class PackageResource(ModelResource):
 
         # Get Package details
         package = bundle.obj
+        # Files are extracted from encrypted packages rather than looked up
+        # in a decrypted copy of the whole package.
+        in_local_directory = not package.is_compressed and not package.encrypted
 
         # Handle package name duplication in path for compressed packages
-        if not package.is_compressed:
+        if in_local_directory:
             full_path = package.fetch_local_path()
             # The basename of the AIP may be included with the request, because
             # all AIPs contain a base directory. That directory may already be
@@ -1357,20 +1537,25 @@ class PackageResource(ModelResource):
                     status=502,
                 )
 
+        file_not_found = http.HttpResponse(
+            status=404,
+            content=_("Requested file, %(filename)s, not found in AIP")
+            % {"filename": relative_path_to_file},
+        )
+
         # If local file exists - return that
-        if not package.is_compressed:
+        if in_local_directory:
             extracted_file_path = os.path.join(full_path, relative_path_to_file)
             if not os.path.exists(extracted_file_path):
-                return http.HttpResponse(
-                    status=404,
-                    content=_("Requested file, %(filename)s, not found in AIP")
-                    % {"filename": relative_path_to_file},
-                )
+                return file_not_found
         elif package.package_type in Package.PACKAGE_TYPE_CAN_EXTRACT:
             # If file doesn't exist, try to extract it
-            (extracted_file_path, temp_dir) = package.extract_file(
-                relative_path_to_file
-            )
+            try:
+                (extracted_file_path, temp_dir) = package.extract_file(
+                    relative_path_to_file
+                )
+            except GPGMemberNotFoundException:
+                return file_not_found
         else:
             # If the package is compressed and we can't extract it,
             return http.HttpResponse(
@@ -1422,6 +1607,10 @@ class PackageResource(ModelResource):
                     status=502,
                 )
         lockss_au_number = kwargs.get("chunk_number")
+        # Encrypted packages are decrypted on the fly as they are sent.
+        decrypted = package.stream_decrypted() if lockss_au_number is None else None
+        if decrypted is not None:
+            return utils.download_iterator_stream(*decrypted)
         try:
             temp_dir = None
             full_path = package.get_download_path(lockss_au_number)
@@ -1909,6 +2098,10 @@ class PackageResource(ModelResource):
 
         The file properties provided are the properties of the ~:class:`~locations.models.event.File` class; see the class definition for more information.
 
+        The response is streamed, so packages with many files can be listed
+        without loading all of them at once. The optional limit and offset
+        GET parameters return a page of the files.
+
         :returns: a JSON object in the following format:
         {
             "success": True,
@@ -1923,26 +2116,39 @@ class PackageResource(ModelResource):
             ]
         }
         """
-        response = {"success": True, "package": str(bundle.obj.uuid), "files": []}
+        limit, offset = _get_limit_and_offset(request)
+
+        attrs = (
+            "source_id",
+            "name",
+            "source_package",
+            "checksum",
+            "accessionid",
+            "origin",
+        )
+        files = bundle.obj.file_set.values("id", *attrs)
 
-        for f in bundle.obj.file_set.all():
+        def file_contents(f):
             d = {}
-            for attr in (
-                "source_id",
-                "name",
-                "source_package",
-                "checksum",
-                "accessionid",
-                "origin",
-            ):
-                value = getattr(f, attr)
+            for attr in attrs:
+                value = f[attr]
                 if value is not None:
                     value = str(value)
                 d[attr] = value
-            response["files"].append(d)
-
-        return http.HttpResponse(
-            status=200, content=json.dumps(response), content_type="application/json"
+            return json.dumps(d)
+
+        def stream_contents():
+            response = json.dumps({"success": True, "package": str(bundle.obj.uuid)})
+            # Stream the files into the "files" array of the response.
+            yield response[:-1] + ', "files": ['
+            separator = ""
+            for chunk in _file_chunks(files, limit, offset):
+                yield separator + ", ".join(file_contents(f) for f in chunk)
+                separator = ", "
+            yield "]}"
+
+        return StreamingHttpResponse(
+            stream_contents(), status=200, content_type="application/json"
         )
 
     def file_data(self, request, **kwargs):
@@ -1955,10 +2161,18 @@ class PackageResource(ModelResource):
 
         Acceptable parameters are:
             * relative_path (searches the `name` field)
+            * relative_path_prefix (searches the `name` field for paths
+              starting with the value, e.g. "transfer/objects/" for the files
+              inside that directory)
             * fileuuid (searches the `source_id` field)
             * accessionid (searches the `accessionid` field)
             * sipuuid (searches the `source_package` field)
 
+        Optional parameters are:
+            * limit and offset, to return a page of the results
+            * format: if "jsonl", the objects are streamed as JSON lines
+              instead of a JSON array
+
         :returns: an array of one or more objects. See the transferfile
         index for information on the return format.
         If no results are found for the specified query, returns 404.
@@ -1972,6 +2186,7 @@ class PackageResource(ModelResource):
 
         property_map = {
             "relative_path": "name",
+            "relative_path_prefix": "name__startswith",
             "fileuuid": "source_id",
             "accessionid": "accessionid",
             "sipuuid": "source_package",
@@ -1982,6 +2197,11 @@ class PackageResource(ModelResource):
                 query[dest] = request.GET[source]
             except KeyError:
                 pass
+        if "name__startswith" in query:
+            # MySQL matches ``startswith`` with LIKE BINARY, which cannot use
+            # the index of the name column. The case insensitive match can,
+            # so it narrows down the files compared.
+            query["name__istartswith"] = query["name__startswith"]
 
         if not query:
             response = {
@@ -1992,21 +2212,151 @@ class PackageResource(ModelResource):
                 content=json.dumps(response), content_type="application/json"
             )
 
-        files = File.objects.filter(**query)
-        if not files.exists():
+        limit, offset = _get_limit_and_offset(request)
+
+        files = File.objects.filter(**query).values(
+            "id", "accessionid", "name", "source_id", "origin", "source_package"
+        )
+        chunks = _file_chunks(files, limit, offset)
+        first_chunk = next(chunks, None)
+        if first_chunk is None:
             return http.HttpNotFound()
+        chunks = itertools.chain([first_chunk], chunks)
+
+        def file_metadata(f):
+            return {
+                "accessionid": f["accessionid"],
+                "file_extension": os.path.splitext(f["name"])[1],
+                "filename": os.path.basename(f["name"]),
+                "relative_path": f["name"],
+                "fileuuid": f["source_id"],
+                "origin": str(f["origin"]) if f["origin"] is not None else None,
+                "sipuuid": f["source_package"],
+            }
+
+        if request.GET.get("format") == "jsonl":
+            return StreamingHttpResponse(
+                (
+                    "".join(json.dumps(file_metadata(f)) + "\n" for f in chunk)
+                    for chunk in chunks
+                ),
+                content_type="application/x-ndjson",
+            )
+
+        response = [file_metadata(f) for chunk in chunks for f in chunk]
+        return http.HttpResponse(
+            content=json.dumps(response), content_type="application/json"
+        )
+
+    def bulk_status(self, request, **kwargs):
+        """
+        Returns the status of many packages at once.
+
+        The POST body must be a JavaScript object with the list of package
+        UUIDs to look up (at most ``BULK_STATUS_MAX_PACKAGES``):
+        {
+            "uuids": ["UUID (as string)", ...]
+        }
+
+        :returns: a JSON object in the following format:
+        {
+            "objects": [
+                # one object per package found, in the requested order:
+                {
+                    "uuid": "",
+                    "status": "",
+                    "size": 0,
+                    "current_location": "/api/v2/location/<uuid>/",
+                    "replicas": ["/api/v2/file/<uuid>/", ...],
+                    "last_fixity_at": "ISO 8601 date or null",
+                    "last_fixity_success": true
+                }
+            ],
+            "not_found": ["UUID (as string)", ...]
+        }
+        If the POST body is not valid, returns 400.
+        """
+        # Tastypie API checks
+        self.method_check(request, allowed=["post"])
+        self.is_authenticated(request)
+        self.throttle_check(request)
+        self.log_throttled_access(request)
 
-        response = []
-        for f in files:
-            response.append(
+        try:
+            uuids = json.loads(request.body.decode("utf8"))["uuids"]
+            if not isinstance(uuids, list):
+                raise ValueError
+            # Normalize and deduplicate them, keeping the requested order.
+            uuids = list(dict.fromkeys(str(uuid.UUID(str(u))) for u in uuids))
+        except (ValueError, TypeError, KeyError):
+            response = {
+                "success": False,
+                "error": _("JSON request must contain a list of package UUIDs."),
+            }
+            return http.HttpBadRequest(
+                content=json.dumps(response), content_type="application/json"
+            )
+        if len(uuids) > BULK_STATUS_MAX_PACKAGES:
+            response = {
+                "success": False,
+                "error": _("At most %(count)d packages can be requested at once.")
+                % {"count": BULK_STATUS_MAX_PACKAGES},
+            }
+            return http.HttpBadRequest(
+                content=json.dumps(response), content_type="application/json"
+            )
+
+        packages = {
+            str(package["uuid"]): package
+            for package in Package.objects.filter(uuid__in=uuids).values(
+                "uuid",
+                "status",
+                "size",
+                "current_location_id",
+                "last_fixity_at",
+                "last_fixity_success",
+            )
+        }
+        replicas = {}
+        for replicated_package, replica in Package.objects.filter(
+            replicated_package__in=uuids
+        ).values_list("replicated_package_id", "uuid"):
+            replicas.setdefault(str(replicated_package), []).append(str(replica))
+
+        def resource_uri(resource_name, obj_uuid):
+            return reverse(
+                "api_dispatch_detail",
+                kwargs={
+                    "api_name": "v2",
+                    "resource_name": resource_name,
+                    "uuid": obj_uuid,
+                },
+            )
+
+        response = {"objects": [], "not_found": []}
+        for package_uuid in uuids:
+            package = packages.get(package_uuid)
+            if package is None:
+                response["not_found"].append(package_uuid)
+                continue
+            current_location = package["current_location_id"]
+            last_fixity_at = package["last_fixity_at"]
+            response["objects"].append(
                 {
-                    "accessionid": f.accessionid,
-                    "file_extension": os.path.splitext(f.name)[1],
-                    "filename": os.path.basename(f.name),
-                    "relative_path": f.name,
-                    "fileuuid": f.source_id,
-                    "origin": str(f.origin) if f.origin is not None else f.origin,
-                    "sipuuid": f.source_package,
+                    "uuid": package_uuid,
+                    "status": package["status"],
+                    "size": package["size"],
+                    "current_location": resource_uri("location", current_location)
+                    if current_location is not None
+                    else None,
+                    "replicas": [
+                        resource_uri(self._meta.resource_name, replica)
+                        for replica in replicas.get(package_uuid, [])
+                    ],
+                    "last_fixity_at": last_fixity_at.isoformat()
+                    if last_fixity_at is not None
+                    else None,
+                    "last_fixity_success": package["last_fixity_success"],
                 }
             )
 
@@ -2015,7 +2365,7 @@ class PackageResource(ModelResource):
         )
 
 
-class AsyncResource(ModelResource):
+class AsyncResource(ReadReplicaMixin, ModelResource):
     """
     Represents an async task that may or may not still be running.
     """
@@ -11,8 +11,14 @@ http://legacy.datatables.net/usage/server-side
 import os
 import uuid
 
+from django.db.models import Case
+from django.db.models import F
 from django.db.models import Q
-from django.utils import timezone
+from django.db.models import TextField
+from django.db.models import Value
+from django.db.models import When
+from django.db.models.functions import Concat
+from django.db.models.functions import Replace
 
 from .models import FixityLog
 from .models import Package
@@ -37,9 +43,9 @@ class PackageDataTable:
         5: "replicated_package__uuid",
     }
 
-    # these columns instead can't be sorted directly with the
-    # queryset so the queryset needs to be converted into a list
-    # and then sorted using helper methods
+    # these columns are sorted by the database too, but they need the
+    # queryset to be annotated first by the helper methods, which return
+    # the expressions to order by
     SORT_KEY_HELPERS_MAPPING = {
         2: "sort_by_full_path_key",
         4: "sort_by_package_type_key",
@@ -153,11 +159,13 @@ class PackageDataTable:
             field = self.ORDER_BY_MAPPING[sorting_column["index"]]
             if sort_descending:
                 field = f"-{field}"
-            return queryset.order_by(field)
+            # sort by primary key too so pages are stable
+            return queryset.order_by(field, "pk")
         elif sorting_column["index"] in self.SORT_KEY_HELPERS_MAPPING:
             sorting_method_name = self.SORT_KEY_HELPERS_MAPPING[sorting_column["index"]]
             sorting_method = getattr(self, sorting_method_name)
-            return sorted(queryset, key=sorting_method, reverse=sort_descending)
+            queryset, ordering = sorting_method(queryset, sort_descending)
+            return queryset.order_by(*ordering, "pk")
         else:
             return queryset
 
@@ -165,30 +173,85 @@ class PackageDataTable:
         result = self.sort(queryset)
         display_start = self.params["display_start"]
         display_length = self.params["display_length"]
-        try:
-            return result[display_start : (display_start + display_length)]
-        except IndexError:
-            return []
+        # slicing the queryset pushes the pagination to the database
+        return result[display_start : (display_start + display_length)]
+
+    @staticmethod
+    def _choices_display(field, choices):
+        """Return an expression that evaluates to the display value of the
+        ``field`` with ``choices``, e.g. like ``get_FOO_display``.
+        """
+        return Case(
+            *[
+                When(**{field: value}, then=Value(str(label)))
+                for value, label in choices
+            ],
+            default=F(field),
+        )
+
+    @staticmethod
+    def _order(expression, descending, nulls_last):
+        """Order by ``expression`` with NULL values last if ``nulls_last``
+        is set (first otherwise) when sorting in ascending order, and the
+        other way around when sorting in descending order.
+        """
+        if nulls_last != descending:
+            nulls = {"nulls_last": True}
+        else:
+            nulls = {"nulls_first": True}
+        return expression.desc(**nulls) if descending else expression.asc(**nulls)
 
-    def sort_by_full_path_key(self, package):
-        return package.full_path
+    def sort_by_full_path_key(self, queryset, descending):
+        # join the space, location and package paths like Package.full_path
+        # does: absolute paths replace the preceding ones and the separators
+        # added between them are collapsed
+        separator = Value("/", output_field=TextField())
+        location_path = Case(
+            When(
+                current_location__relative_path__startswith="/",
+                then=F("current_location__relative_path"),
+            ),
+            default=Concat(
+                "current_location__space__path",
+                separator,
+                "current_location__relative_path",
+            ),
+        )
+        full_path = Case(
+            When(current_path__startswith="/", then=F("current_path")),
+            default=Concat(location_path, separator, "current_path"),
+        )
+        for _ in range(2):
+            full_path = Replace(
+                full_path, Value("//", output_field=TextField()), separator
+            )
+        queryset = queryset.annotate(full_path_key=full_path)
+        return queryset, [self._order(F("full_path_key"), descending, True)]
 
-    def sort_by_package_type_key(self, package):
-        return package.get_package_type_display()
+    def sort_by_package_type_key(self, queryset, descending):
+        queryset = queryset.annotate(
+            package_type_display=self._choices_display(
+                "package_type", Package.PACKAGE_TYPE_CHOICES
+            )
+        )
+        return queryset, [self._order(F("package_type_display"), descending, True)]
 
-    def sort_by_status_key(self, package):
-        return package.get_status_display()
+    def sort_by_status_key(self, queryset, descending):
+        queryset = queryset.annotate(
+            status_display=self._choices_display("status", Package.STATUS_CHOICES)
+        )
+        return queryset, [self._order(F("status_display"), descending, True)]
 
-    def sort_by_stored_date_key(self, package):
-        # avoid comparing datetimes with None
-        return package.stored_date or timezone.now()
+    def sort_by_stored_date_key(self, queryset, descending):
+        # packages without a stored date are considered the most recent
+        return queryset, [self._order(F("stored_date"), descending, True)]
 
-    def sort_by_fixity_date_key(self, package):
-        # avoid comparing datetimes with None
-        return package.latest_fixity_check_datetime or timezone.now()
+    def sort_by_fixity_date_key(self, queryset, descending):
+        # packages without fixity checks are considered the most recent
+        return queryset, [self._order(F("last_fixity_at"), descending, True)]
 
-    def sort_by_fixity_status_key(self, package):
-        return package.latest_fixity_check_result
+    def sort_by_fixity_status_key(self, queryset, descending):
+        return queryset, [self._order(F("last_fixity_success"), descending, False)]
 
 
 class FixityLogDataTable(PackageDataTable):
@@ -206,7 +206,14 @@ class PipelineLocalFSForm(forms.ModelForm):
     # TODO SpaceForm.path help text should say path to space on local machine
     class Meta:
         model = models.PipelineLocalFS
-        fields = ("remote_user", "remote_name", "assume_rsync_daemon", "rsync_password")
+        fields = (
+            "remote_user",
+            "remote_name",
+            "assume_rsync_daemon",
+            "rsync_password",
+            "ssh_multiplexing",
+            "rsync_workers",
+        )
 
 
 class LockssomaticForm(forms.ModelForm):
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.16 on 2026-10-18 22:01
+
+import django.core.validators
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("locations", "0037_django42"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="pipelinelocalfs",
+            name="rsync_workers",
+            field=models.PositiveSmallIntegerField(
+                default=1,
+                help_text="Number of rsync processes used to move a directory. If greater than 1, the files of the directory are split between them.",
+                validators=[django.core.validators.MinValueValidator(1)],
+                verbose_name="Parallel rsync workers",
+            ),
+        ),
+        migrations.AddField(
+            model_name="pipelinelocalfs",
+            name="ssh_multiplexing",
+            field=models.BooleanField(
+                default=False,
+                help_text="If checked, SSH sessions to the remote machine share a persistent master connection instead of connecting each time. Not used with rsync daemon.",
+                verbose_name="Reuse SSH connections",
+            ),
+        ),
+    ]
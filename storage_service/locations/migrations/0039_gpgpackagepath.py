@@ -0,0 +1,44 @@
+# Generated by Django 4.2.16 on 2026-10-18 22:16
+
+import django.db.models.deletion
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("locations", "0038_pipelinelocalfs_ssh_multiplexing_rsync_workers"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GPGPackagePath",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "path_hash",
+                    models.CharField(editable=False, max_length=64, unique=True),
+                ),
+                ("path", models.TextField()),
+                (
+                    "package",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="locations.package",
+                        to_field="uuid",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "GPG package path",
+            },
+        ),
+    ]
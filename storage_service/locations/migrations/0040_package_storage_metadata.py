@@ -0,0 +1,57 @@
+# Generated by Django 4.2.16 on 2026-10-18 22:22
+
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("locations", "0039_gpgpackagepath"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="package",
+            name="base_directory",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                default=None,
+                help_text="Name of the directory containing the package's contents",
+                max_length=256,
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="package",
+            name="compression",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                default=None,
+                help_text="Compression algorithm of the package, if compressed",
+                max_length=32,
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="package",
+            name="encrypted",
+            field=models.BooleanField(
+                db_index=True,
+                default=None,
+                help_text="Whether the package is stored encrypted",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="package",
+            name="is_file",
+            field=models.BooleanField(
+                db_index=True,
+                default=None,
+                help_text="Whether the package is a single file (e.g. compressed) rather than a directory",
+                null=True,
+            ),
+        ),
+    ]
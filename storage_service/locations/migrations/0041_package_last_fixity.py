@@ -0,0 +1,52 @@
+# Generated by Django 4.2.16 on 2026-10-18 22:59
+
+from django.db import migrations
+from django.db import models
+from django.db.models import OuterRef
+from django.db.models import Subquery
+
+
+def data_migration_up(apps, schema_editor):
+    """Copy the latest fixity check of each package from its FixityLog
+    entries.
+    """
+    Package = apps.get_model("locations", "Package")
+    FixityLog = apps.get_model("locations", "FixityLog")
+    latest_fixity_checks = FixityLog.objects.filter(package=OuterRef("uuid")).order_by(
+        "-datetime_reported"
+    )
+    Package.objects.filter(uuid__in=FixityLog.objects.values("package")).update(
+        last_fixity_at=Subquery(latest_fixity_checks.values("datetime_reported")[:1]),
+        last_fixity_success=Subquery(latest_fixity_checks.values("success")[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("locations", "0040_package_storage_metadata"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="package",
+            name="last_fixity_at",
+            field=models.DateTimeField(
+                blank=True,
+                db_index=True,
+                default=None,
+                help_text="Datetime of the latest fixity check of the package",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="package",
+            name="last_fixity_success",
+            field=models.BooleanField(
+                db_index=True,
+                default=None,
+                help_text="Whether the latest fixity check of the package succeeded, if it ran",
+                null=True,
+            ),
+        ),
+        migrations.RunPython(data_migration_up, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+from django.db import migrations
+
+# Indexes on the File columns used to look up files, see
+# ``PackageResource.file_data``. MySQL can only index the first characters of
+# TEXT columns, so the indexes are created with a prefix length there (the
+# largest one that fits in the smallest InnoDB index key using utf8mb4).
+INDEXES = (
+    ("locations_file_name_idx", "name"),
+    ("locations_file_source_id_idx", "source_id"),
+    ("locations_file_source_package_idx", "source_package"),
+    ("locations_file_accessionid_idx", "accessionid"),
+)
+MYSQL_PREFIX_LENGTH = 191
+
+
+def create_indexes(apps, schema_editor):
+    File = apps.get_model("locations", "File")
+    table = schema_editor.quote_name(File._meta.db_table)
+    for index_name, column in INDEXES:
+        column = schema_editor.quote_name(column)
+        if schema_editor.connection.vendor == "mysql":
+            column = f"{column}({MYSQL_PREFIX_LENGTH})"
+        schema_editor.execute(
+            f"CREATE INDEX {schema_editor.quote_name(index_name)} ON {table} ({column})"
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    File = apps.get_model("locations", "File")
+    table = schema_editor.quote_name(File._meta.db_table)
+    for index_name, _column in INDEXES:
+        index_name = schema_editor.quote_name(index_name)
+        if schema_editor.connection.vendor == "mysql":
+            schema_editor.execute(f"DROP INDEX {index_name} ON {table}")
+        else:
+            schema_editor.execute(f"DROP INDEX {index_name}")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("locations", "0041_package_last_fixity"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -27,7 +27,7 @@ from .duracloud import Duracloud
 from .dspace import DSpace
 from .dspace_rest import DSpaceREST
 from .fedora import Fedora, PackageDownloadTask, PackageDownloadTaskFile
-from .gpg import GPG
+from .gpg import GPG, GPGPackagePath
 from .local_filesystem import LocalFilesystem
 from .lockssomatic import Lockssomatic
 from .nfs import NFS
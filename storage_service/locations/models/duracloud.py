@@ -1,7 +1,9 @@
+import concurrent.futures
+import hashlib
 import logging
 import os
 import re
-import shutil
+import threading
 import urllib.parse
 
 import requests
@@ -16,6 +18,30 @@ from .location import Location
 LOGGER = logging.getLogger(__name__)
 
 
+class _FileRange:
+    """Read-only file-like view of ``length`` bytes of ``f`` from ``offset``.
+
+    Used as the body of chunk uploads so they are streamed straight from the
+    source file. ``__len__`` lets requests send the Content-Length header.
+    """
+
+    def __init__(self, f, offset, length):
+        f.seek(offset)
+        self._f = f
+        self._length = length
+        self._remaining = length
+
+    def __len__(self):
+        return self._length
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._f.read(size)
+        self._remaining -= len(data)
+        return data
+
+
 class Duracloud(models.Model):
     space = models.OneToOneField("Space", to_field="uuid", on_delete=models.CASCADE)
     host = models.CharField(
@@ -60,19 +86,36 @@ class Duracloud(models.Model):
     # DuraCloud's default is 1 GB (1,000,000,000 bytes).
     CHUNK_SIZE = 10**9
 
-    # Size of chunks when reading files from disk to be uploaded - 1 MB (1,000,000 bytes).
+    # Size of chunks when reading files from disk to be uploaded, or writing
+    # downloaded files to disk - 1 MB (1,000,000 bytes).
     BUFFER_SIZE = 10**6
 
+    # Number of chunks of a file transferred concurrently.
+    TRANSFER_THREADS = 4
+
+    # Number of times the download of a chunk is retried if its size is wrong.
+    DOWNLOAD_RETRIES = 3
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._session = None
+        self._session_lock = threading.Lock()
 
     @property
     def session(self):
-        if self._session is None:
-            self._session = requests.Session()
-            self._session.auth = (self.user, self.password)
-        return self._session
+        """Session shared by the threads transferring chunks. Its connection
+        pool holds a connection for each of them.
+        """
+        with self._session_lock:
+            if self._session is None:
+                self._session = requests.Session()
+                self._session.auth = (self.user, self.password)
+                adapter = requests.adapters.HTTPAdapter(
+                    pool_maxsize=self.TRANSFER_THREADS + 1
+                )
+                self._session.mount("https://", adapter)
+                self._session.mount("http://", adapter)
+            return self._session
 
     @property
     def duraspace_url(self):
@@ -211,12 +254,148 @@ class Duracloud(models.Model):
         prepped.url = url
         return prepped
 
-    def _download_file(
-        self, url, download_path, expected_size=0, checksum=None, retry=0
+    def _write_response(self, response, f, limit=None):
+        """Stream the body of ``response`` to ``f``, computing its MD5.
+
+        At most ``limit`` bytes are written so a wrong sized chunk can't
+        overwrite its neighbours, but the full body is counted.
+
+        :returns: Tuple of the size of the body and its MD5 hexdigest
+        """
+        size = 0
+        checksum = hashlib.md5()
+        try:
+            for data in response.iter_content(self.BUFFER_SIZE):
+                size += len(data)
+                if limit is not None and size > limit:
+                    continue
+                f.write(data)
+                checksum.update(data)
+        finally:
+            response.close()
+        return size, checksum.hexdigest()
+
+    def _download_chunk(
+        self, url, download_path, offset, expected_size, checksum, chunk_path
     ):
+        """
+        Download the chunk at ``url`` into ``download_path`` at ``offset``.
+
+        ``chunk_path`` is the path the chunk would have on its own, used to
+        identify it in messages.
+
+        :raises: StorageException if the chunk can't be fetched or does not
+            match its expected size or checksum
+        """
+        for retry in range(self.DOWNLOAD_RETRIES + 1):
+            LOGGER.debug("Chunk URL: %s", url)
+            request = self._generate_duracloud_request(url)
+            response = self.session.send(request, stream=True)
+            LOGGER.debug("Response: %s", response)
+            if response.status_code != 200:
+                LOGGER.warning("Response: %s when fetching %s", response, url)
+                LOGGER.warning("Response text: %s", response.text)
+                response.close()
+                raise StorageException("Unable to fetch %s" % url)
+            with open(download_path, "r+b") as f:
+                f.seek(offset)
+                size, calculated_checksum = self._write_response(
+                    response, f, limit=expected_size
+                )
+            if size == expected_size:
+                break
+            if retry < self.DOWNLOAD_RETRIES:
+                LOGGER.error(
+                    "[RETRY=%(retry)d] File %(path)s does not match expected size of %(expected_size)s bytes, but was actually %(actual_size)s bytes"
+                    % {
+                        "retry": retry + 1,
+                        "path": chunk_path,
+                        "expected_size": expected_size,
+                        "actual_size": size,
+                    }
+                )
+        else:
+            raise StorageException(
+                _(
+                    "File %(path)s does not match expected size of %(expected_size)s bytes, but was actually %(actual_size)s bytes"
+                ),
+                {
+                    "path": chunk_path,
+                    "expected_size": expected_size,
+                    "actual_size": size,
+                },
+            )
+        if checksum and checksum != calculated_checksum:
+            raise StorageException(
+                "File %s does not match expected checksum of %s, but was actually %s",
+                chunk_path,
+                checksum,
+                calculated_checksum,
+            )
+
+    def _download_chunked_file(self, url, download_path, manifest):
+        """
+        Download the chunks listed in ``manifest`` concurrently.
+
+        The file is preallocated to its full size and each chunk is written
+        at its own offset, so chunks are never concatenated from temporary
+        files. Each chunk is verified against the checksum in the manifest.
+
+        :raises: StorageException if a chunk can't be downloaded; the partial
+            file is removed
+        """
+        root = etree.fromstring(manifest)
+        expected_size = int(root.findtext("header/sourceContent/byteSize"))
+        chunks = []
+        offset = 0
+        for e in root.findall("chunks/chunk"):
+            size = int(e.findtext("byteSize"))
+            chunk_url = self.duraspace_url + urllib.parse.quote(e.attrib["chunkId"])
+            chunk_path = chunk_url.replace(url, download_path)
+            chunks.append((chunk_url, offset, size, e.findtext("md5"), chunk_path))
+            offset += size
+        if offset != expected_size:
+            raise StorageException(
+                _(
+                    "Chunks of %(url)s add up to %(actual_size)s bytes instead of %(expected_size)s bytes"
+                )
+                % {"url": url, "actual_size": offset, "expected_size": expected_size}
+            )
+
+        self.space.create_local_directory(download_path)
+        LOGGER.debug("Writing %d chunks to %s", len(chunks), download_path)
+        with open(download_path, "wb") as f:
+            f.truncate(expected_size)
+
+        def download(chunk):
+            chunk_url, offset, size, md5, chunk_path = chunk
+            self._download_chunk(
+                chunk_url, download_path, offset, size, md5, chunk_path
+            )
+
+        try:
+            with concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.TRANSFER_THREADS
+            ) as executor:
+                futures = [executor.submit(download, chunk) for chunk in chunks]
+                try:
+                    for future in futures:
+                        future.result()
+                finally:
+                    # Don't start downloads still queued if one of them failed.
+                    for future in futures:
+                        future.cancel()
+        except Exception:
+            os.remove(download_path)
+            raise
+
+    def _download_file(self, url, download_path):
         """
         Helper to download files from DuraCloud.
 
+        Responses are streamed to disk, and chunked files are downloaded
+        concurrently (see ``_download_chunked_file``).
+
         :param url: URL to fetch the file from.
         :param download_path: Absolute path to store the downloaded file at.
         :return: True on success, False if file not found
@@ -224,9 +403,10 @@ class Duracloud(models.Model):
         """
         LOGGER.debug("URL: %s", url)
         request = self._generate_duracloud_request(url)
-        response = self.session.send(request)
+        response = self.session.send(request, stream=True)
         LOGGER.debug("Response: %s", response)
         if response.status_code == 404:
+            response.close()
             # Check if chunked by looking for a .dura-manifest
             manifest_url = url + self.MANIFEST_SUFFIX
             LOGGER.debug("Manifest URL: %s", manifest_url)
@@ -235,80 +415,17 @@ class Duracloud(models.Model):
             # No manifest - this file does not exist
             if not response.ok:
                 return False
-
-            # Get chunks, expected size, checksum
-            root = etree.fromstring(response.content)
-            expected_size = int(root.findtext("header/sourceContent/byteSize"))
-            checksum = root.findtext("header/sourceContent/md5")
-            chunk_elements = list(root.findall("chunks/chunk"))
-            # Download each chunk and append to original file
-            self.space.create_local_directory(download_path)
-            LOGGER.debug("Writing to %s", download_path)
-            with open(download_path, "wb") as output_f:
-                for e in chunk_elements:
-                    # Parse chunk element
-                    chunk = e.attrib["chunkId"]
-                    size = int(e.findtext("byteSize"))
-                    md5 = e.findtext("md5")
-                    # Download
-                    chunk_url = self.duraspace_url + urllib.parse.quote(chunk)
-                    LOGGER.debug("Chunk URL: %s", chunk_url)
-                    chunk_path = chunk_url.replace(url, download_path)
-                    LOGGER.debug("Chunk path: %s", chunk_path)
-                    self._download_file(chunk_url, chunk_path, size, md5)
-                    # Append to output
-                    with open(chunk_path, "rb") as chunk_f:
-                        shutil.copyfileobj(chunk_f, output_f)
-                    # Delete chunk_path
-                    os.remove(chunk_path)
+            self._download_chunked_file(url, download_path, response.content)
         elif response.status_code != 200:
             LOGGER.warning("Response: %s when fetching %s", response, url)
             LOGGER.warning("Response text: %s", response.text)
+            response.close()
             raise StorageException("Unable to fetch %s" % url)
         else:  # Status code 200 - file exists
             self.space.create_local_directory(download_path)
             LOGGER.debug("Writing to %s", download_path)
             with open(download_path, "wb") as f:
-                f.write(response.content)
-
-        # Verify file, if size or checksum is known
-        if expected_size and os.path.getsize(download_path) != expected_size:
-            if retry < 3:
-                LOGGER.error(
-                    "[RETRY=%(retry)d] File %(path)s does not match expected size of %(expected_size)s bytes, but was actually %(actual_size)s bytes"
-                    % {
-                        "retry": retry + 1,
-                        "path": download_path,
-                        "expected_size": expected_size,
-                        "actual_size": os.path.getsize(download_path),
-                    }
-                )
-                return self._download_file(
-                    url,
-                    download_path,
-                    expected_size=expected_size,
-                    checksum=checksum,
-                    retry=retry + 1,
-                )
-            else:
-                raise StorageException(
-                    _(
-                        "File %(path)s does not match expected size of %(expected_size)s bytes, but was actually %(actual_size)s bytes"
-                    ),
-                    {
-                        "path": download_path,
-                        "expected_size": expected_size,
-                        "actual_size": os.path.getsize(download_path),
-                    },
-                )
-        calculated_checksum = utils.generate_checksum(download_path, "md5")
-        if checksum and checksum != calculated_checksum.hexdigest():
-            raise StorageException(
-                "File %s does not match expected checksum of %s, but was actually %s",
-                download_path,
-                checksum,
-                calculated_checksum.hexdigest(),
-            )
+                self._write_response(response, f)
 
         return True
 
@@ -333,26 +450,15 @@ class Duracloud(models.Model):
                 dest = entry.replace(src_path, dest_path, 1)
                 self._download_file(url, dest)
 
-    def _process_chunk(self, f, chunk_path):
-        bytes_read = 0
-
-        with open(chunk_path, "wb") as fchunk:
-            while bytes_read < self.CHUNK_SIZE:
-                data = f.read(self.BUFFER_SIZE)
-                fchunk.write(data)
-
-                length = len(data)
-
-                if length < self.BUFFER_SIZE:
-                    raise StopIteration(_("End of file reached"))
-                else:
-                    bytes_read += length
-
     def _upload_file(self, url, upload_file, resume=False):
         """
         Upload a file of any size to Duracloud.
 
         If the file is larger that self.CHUNK_SIZE, will chunk it and upload chunks and manifest.
+        The file is read once to compute the checksums of the chunks and of
+        the whole file, and each chunk is handed to a pool of
+        self.TRANSFER_THREADS uploads as soon as its checksum is known. Chunks
+        are streamed from their offset in the file, no copies are written.
 
         :param url: URL to upload the file to.
         :param upload_file: Absolute path to the file to upload.
@@ -377,8 +483,6 @@ class Duracloud(models.Model):
                 url.replace(self.duraspace_url, "", 1)
             ).lstrip("/")
             LOGGER.debug("File name: %s", relative_path)
-            checksum = utils.generate_checksum(upload_file, "md5")
-            LOGGER.debug("Checksum for %s: %s", upload_file, checksum.hexdigest())
             root = etree.Element(
                 "{duracloud.org}chunksManifest", nsmap={"dur": "duracloud.org"}
             )
@@ -386,53 +490,79 @@ class Duracloud(models.Model):
             content = etree.SubElement(header, "sourceContent", contentId=relative_path)
             etree.SubElement(content, "mimetype").text = "application/octet-stream"
             etree.SubElement(content, "byteSize").text = str(filesize)
-            etree.SubElement(content, "md5").text = checksum.hexdigest()
+            # Filled in once the whole file has been read
+            md5_e = etree.SubElement(content, "md5")
             chunks = etree.SubElement(root, "chunks")
-            # Split file into chunks
-            with open(upload_file, "rb") as f:
-                # If resume, check if chunks already exists
-                if resume:
-                    chunklist = set(self._get_files_list(relative_path))
-                    LOGGER.debug("Chunklist %s", chunklist)
-                file_complete = False
-                i = 0
-                while not file_complete:
-                    # Setup chunk info
-                    chunk_suffix = ".dura-chunk-" + str(i).zfill(4)
-                    chunk_path = upload_file + chunk_suffix
-                    LOGGER.debug("Chunk path: %s", chunk_path)
-                    chunk_url = url + chunk_suffix
-                    LOGGER.debug("Chunk URL: %s", chunk_url)
-                    chunkid = relative_path + chunk_suffix
-                    LOGGER.debug("Chunk ID: %s", chunkid)
-                    try:
-                        self._process_chunk(f, chunk_path)
-                    except StopIteration:
-                        file_complete = True
-                    # Make chunk element
-                    # <chunk chunkId="chunked/chunked_image.jpg.dura-chunk-0000" index="0">
-                    #   <byteSize>2097152</byteSize>
-                    #   <md5>ddbb227beaac5a9dc34eb49608997abf</md5>
-                    # </chunk>
-                    checksum = utils.generate_checksum(chunk_path)
-                    chunk_e = etree.SubElement(
-                        chunks, "chunk", chunkId=chunkid, index=str(i)
-                    )
-                    etree.SubElement(chunk_e, "byteSize").text = str(
-                        os.path.getsize(chunk_path)
-                    )
-                    etree.SubElement(chunk_e, "md5").text = checksum.hexdigest()
-                    # Upload chunk
-                    # Check if chunk exists already
-                    if resume and chunkid in chunklist:
-                        LOGGER.info(
-                            "%s already in Duracloud, skipping upload", chunk_path
+            # If resume, check if chunks already exists
+            chunklist = set()
+            if resume:
+                chunklist = set(self._get_files_list(relative_path))
+                LOGGER.debug("Chunklist %s", chunklist)
+            checksum = hashlib.md5()
+            executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.TRANSFER_THREADS
+            )
+            uploads = []
+            try:
+                with open(upload_file, "rb") as f:
+                    for i, offset in enumerate(range(0, filesize, self.CHUNK_SIZE)):
+                        # Setup chunk info
+                        length = min(self.CHUNK_SIZE, filesize - offset)
+                        chunk_suffix = ".dura-chunk-" + str(i).zfill(4)
+                        chunk_url = url + chunk_suffix
+                        LOGGER.debug("Chunk URL: %s", chunk_url)
+                        chunkid = relative_path + chunk_suffix
+                        LOGGER.debug("Chunk ID: %s", chunkid)
+                        chunk_checksum = hashlib.md5()
+                        remaining = length
+                        while remaining:
+                            data = f.read(min(self.BUFFER_SIZE, remaining))
+                            if not data:
+                                raise StorageException(
+                                    _("%(path)s changed while being uploaded")
+                                    % {"path": upload_file}
+                                )
+                            checksum.update(data)
+                            chunk_checksum.update(data)
+                            remaining -= len(data)
+                        # Make chunk element
+                        # <chunk chunkId="chunked/chunked_image.jpg.dura-chunk-0000" index="0">
+                        #   <byteSize>2097152</byteSize>
+                        #   <md5>ddbb227beaac5a9dc34eb49608997abf</md5>
+                        # </chunk>
+                        chunk_e = etree.SubElement(
+                            chunks, "chunk", chunkId=chunkid, index=str(i)
+                        )
+                        etree.SubElement(chunk_e, "byteSize").text = str(length)
+                        etree.SubElement(
+                            chunk_e, "md5"
+                        ).text = chunk_checksum.hexdigest()
+                        # Upload chunk
+                        # Check if chunk exists already
+                        if resume and chunkid in chunklist:
+                            LOGGER.info(
+                                "%s already in Duracloud, skipping upload", chunkid
+                            )
+                            continue
+                        uploads.append(
+                            executor.submit(
+                                self._upload_chunk,
+                                chunk_url,
+                                upload_file,
+                                chunk_checksum.hexdigest(),
+                                offset=offset,
+                                length=length,
+                            )
                         )
-                    else:
-                        self._upload_chunk(chunk_url, chunk_path, checksum.hexdigest())
-                    # Delete chunk
-                    os.remove(chunk_path)
-                    i += 1
+                for upload in uploads:
+                    upload.result()
+            finally:
+                # Don't start uploads still queued if one of them failed.
+                for upload in uploads:
+                    upload.cancel()
+                executor.shutdown()
+            md5_e.text = checksum.hexdigest()
+            LOGGER.debug("Checksum for %s: %s", upload_file, md5_e.text)
             # Write .dura-manifest
             manifest_path = upload_file + self.MANIFEST_SUFFIX
             manifest_url = url + self.MANIFEST_SUFFIX
@@ -453,17 +583,21 @@ class Duracloud(models.Model):
             # Example URL: https://trial.duracloud.org/durastore/trial261//ts/test.txt
             self._upload_chunk(url, upload_file, None)
 
-    def _upload_chunk(self, url, upload_file, checksum=None, retry_attempts=3):
+    def _upload_chunk(
+        self, url, upload_file, checksum=None, retry_attempts=3, offset=0, length=None
+    ):
         """
-        Upload a single file to Duracloud.
+        Upload a single file, or ``length`` bytes of it from ``offset``, to Duracloud.
 
-        The file size must be less than self.CHUNK_SIZE.
-        Call _upload_file_check_chunking if the file might be larger.
+        The size uploaded must be less than self.CHUNK_SIZE.
+        Call _upload_file if the file might be larger.
 
         :param url: URL to upload the file to.
         :param upload_file: Absolute path to the file to upload.
-        :param checksum: An optional string md5 checksum of the file.
+        :param checksum: An optional string md5 checksum of the data uploaded.
         :param int retry_attempts: Number of retry attempts left.
+        :param int offset: Position in the file of the data to upload.
+        :param int length: Number of bytes to upload, or None for the whole file.
         :returns: None
         :raises: StorageException if error storing file
         """
@@ -473,20 +607,24 @@ class Duracloud(models.Model):
 
         headers = {"Content-MD5": checksum}
 
-        mtype = utils.get_mimetype(upload_file)
-        if mtype:
-            headers["Content-Type"] = mtype
+        if length is None:
+            mtype = utils.get_mimetype(upload_file)
+            if mtype:
+                headers["Content-Type"] = mtype
 
         try:
             LOGGER.debug("PUT URL: %s", url)
             with open(upload_file, "rb") as f:
-                response = self.session.put(url, data=f, headers=headers)
+                data = f if length is None else _FileRange(f, offset, length)
+                response = self.session.put(url, data=data, headers=headers)
             LOGGER.debug("Response: %s", response)
         except Exception:
             LOGGER.exception("Error in PUT to %s", url)
             if retry_attempts > 0:
                 LOGGER.info("Retrying %s", upload_file)
-                self._upload_chunk(url, upload_file, checksum, retry_attempts - 1)
+                self._upload_chunk(
+                    url, upload_file, checksum, retry_attempts - 1, offset, length
+                )
             else:
                 raise
         else:
@@ -494,7 +632,9 @@ class Duracloud(models.Model):
                 LOGGER.warning("%s: Response: %s", response, response.text)
                 if retry_attempts > 0:
                     LOGGER.info("Retrying %s", upload_file)
-                    self._upload_chunk(url, upload_file, checksum, retry_attempts - 1)
+                    self._upload_chunk(
+                        url, upload_file, checksum, retry_attempts - 1, offset, length
+                    )
                 else:
                     raise StorageException(
                         _("Unable to store %(filename)s") % {"filename": upload_file}
@@ -201,6 +201,8 @@ class File(models.Model):
         default=uuid4,
     )
 
+    # The name, source_id, source_package and accessionid columns are indexed
+    # by the 0042_file_lookup_indexes migration, with a prefix length on MySQL.
     class Meta:
         verbose_name = _("File")
         app_label = "locations"
@@ -1,7 +1,13 @@
 import datetime
+import hashlib
 import logging
 import os
+import queue
+import shutil
+import subprocess
 import tarfile
+import tempfile
+import threading
 
 from common import gpgutils
 from common import premis
@@ -16,6 +22,10 @@ from .package import Package
 
 LOGGER = logging.getLogger(__name__)
 
+# Number of decrypted chunks (of python-gnupg's buffer size) held in memory
+# while waiting for the consumer of ``GPG.stream_decrypted``.
+DECRYPT_QUEUE_SIZE = 64
+
 
 METS_BNS = "{" + utils.NSMAP["mets"] + "}"
 PREMIS_BNS = "{" + utils.NSMAP["premis"] + "}"
@@ -25,6 +35,10 @@ class GPGException(Exception):
     pass
 
 
+class GPGMemberNotFoundException(GPGException):
+    """The member to extract from an encrypted tarball is not in it."""
+
+
 class GPG(models.Model):
     """Space for storing packages as files encrypted via GnuPG.
     When an AIP is moved to a GPG space, it is encrypted with a
@@ -88,6 +102,9 @@ class GPG(models.Model):
         # somewhere on the storage service. In this case, we decrypt at the
         # destination.
         if os.path.exists(src_path):
+            # Make sure the package can be found from its encrypted path,
+            # e.g. when it was encrypted before paths were recorded.
+            _find_encr_path_package(src_path)
             self.space.move_rsync(src_path, dst_path)
             _gpg_decrypt(dst_path)
         # When the source path does NOT exist, we are copying a single file or
@@ -149,6 +166,7 @@ class GPG(models.Model):
         if package.encryption_key_fingerprint != key_fingerprint:
             package.encryption_key_fingerprint = key_fingerprint
             package.save()
+        GPGPackagePath.record(dst_path, package)
         # If the package should have a pointer file, return an object
         # documenting the effects of storing the package, such that this
         # ``StorageEffects`` object can be used to update the pointer file
@@ -212,6 +230,47 @@ class GPG(models.Model):
             _gpg_encrypt(encr_path, key_fingerprint)
         return ret
 
+    def stream_decrypted(self, path):
+        """Return an iterator over the decrypted contents of the encrypted
+        package at ``path``. Decryption happens as the iterator is consumed,
+        nothing is written to disk. ``GPGException`` is raised once the
+        contents are exhausted if decryption failed.
+        """
+        return _iter_gpg_decrypt(path)
+
+    def extract_decrypted(self, path, member, extract_path, tar_flags=""):
+        """Extract ``member`` from the tarball encrypted at ``path`` into
+        ``extract_path``. The decrypted data is piped into ``tar`` (called
+        with the extra ``tar_flags``, e.g. ``z`` for a gzipped tarball) so
+        only the member is written to disk. ``GPGMemberNotFoundException`` is
+        raised if the tarball does not contain ``member``.
+        """
+        LOGGER.info("Extracting %s from encrypted %s", member, path)
+        tar = _TarPipe([f"-x{tar_flags}f", "-", "-C", extract_path, member])
+        try:
+            decr_result = gpgutils.gpg_decrypt_stream(path, tar.write)
+        finally:
+            error = tar.close()
+        if decr_result.ok and error and "Not found in archive" in error:
+            fail_msg = _("%(member)s not found in %(path)s") % {
+                "member": member,
+                "path": path,
+            }
+            LOGGER.warning(fail_msg)
+            raise GPGMemberNotFoundException(fail_msg)
+        if not decr_result.ok or error:
+            fail_msg = _(
+                "Failed to extract %(member)s from %(path)s. Reason: %(reason)s"
+                % {
+                    "member": member,
+                    "path": path,
+                    "reason": error or decr_result.status,
+                }
+            )
+            LOGGER.error(fail_msg)
+            raise GPGException(fail_msg)
+        return os.path.join(extract_path, member)
+
     def verify(self):
         """Verify that the space is accessible to the storage service."""
         # QUESTION: What is the purpose of this method? Investigation
@@ -222,26 +281,75 @@ class GPG(models.Model):
         self.space.last_verified = datetime.datetime.now()
 
 
+class GPGPackagePath(models.Model):
+    """Path of a package encrypted in a GPG space.
+
+    Lets the package (and so the key it was encrypted with) be found from
+    the encrypted path with an indexed lookup. The path itself may be too
+    long to index, so its SHA-256 digest is what is looked up.
+    """
+
+    path_hash = models.CharField(max_length=64, unique=True, editable=False)
+    path = models.TextField()
+    package = models.ForeignKey("Package", to_field="uuid", on_delete=models.CASCADE)
+
+    class Meta:
+        verbose_name = _("GPG package path")
+        app_label = "locations"
+
+    def __str__(self):
+        return self.path
+
+    @staticmethod
+    def hash_path(path):
+        return hashlib.sha256(os.path.normpath(path).encode("utf8")).hexdigest()
+
+    @classmethod
+    def record(cls, path, package):
+        """Remember that ``package`` is encrypted at ``path``."""
+        path = os.path.normpath(path)
+        cls.objects.update_or_create(
+            path_hash=cls.hash_path(path),
+            defaults={"path": path, "package": package},
+        )
+
+
 def _gpg_encrypt(path, key_fingerprint):
     """Use GnuPG to encrypt the package at ``path`` using the GPG key
     matching the fingerprint ``key_fingerprint``. Returns the path to the
     encrypted file as well as a Python-GnuPG encryption result object with
     ``ok`` and ``status`` attributes, see
     https://pythonhosted.org/python-gnupg/.
+
+    A directory is streamed through ``tar`` straight into GnuPG, so the only
+    thing written is the encrypted file and no intermediate tarball is
+    needed.
     """
-    tar_created = False
-    if os.path.isdir(path):
-        utils.create_tar(path)
-        tar_created = True
-    encr_path, result = gpgutils.gpg_encrypt_file(path, key_fingerprint)
-    if os.path.isfile(encr_path) and result.ok:
+    encr_path = path + ".gpg"
+    is_dir = os.path.isdir(path)
+    tar_ok = True
+    if is_dir:
+        tar = _tar_stream(path)
+        try:
+            result = gpgutils.gpg_encrypt_stream(tar.stdout, encr_path, key_fingerprint)
+        finally:
+            tar.stdout.close()
+            tar_ok = tar.wait() == 0
+    else:
+        encr_path, result = gpgutils.gpg_encrypt_file(path, key_fingerprint)
+    if tar_ok and result.ok and os.path.isfile(encr_path):
         LOGGER.info("Successfully encrypted %s at %s", path, encr_path)
-        os.remove(path)
+        if is_dir:
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
         os.rename(encr_path, path)
         return path, result
     else:
-        if tar_created:
-            utils.extract_tar(path)
+        # Whatever GnuPG managed to write is of no use, the package at
+        # ``path`` is left untouched.
+        if os.path.isfile(encr_path):
+            os.remove(encr_path)
         fail_msg = _(
             "An error occured when attempting to encrypt" " %(path)s" % {"path": path}
         )
@@ -249,6 +357,16 @@ def _gpg_encrypt(path, key_fingerprint):
         raise GPGException(fail_msg)
 
 
+def _tar_stream(path):
+    """Start ``tar`` writing an archive of the directory at ``path`` to its
+    stdout. The archive is laid out like the one ``utils.create_tar`` makes.
+    """
+    path = os.path.normpath(path)
+    cmd = ["tar", "-C", os.path.dirname(path), "-cf", "-", os.path.basename(path)]
+    LOGGER.info("Streaming archive of %s", path)
+    return subprocess.Popen(cmd, stdout=subprocess.PIPE)
+
+
 def _db_engine():
     if "sqlite" in settings.DATABASES["default"]["ENGINE"]:
         return "sqlite"
@@ -261,7 +379,55 @@ def _encr_path2key_fingerprint(encr_path):
     """Given an encrypted path, return the fingerprint of the GPG key
     used to encrypt the package. Since it was already encrypted, its
     model must have a GPG fingerprint.
+
+    ``encr_path`` is the path of the package or of a file within it.
+    """
+    package = _find_encr_path_package(encr_path)
+    if package is None:
+        fail_msg = f"Unable to find package matching encrypted path {encr_path}"
+        LOGGER.error(fail_msg)
+        raise GPGException(fail_msg)
+    return package.encryption_key_fingerprint
+
+
+def _find_encr_path_package(encr_path):
+    """Return the package encrypted at ``encr_path`` (or at one of its
+    ancestors), or ``None``. The package is looked up through
+    ``GPGPackagePath``, falling back to a scan of the package table for
+    packages whose path has not been recorded, which is then recorded.
     """
+    package = _encr_path2package(encr_path)
+    if package is None:
+        package = _scan_encr_path2package(encr_path)
+        if package is not None:
+            GPGPackagePath.record(package.full_path, package)
+    return package
+
+
+def _encr_path2package(encr_path):
+    """Return the package recorded as encrypted at ``encr_path`` or at one of
+    its ancestors, or ``None``.
+    """
+    ancestors = {}
+    path = os.path.normpath(encr_path)
+    while path not in ancestors.values():
+        ancestors[GPGPackagePath.hash_path(path)] = path
+        path = os.path.dirname(path)
+    records = GPGPackagePath.objects.filter(path_hash__in=ancestors).select_related(
+        "package__current_location__space"
+    )
+    # The longest path is the package itself, shorter ones would be
+    # packages stored above it.
+    for record in sorted(records, key=lambda r: len(r.path), reverse=True):
+        package = record.package
+        if os.path.normpath(package.full_path) == record.path:
+            return package
+        # The package has been moved since.
+        record.delete()
+    return None
+
+
+def _scan_encr_path2package(encr_path):
     sql = (
         "SELECT * FROM locations_package WHERE %s LIKE CONCAT('%%',"
         " current_path, '%%')"
@@ -272,12 +438,7 @@ def _encr_path2key_fingerprint(encr_path):
             ' current_path || "%"'
         )
     matches = list(Package.objects.raw(sql, [encr_path]))
-    try:
-        return matches[0].encryption_key_fingerprint
-    except IndexError:
-        fail_msg = f"Unable to find package matching encrypted path {encr_path}"
-        LOGGER.error(fail_msg)
-        raise GPGException(fail_msg)
+    return matches[0] if matches else None
 
 
 def _parse_gpg_version(raw_gpg_version):
@@ -301,27 +462,210 @@ def _gpg_decrypt(path):
         fail_msg = _(f"Cannot decrypt file at {path}; no such file.")
         LOGGER.error(fail_msg)
         raise GPGException(fail_msg)
-    decr_path = path + ".decrypted"
-    decr_result = gpgutils.gpg_decrypt_file(path, decr_path)
-    if decr_result.ok and os.path.isfile(decr_path):
-        LOGGER.info("Successfully decrypted %s to %s.", path, decr_path)
-        os.remove(path)
-        os.rename(decr_path, path)
+    writer = _DecryptedPackageWriter(path)
+    try:
+        decr_result = gpgutils.gpg_decrypt_stream(path, writer.write)
+    finally:
+        written = writer.close()
+    if decr_result.ok and written:
+        LOGGER.info("Successfully decrypted %s.", path)
+        writer.commit()
     else:
+        writer.discard()
         fail_msg = _(
             "Failed to decrypt %(path)s. Reason: %(reason)s"
-            % {"path": path, "reason": decr_result.status}
+            % {"path": path, "reason": writer.error or decr_result.status}
         )
         LOGGER.info(fail_msg)
         raise GPGException(fail_msg)
-    # A tarfile without an extension is one that we created in this space
-    # using an uncompressed AIP as input. We extract those here.
-    if tarfile.is_tarfile(path) and os.path.splitext(path)[1] == "":
-        LOGGER.info("%s is a tarfile so we are extracting it", path)
-        utils.extract_tar(path)
     return path
 
 
+class _DecryptedPackageWriter:
+    """Writes the data decrypted from the package at ``path`` as GnuPG
+    produces it.
+
+    A tarfile without an extension is one that we created in this space
+    using an uncompressed AIP as input. Those are recognized by their first
+    block and piped into ``tar``, so the tarball itself never hits the disk.
+    Anything else is written to ``path`` + ``.decrypted``. Nothing replaces
+    the encrypted file until ``commit`` is called.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.error = None
+        self._head = b""
+        self._out = None
+        self._extract_dir = None
+        self._decr_path = path + ".decrypted"
+
+    def write(self, data):
+        # Called from the thread reading GnuPG's stdout. Errors are recorded
+        # instead of raised so that GnuPG's output is still drained, and
+        # returning ``False`` keeps python-gnupg from buffering the data.
+        if self.error is not None:
+            return False
+        if self._out is None:
+            self._head += data
+            if data and len(self._head) < tarfile.BLOCKSIZE:
+                return False
+            data, self._head = self._head, b""
+        try:
+            if self._out is None:
+                self._open(data)
+            self._out.write(data)
+        except OSError as err:
+            self.error = err
+        return False
+
+    def _open(self, head):
+        if _is_tar_header(head) and os.path.splitext(self.path)[1] == "":
+            LOGGER.info("%s is a tarfile so we are extracting it", self.path)
+            # Extract next to the encrypted file, which still holds the name
+            # of the package's directory.
+            self._extract_dir = tempfile.mkdtemp(
+                prefix=".decrypting-", dir=os.path.dirname(self.path)
+            )
+            self._out = _TarPipe(["-xf", "-", "-C", self._extract_dir])
+        else:
+            self._out = open(self._decr_path, "wb")
+
+    def close(self):
+        """Finish writing and return whether all of the data was written."""
+        if self._out is not None:
+            try:
+                error = self._out.close()
+            except OSError as err:
+                error = err
+            self.error = error or self.error
+        return self._out is not None and self.error is None
+
+    def commit(self):
+        """Replace the encrypted file with what was decrypted."""
+        os.remove(self.path)
+        if self._extract_dir is None:
+            os.rename(self._decr_path, self.path)
+            return
+        parent = os.path.dirname(self.path)
+        for name in os.listdir(self._extract_dir):
+            os.rename(os.path.join(self._extract_dir, name), os.path.join(parent, name))
+        os.rmdir(self._extract_dir)
+
+    def discard(self):
+        """Remove what was decrypted, leaving the encrypted file in place."""
+        if self._extract_dir is not None:
+            shutil.rmtree(self._extract_dir, ignore_errors=True)
+        elif os.path.isfile(self._decr_path):
+            os.remove(self._decr_path)
+
+
+class _TarPipe:
+    """Runs ``tar`` with ``args``, reading the archive from its stdin.
+
+    ``write`` can be used as python-gnupg's ``on_data`` callback: it never
+    raises, so that GnuPG's output is still drained if ``tar`` gives up, and
+    it returns ``False`` so the data is not also buffered in memory.
+    """
+
+    def __init__(self, args):
+        self._stderr = tempfile.TemporaryFile()
+        self._proc = subprocess.Popen(
+            ["tar"] + args, stdin=subprocess.PIPE, stderr=self._stderr
+        )
+        self._stopped = False
+
+    def write(self, data):
+        if data and not self._stopped:
+            try:
+                self._proc.stdin.write(data)
+            except OSError:
+                # tar exited, ``close`` tells whether it was successful.
+                self._stopped = True
+        return False
+
+    def close(self):
+        """Wait for ``tar`` to finish and return why it failed, if it did."""
+        try:
+            self._proc.stdin.close()
+        except OSError:
+            pass
+        returncode = self._proc.wait()
+        self._stderr.seek(0)
+        stderr = self._stderr.read().decode("utf8", "replace").strip()
+        self._stderr.close()
+        if returncode != 0:
+            return f"tar exited with status {returncode}: {stderr}"
+        return None
+
+
+def _is_tar_header(block):
+    """Return whether ``block`` is a valid (uncompressed) tar header."""
+    try:
+        tarfile.TarInfo.frombuf(
+            block[: tarfile.BLOCKSIZE], tarfile.ENCODING, "surrogateescape"
+        )
+    except tarfile.HeaderError:
+        return False
+    return True
+
+
+def _iter_gpg_decrypt(path):
+    """Yield the decrypted contents of the file at ``path`` as GnuPG produces
+    them. GnuPG runs in a separate thread and is held back once
+    ``DECRYPT_QUEUE_SIZE`` chunks are waiting to be consumed. It is stopped
+    if the generator is closed before the contents are exhausted.
+    """
+    if not os.path.isfile(path):
+        fail_msg = _(f"Cannot decrypt file at {path}; no such file.")
+        LOGGER.error(fail_msg)
+        raise GPGException(fail_msg)
+    chunks = queue.Queue(maxsize=DECRYPT_QUEUE_SIZE)
+    abandoned = threading.Event()
+
+    def put(item):
+        # Give up once the consumer is gone. GnuPG is then stopped and what
+        # it had already produced is discarded.
+        while not abandoned.is_set():
+            try:
+                chunks.put(item, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+    def on_data(data):
+        if data:
+            put(data)
+        return False
+
+    def decrypt():
+        try:
+            decr_result = gpgutils.gpg_decrypt_stream(path, on_data, stop=abandoned)
+            put((decr_result.ok, decr_result.status))
+        except Exception as err:
+            put((False, str(err)))
+
+    threading.Thread(target=decrypt, daemon=True).start()
+    try:
+        while True:
+            item = chunks.get()
+            if isinstance(item, bytes):
+                yield item
+                continue
+            ok, status = item
+            if not ok:
+                fail_msg = _(
+                    "Failed to decrypt %(path)s. Reason: %(reason)s"
+                    % {"path": path, "reason": status}
+                )
+                LOGGER.error(fail_msg)
+                raise GPGException(fail_msg)
+            LOGGER.info("Successfully streamed decrypted %s.", path)
+            return
+    finally:
+        abandoned.set()
+
+
 def _get_encrypted_path(encr_path):
     """Attempt to return the existing file path that is ``encr_path`` or
     one of its ancestor paths. This is needed when we are asked to move a
@@ -202,7 +202,7 @@ class Lockssomatic(models.Model):
 
         # Add LOCKSS URLs to each chunk
         if not self.pointer_root:
-            self.pointer_root = etree.parse(package.full_pointer_file_path)
+            self.pointer_root = utils.read_pointer_file(package.full_pointer_file_path)
         files = self.pointer_root.findall(
             ".//mets:fileSec/mets:fileGrp[@USE='LOCKSS chunk']/mets:file",
             namespaces=utils.NSMAP,
@@ -263,6 +263,7 @@ class Lockssomatic(models.Model):
                     encoding="utf-8",
                 )
             )
+        utils.forget_pointer_file(package.full_pointer_file_path)
 
         # Update value if different
         package.status = status
@@ -436,7 +437,7 @@ class Lockssomatic(models.Model):
         """
         # Parse pointer file
         if not self.pointer_root:
-            self.pointer_root = etree.parse(package.full_pointer_file_path)
+            self.pointer_root = utils.read_pointer_file(package.full_pointer_file_path)
 
         # Check if file is already split, and if so just return split files
         if self.pointer_root.xpath(
@@ -576,6 +577,7 @@ class Lockssomatic(models.Model):
                     encoding="utf-8",
                 )
             )
+        utils.forget_pointer_file(package.full_pointer_file_path)
 
         return output_files
 
@@ -659,7 +661,7 @@ class Lockssomatic(models.Model):
 
         # Add each chunk to the atom entry
         if not self.pointer_root:
-            self.pointer_root = etree.parse(package.full_pointer_file_path)
+            self.pointer_root = utils.read_pointer_file(package.full_pointer_file_path)
         entry.register_namespace("lom", utils.NSMAP["lom"])
         for index, file_path in enumerate(output_files):
             # Get external URL
@@ -1,4 +1,5 @@
 import codecs
+import concurrent.futures
 import copy
 import distutils.dir_util
 import json
@@ -13,15 +14,17 @@ from pathlib import Path
 from uuid import uuid4
 
 import bagit
-import importlib_resources
 import jsonfield
 import metsrw
 import requests
 from common import fields
+from common import pointer_validation
 from common import premis
 from common import utils
 from django.conf import settings
+from django.db import connection
 from django.db import models
+from django.db import transaction
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from lxml import etree
@@ -30,10 +33,10 @@ from metsrw.plugins import premisrw
 from locations import signals
 
 from . import StorageException
+from .async_manager import AsyncManager
 from .event import Callback
 from .event import CallbackError
 from .event import File
-from .fixity_log import FixityLog
 from .location import Location
 from .space import PosixMoveUnsupportedError
 from .space import Space
@@ -43,6 +46,9 @@ __all__ = ("Package",)
 
 LOGGER = logging.getLogger(__name__)
 
+# Number of File rows written per query when indexing the files of a transfer.
+FILE_INDEX_BATCH_SIZE = 1000
+
 
 class Package(models.Model):
     """A package stored in a specific location."""
@@ -115,6 +121,59 @@ class Package(models.Model):
         related_name="replicas",
         on_delete=models.CASCADE,
     )
+    # How the package is stored, recorded when it is stored so it can be
+    # known without accessing the package. ``None`` means unknown, e.g. for
+    # packages stored before these were recorded; see the
+    # populate_package_storage_metadata command.
+    is_file = models.BooleanField(
+        null=True,
+        default=None,
+        db_index=True,
+        help_text=_(
+            "Whether the package is a single file (e.g. compressed) rather than"
+            " a directory"
+        ),
+    )
+    compression = models.CharField(
+        max_length=32,
+        null=True,
+        blank=True,
+        default=None,
+        db_index=True,
+        help_text=_("Compression algorithm of the package, if compressed"),
+    )
+    encrypted = models.BooleanField(
+        null=True,
+        default=None,
+        db_index=True,
+        help_text=_("Whether the package is stored encrypted"),
+    )
+    base_directory = models.CharField(
+        max_length=256,
+        null=True,
+        blank=True,
+        default=None,
+        db_index=True,
+        help_text=_("Name of the directory containing the package's contents"),
+    )
+    # The result of the latest fixity check of the package, copied from its
+    # FixityLog entries by the fixity signals so that it can be queried
+    # without them.
+    last_fixity_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        default=None,
+        db_index=True,
+        help_text=_("Datetime of the latest fixity check of the package"),
+    )
+    last_fixity_success = models.BooleanField(
+        null=True,
+        default=None,
+        db_index=True,
+        help_text=_(
+            "Whether the latest fixity check of the package succeeded, if it ran"
+        ),
+    )
 
     AIP = "AIP"
     AIC = "AIC"
@@ -252,6 +311,54 @@ class Package(models.Model):
         is_file = os.path.isfile(local_path)
         return space_is_encr and is_file
 
+    def _encrypted_tar_flags(self):
+        """Return the ``tar`` flags needed to read this package once it is
+        decrypted, if it is encrypted as a tarball that ``tar`` can read from
+        a stream. Return ``None`` otherwise (e.g., if not encrypted or 7z).
+
+        Encrypted spaces tar uncompressed packages before encrypting them and
+        keep them without an extension.
+        """
+        if self.encrypted is False or not self.is_encrypted(self.full_path):
+            return None
+        is_file = self.is_file
+        if is_file is None:
+            is_file = bool(os.path.splitext(self.full_path)[1])
+        if not is_file:
+            return ""
+        return {
+            utils.COMPRESSION_TAR: "",
+            utils.COMPRESSION_TAR_BZIP2: "j",
+            utils.COMPRESSION_TAR_GZIP: "z",
+        }.get(self.get_compression())
+
+    def get_compression(self):
+        """Return the compression algorithm of this package (one of
+        ``utils.COMPRESSION_ALGORITHMS``), or ``None`` if it is not known, e.g.
+        because the package is not compressed.
+        """
+        if self.compression:
+            return self.compression
+        if self.full_pointer_file_path:
+            return utils.get_compression(self.full_pointer_file_path)
+        return None
+
+    def stream_decrypted(self):
+        """Return an iterator over the contents of this encrypted package,
+        decrypted as it is consumed, and the filename they should be
+        downloaded as. Return ``None`` if the package is not encrypted.
+
+        Uncompressed packages are encrypted as tarballs, so that is what they
+        are downloaded as.
+        """
+        if not self.is_encrypted(self.full_path):
+            return None
+        filename = os.path.basename(self.full_path)
+        if not os.path.splitext(filename)[1]:
+            filename += utils.TAR_EXTENSION
+        child_space = self.current_location.space.get_child_space()
+        return child_space.stream_decrypted(self.full_path), filename
+
     def is_packaged(self, local_path):
         """Determines whether or not the package at ``local_path`` is
         packaged.
@@ -265,6 +372,8 @@ class Package(models.Model):
     @property
     def is_compressed(self):
         """Determines whether or not the package is a compressed file."""
+        if self.is_file is not None:
+            return self.is_file
         full_path = self.get_local_path() or self.fetch_local_path()
         if os.path.isdir(full_path):
             return False
@@ -285,21 +394,20 @@ class Package(models.Model):
 
     @property
     def latest_fixity_check_datetime(self):
-        latest_check = self._latest_fixity_check()
-        return latest_check.datetime_reported if latest_check is not None else None
+        return self.last_fixity_at
 
     @property
     def latest_fixity_check_result(self):
-        latest_check = self._latest_fixity_check()
-        return latest_check.success if latest_check is not None else None
+        return self.last_fixity_success
 
-    def _latest_fixity_check(self):
-        try:
-            return FixityLog.objects.filter(package=self).order_by(
-                "-datetime_reported"
-            )[0]  # limit 1
-        except IndexError:
-            return None
+    def record_fixity_check(self, fixity_log):
+        """Record ``fixity_log`` as the latest fixity check of this package."""
+        self.last_fixity_at = fixity_log.datetime_reported
+        self.last_fixity_success = fixity_log.success
+        Package.objects.filter(pk=self.pk).update(
+            last_fixity_at=self.last_fixity_at,
+            last_fixity_success=self.last_fixity_success,
+        )
 
     def get_download_path(self, lockss_au_number=None):
         full_path = self.fetch_local_path()
@@ -405,9 +513,13 @@ class Package(models.Model):
         The string "package-00000000-0000-0000-0000-000000000000" would be
         returned.
 
-        Note that this currently only supports locally-available packages.
-        If the package is stored externally, raises NotImplementedError.
+        The base directory recorded when the package was stored is returned
+        if there is one. Otherwise, this currently only supports
+        locally-available packages. If the package is stored externally,
+        raises NotImplementedError.
         """
+        if self.base_directory:
+            return self.base_directory
         full_path = self.get_local_path()
         if full_path is None:
             raise NotImplementedError(
@@ -417,26 +529,30 @@ class Package(models.Model):
             )
 
         if self.is_compressed:
-            # Use lsar's JSON output to determine the directories in a
-            # compressed file. Since the index of the base directory may
-            # not be consistent, determine it by filtering all entries
-            # for directories, then determine the directory with the
-            # shortest name. (e.g. foo is the parent of foo/bar)
-            # NOTE: lsar's JSON output is broken in certain circumstances in
-            #       all released versions; make sure to use a patched version
-            #       for this to work.
-            command = ["lsar", "-ja", full_path]
-            output = subprocess.check_output(command).decode("utf8")
-            output = json.loads(output)
-            directories = [
-                d["XADFileName"]
-                for d in output["lsarContents"]
-                if d.get("XADIsDirectory", False)
-            ]
-            directories = sorted(directories, key=len)
-            return directories[0]
+            return _get_archive_base_directory(full_path)
         return os.path.basename(full_path)
 
+    def record_storage_metadata(self, local_path, space, compression=None):
+        """Record how this package is stored, so that it can be answered later
+        without accessing the package: whether it is a single file, its
+        ``compression``, whether it is encrypted in ``space`` and its base
+        directory. ``local_path`` is a local, unencrypted copy of the package.
+        The package is not saved.
+        """
+        self.is_file = os.path.isfile(local_path)
+        self.compression = compression if self.is_file else None
+        self.encrypted = _is_encrypted_space(space)
+        if not self.is_file:
+            self.base_directory = os.path.basename(os.path.normpath(local_path))
+            return
+        try:
+            self.base_directory = _get_archive_base_directory(local_path)
+        except (OSError, ValueError, IndexError, subprocess.CalledProcessError) as err:
+            LOGGER.warning(
+                "Unable to determine the base directory of %s: %s", local_path, err
+            )
+            self.base_directory = None
+
     def _check_quotas(self, dest_space, dest_location):
         """
         Verify that there is enough storage space on dest_space and dest_location for this package.  All sizes in bytes.
@@ -525,7 +641,11 @@ class Package(models.Model):
 
         # If we get here everything went well, update with new location
         self.current_location = to_location
+        if self.encrypted is not None:
+            self.encrypted = _is_encrypted_space(destination_space)
         self.save()
+        # Forget where the package was encrypted before the move.
+        self.gpgpackagepath_set.exclude(path=self.full_path).delete()
         self.current_location.space.update_package_status(self)
         self._update_existing_ptr_loc_info()
 
@@ -610,72 +730,62 @@ class Package(models.Model):
         return success, failures, message
 
     def replicate(self, replicator_location):
+        """Replicate this package to ``replicator_location``, see
+        ``replicate_to``.
+        """
+        self.replicate_to([replicator_location])
+
+    def replicate_to(self, replicator_locations):
         """Replicate this package in the database and on disk by
-        1. creating a new ``Package`` model instance that references this one in
-           its ``replicated_package`` attribute,
-        2. copying the AIP on disk to a new path in the replicator location
-           referenced by ``replicator_location_uuid``,
-        3. creating a new pointer file for the replica, which encodes the
+        1. creating a new ``Package`` model instance per location in
+           ``replicator_locations`` that references this one in its
+           ``replicated_package`` attribute,
+        2. copying the AIP on disk once to the storage service and from there
+           to a new path in each replicator location, concurrently,
+        3. creating a new pointer file for each replica, which encodes the
            replication event, and
-        4. updating the pointer file for the replicated AIP, which encodes the
-           replication event.
+        4. updating the pointer file for the replicated AIP once, which
+           encodes the replication events.
         """
+        if not replicator_locations:
+            return
         # Replicandum is the package to be replicated, i.e., ``self``
         replicandum_location = self.current_location
         replicandum_path = self.current_path
         replicandum_uuid = self.uuid
         replicandum_is_file = utils.package_is_file(replicandum_path)
         LOGGER.info(
-            "Replicating package %s (type is file: %s), to replicator location %s",
+            "Replicating package %s (type is file: %s), to replicator locations %s",
             replicandum_uuid,
             replicandum_is_file,
-            replicator_location.uuid,
+            ", ".join(str(location.uuid) for location in replicator_locations),
         )
 
-        replica_package = self._clone()
-        replica_package.replicated_package = self
-
-        # Remove the /uuid/path from the replica's current_path and replace the
-        # old UUID in the basename with the new UUID.
-        replica_package.current_path = os.path.basename(replicandum_path).replace(
-            str(replicandum_uuid), str(replica_package.uuid), 1
-        )
-        replica_package.current_location = replicator_location
+        replicas = [
+            self._create_replica(replicator_location, replicandum_is_file)
+            for replicator_location in replicator_locations
+        ]
 
-        # Check if enough space on the space and location
+        # Copy replicandum AIP from its source location to the SS once, in the
+        # staging area of the first replica's space, and from there to the
+        # staging areas of the other replicas.
         src_space = replicandum_location.space
-        dest_space = replica_package.current_location.space
-        self._check_quotas(dest_space, replica_package.current_location)
-
-        # Replicate AIP at
-        # destination_location/uuid/split/into/chunks/destination_path
-        uuid_path = utils.uuid_to_path(replica_package.uuid)
-        replica_package.current_path = os.path.join(
-            uuid_path, replica_package.current_path
-        )
-        replica_destination_path = os.path.join(
-            replica_package.current_location.relative_path, replica_package.current_path
-        )
-
-        if not replicandum_is_file:
-            # Ensure directory paths are terminated by a trailing slash.
-            replica_destination_path = os.path.join(replica_destination_path, "")
-
-        replica_package.status = Package.PENDING
-        replica_package.save()
-
-        # Copy replicandum AIP from its source location to the SS
         src_path = os.path.join(replicandum_location.relative_path, replicandum_path)
         if not replicandum_is_file:
             # Ensure directory paths are terminated by a trailing slash.
             src_path = os.path.join(src_path, "")
+        first_replica = replicas[0]
         src_space.move_to_storage_service(
             source_path=src_path,
-            destination_path=replica_package.current_path,
-            destination_space=dest_space,
-        )
-        replica_package.status = Package.STAGING
-        replica_package.save()
+            destination_path=first_replica.package.current_path,
+            destination_space=first_replica.space,
+        )
+        staged_path = first_replica.staging_path
+        for replica in replicas[1:]:
+            _copy_staged_package(staged_path, replica.staging_path)
+        for replica in replicas:
+            replica.package.status = Package.STAGING
+            replica.package.save()
         src_space.post_move_to_storage_service()
 
         # Get the master AIP's pointer file and extract the checksum details
@@ -686,89 +796,146 @@ class Package(models.Model):
             master_checksum_algorithm = master_premis_object.message_digest_algorithm
             master_checksum = master_premis_object.message_digest
 
-            # Calculate the checksum of the replica while we have it locally,
-            # compare it to the master's checksum and create a PREMIS validation
-            # event out of the result.
-            replica_local_path = self.get_local_path()
+            # Calculate the checksum of the replicas once while we have them
+            # locally, compare it to the master's checksum and create a
+            # PREMIS validation event out of the result.
             replica_checksum = utils.generate_checksum(
-                replica_local_path, master_checksum_algorithm
+                staged_path, master_checksum_algorithm
             ).hexdigest()
-            checksum_report = _get_checksum_report(
-                master_checksum,
-                self.uuid,
-                replica_checksum,
-                replica_package.uuid,
-                master_checksum_algorithm,
-            )
-            replication_validation_event = premis.create_replication_validation_event(
-                replica_package.uuid,
-                checksum_report=checksum_report,
-                master_aip_uuid=self.uuid,
-            )
-
-            # Create and write to disk the pointer file for the replica, which
-            # contains the PREMIS replication event.
-            replication_event_uuid = uuid4()
-            replica_pointer_file = self.create_replica_pointer_file(
-                replica_package,
-                replication_event_uuid,
-                replication_validation_event,
-                master_ptr=master_ptr,
-            )
-            write_pointer_file(
-                replica_pointer_file, replica_package.full_pointer_file_path
-            )
-            replica_package.save()
-
-        # Copy replicandum AIP from the SS to replica package's replicator
-        # location.
-        replica_storage_effects = dest_space.move_from_storage_service(
-            source_path=replica_package.current_path,
-            destination_path=replica_destination_path,
-            package=replica_package,
-        )
-        if dest_space.access_protocol not in (Space.LOM, Space.ARKIVUM):
-            replica_package.status = Package.UPLOADED
-        replica_package.stored_date = timezone.now()
-        replica_package.save()
-        dest_space.post_move_from_storage_service(
-            staging_path=replica_package.current_path,
-            destination_path=replica_destination_path,
-            package=replica_package,
-        )
-        self._update_quotas(dest_space, replica_package.current_location)
-
-        # Any effects resulting from AIP storage (e.g., encryption) are
-        # recorded in the replica's pointer file.
-        if replica_storage_effects:
-            # Note: unclear why the existing ``replica_pointer_file`` is
-            # a ``lxml.etree._Element`` instance and not the expected
-            # ``premisrw.PREMISObject``. As a result, the following is required:
-            replica_pointer_file = replica_package.get_pointer_instance()
-            if replica_pointer_file:
-                revised_replica_pointer_file = (
-                    replica_package.create_new_pointer_file_given_storage_effects(
-                        replica_pointer_file, replica_storage_effects
+            for replica in replicas:
+                checksum_report = _get_checksum_report(
+                    master_checksum,
+                    self.uuid,
+                    replica_checksum,
+                    replica.package.uuid,
+                    master_checksum_algorithm,
+                )
+                replication_validation_event = (
+                    premis.create_replication_validation_event(
+                        replica.package.uuid,
+                        checksum_report=checksum_report,
+                        master_aip_uuid=self.uuid,
                     )
                 )
+
+                # Create and write to disk the pointer file for the replica,
+                # which contains the PREMIS replication event.
+                replica.replication_event_uuid = uuid4()
+                replica_pointer_file = self.create_replica_pointer_file(
+                    replica.package,
+                    replica.replication_event_uuid,
+                    replication_validation_event,
+                    master_ptr=master_ptr,
+                )
                 write_pointer_file(
-                    revised_replica_pointer_file, replica_package.full_pointer_file_path
+                    replica_pointer_file, replica.package.full_pointer_file_path
+                )
+                replica.package.save()
+
+        # Copy the replicandum AIP from the SS to the replicator locations.
+        # The replicas that were stored are finalized even if storing another
+        # one failed.
+        errors = _run_concurrently(
+            [replica.store for replica in replicas], settings.REPLICATION_WORKERS
+        )
+        stored_replicas = []
+        for replica, error in zip(replicas, errors):
+            if error is None:
+                stored_replicas.append(replica)
+            else:
+                LOGGER.error(
+                    "Failed to store replica package %s of package %s: %s",
+                    replica.package.uuid,
+                    replicandum_uuid,
+                    error,
                 )
 
-        # Update the pointer file of the replicated AIP (master) so that it
-        # contains a record of its replication.
-        if master_ptr:
-            new_master_pointer_file = self.create_new_pointer_file_with_replication(
-                master_ptr, replica_package, replication_event_uuid
+        for replica in stored_replicas:
+            if replica.space.access_protocol not in (Space.LOM, Space.ARKIVUM):
+                replica.package.status = Package.UPLOADED
+            replica.package.stored_date = timezone.now()
+            replica.package.save()
+            self._update_quotas(replica.space, replica.package.current_location)
+
+            # Any effects resulting from AIP storage (e.g., encryption) are
+            # recorded in the replica's pointer file.
+            if replica.storage_effects:
+                replica_pointer_file = replica.package.get_pointer_instance()
+                if replica_pointer_file:
+                    revised_replica_pointer_file = (
+                        replica.package.create_new_pointer_file_given_storage_effects(
+                            replica_pointer_file, replica.storage_effects
+                        )
+                    )
+                    write_pointer_file(
+                        revised_replica_pointer_file,
+                        replica.package.full_pointer_file_path,
+                    )
+
+        # Update the pointer file of the replicated AIP (master) once so that
+        # it contains a record of its replications.
+        if master_ptr and stored_replicas:
+            for replica in stored_replicas:
+                master_ptr = self.create_new_pointer_file_with_replication(
+                    master_ptr, replica.package, replica.replication_event_uuid
+                )
+            write_pointer_file(master_ptr, self.full_pointer_file_path)
+
+        for replica in stored_replicas:
+            LOGGER.info(
+                "Finished replicating package %s as replica package %s",
+                replicandum_uuid,
+                replica.package.uuid,
             )
-            write_pointer_file(new_master_pointer_file, self.full_pointer_file_path)
 
-        LOGGER.info(
-            "Finished replicating package %s as replica package %s",
-            replicandum_uuid,
-            replica_package.uuid,
+        for error in errors:
+            if error is not None:
+                raise error
+
+    def _create_replica(self, replicator_location, replicandum_is_file):
+        """Create the ``Package`` of a new replica of this package in
+        ``replicator_location``. Return it as a ``_Replica`` that is ready to
+        be staged.
+        """
+        replica_package = self._clone()
+        replica_package.replicated_package = self
+
+        # Remove the /uuid/path from the replica's current_path and replace the
+        # old UUID in the basename with the new UUID.
+        replica_package.current_path = os.path.basename(self.current_path).replace(
+            str(self.uuid), str(replica_package.uuid), 1
+        )
+        replica_package.current_location = replicator_location
+
+        # Check if enough space on the space and location
+        dest_space = replica_package.current_location.space
+        if replica_package.encrypted is not None:
+            replica_package.encrypted = _is_encrypted_space(dest_space)
+        if replica_package.is_file is False:
+            # The replica's directory is named after the replica.
+            replica_package.base_directory = os.path.basename(
+                replica_package.current_path
+            )
+        self._check_quotas(dest_space, replica_package.current_location)
+
+        # Replicate AIP at
+        # destination_location/uuid/split/into/chunks/destination_path
+        uuid_path = utils.uuid_to_path(replica_package.uuid)
+        replica_package.current_path = os.path.join(
+            uuid_path, replica_package.current_path
+        )
+        replica_destination_path = os.path.join(
+            replica_package.current_location.relative_path, replica_package.current_path
         )
 
+        if not replicandum_is_file:
+            # Ensure directory paths are terminated by a trailing slash.
+            replica_destination_path = os.path.join(replica_destination_path, "")
+
+        replica_package.status = Package.PENDING
+        replica_package.save()
+        return _Replica(replica_package, dest_space, replica_destination_path)
+
     def should_have_pointer_file(self, package_full_path=None, package_type=None):
         """Returns ``True`` if the package is both an AIP/AIC and is a file.
         Note: because storage in certain locations (e.g., GPG encrypted
@@ -973,6 +1140,9 @@ class Package(models.Model):
                 checksum = utils.generate_checksum(
                     self.get_local_path(), Package.DEFAULT_CHECKSUM_ALGORITHM
                 ).hexdigest()
+            local_path = self.get_local_path()
+            if local_path is not None:
+                self.record_storage_metadata(local_path, v.dest_space)
             if related_package_uuid is not None:
                 related_package = Package.objects.get(uuid=related_package_uuid)
                 self.related_packages.add(related_package)
@@ -1009,6 +1179,7 @@ class Package(models.Model):
                 checksum = utils.generate_checksum(
                     local_aip_path, Package.DEFAULT_CHECKSUM_ALGORITHM
                 ).hexdigest()
+            self.record_storage_metadata(local_aip_path, v.dest_space)
             self.status = Package.STAGING
             self.checksum = checksum
             self.checksum_algorithm = Package.DEFAULT_CHECKSUM_ALGORITHM
@@ -1074,6 +1245,8 @@ class Package(models.Model):
                     premis_agents=premis_agents,
                     aip_subtype=aip_subtype,
                 )
+            if self.is_file:
+                self.compression = utils.get_compression(self.full_pointer_file_path)
         else:  # This package should not have a pointer file
             self.pointer_file_location = None
             self.pointer_file_path = None
@@ -1131,7 +1304,7 @@ class Package(models.Model):
         pointer_absolute_path = self.full_pointer_file_path
         if not pointer_absolute_path:
             return
-        root = etree.parse(pointer_absolute_path)
+        root = utils.read_pointer_file(pointer_absolute_path)
         element = root.find(".//mets:file", namespaces=utils.NSMAP)
         flocat = element.find("mets:FLocat", namespaces=utils.NSMAP)
         if str(self.uuid) in element.get("ID", "") and flocat is not None:
@@ -1154,6 +1327,7 @@ class Package(models.Model):
                     root, pretty_print=True, xml_declaration=True, encoding="utf-8"
                 )
             )
+        utils.forget_pointer_file(pointer_absolute_path)
 
     # ==========================================================================
     # END Store AIP methods
@@ -1170,7 +1344,7 @@ class Package(models.Model):
         ptr_path = self.full_pointer_file_path
         if not ptr_path:
             return None
-        return metsrw.METSDocument.fromfile(ptr_path)
+        return metsrw.METSDocument.fromtree(utils.read_pointer_file(ptr_path))
 
     def create_replica_pointer_file(
         self,
@@ -1450,11 +1624,6 @@ class Package(models.Model):
         premis_agents = premis_agents or []
         premis_agents = [premisrw.PREMISAgent(data=agent) for agent in premis_agents]
 
-        # Use local XML schemas for validation.
-        os.environ["XML_CATALOG_FILES"] = str(
-            importlib_resources.files("common") / "assets" / "catalog.xml"
-        )
-
         compression_event = _find_compression_event(premis_events)
         if not compression_event:  # no pointer files for uncompressed AIPs
             return
@@ -1490,25 +1659,35 @@ class Package(models.Model):
         pointer_file.append_file(mets_fs_entry)
         # Validate the pointer file
         if validate:
-            try:
-                is_valid, report = metsrw.validate(
-                    pointer_file.serialize(), schematron=metsrw.AM_PNTR_SCT_PATH
-                )
-            except etree.XMLSchemaParseError as err:
-                # It has been observed that this function can fail validating,
-                # for example against the Library of Congress' (LoC) XSD for
-                # METS if the LoC server is down it will fail. We don't want
-                # this to happen so if the pointer file xml is not valid at
-                # this point in time we need to rely on a different mechanism
-                # to manage that.
-                LOGGER.warning("Failed to parse validation schema: %s", err)
-                return pointer_file
-            if not is_valid:
-                LOGGER.error(
-                    "Pointer file constructed for %s is not valid.\n%s",
-                    self.uuid,
-                    metsrw.report_string(report),
+            package_uuid = self.uuid
+
+            def report_validation(is_valid, report):
+                if not is_valid:
+                    LOGGER.error(
+                        "Pointer file constructed for %s is not valid.\n%s",
+                        package_uuid,
+                        metsrw.report_string(report),
+                    )
+
+            if settings.POINTER_FILE_VALIDATION_IN_BACKGROUND:
+                pointer_validation.validate_in_background(
+                    pointer_file.serialize(), report_validation
                 )
+            else:
+                try:
+                    is_valid, report = pointer_validation.validate(
+                        pointer_file.serialize()
+                    )
+                except etree.XMLSchemaParseError as err:
+                    # It has been observed that this function can fail
+                    # validating, for example against the Library of Congress'
+                    # (LoC) XSD for METS if the LoC server is down it will
+                    # fail. We don't want this to happen so if the pointer file
+                    # xml is not valid at this point in time we need to rely on
+                    # a different mechanism to manage that.
+                    LOGGER.warning("Failed to parse validation schema: %s", err)
+                    return pointer_file
+                report_validation(is_valid, report)
         LOGGER.info("Returning pointer file for: %s", self.uuid)
         return pointer_file
 
@@ -1522,7 +1701,8 @@ class Package(models.Model):
         If this is the first iteration of an AIP then delete replicas
         will be called and no replicas will be found to be deleted.
 
-        Once the clean-up work is done, new replicas are then minted.
+        Once the clean-up work is done, new replicas are then minted. The
+        package is staged once for all the replicator locations.
 
         :param replicator_uuid: UUID for Replicator location in which
             replicas should be created (str)
@@ -1534,8 +1714,77 @@ class Package(models.Model):
         replicator_locs = self.current_location.replicators.all()
         if replicator_uuid:
             replicator_locs = replicator_locs.filter(uuid=replicator_uuid)
-        for replicator_loc in replicator_locs:
-            self.replicate(replicator_loc)
+        self.replicate_to(list(replicator_locs))
+
+    def update_replicas(self, local_path):
+        """Update the replicas of this uncompressed AIP after a reingest.
+
+        Only the files that changed in the AIP (the bag at ``local_path``) are
+        copied to, or deleted from, its existing replicas. Replicas that
+        cannot be updated this way (e.g. because they are not stored on a
+        local filesystem or are encrypted) are deleted and replicated again,
+        like ``create_replicas`` does, as are missing replicas.
+        """
+        replicator_locations = list(self.current_location.replicators.all())
+        for replica in self._find_replicas():
+            if replica.current_location in replicator_locations and (
+                self._update_replica(replica, local_path)
+            ):
+                replicator_locations.remove(replica.current_location)
+                continue
+            _, replica_error = replica.delete_from_storage()
+            if replica_error:
+                LOGGER.error(
+                    "Could not delete replica: '%s' with error: '%s' please delete it manually",
+                    replica.uuid,
+                    replica_error,
+                )
+        self.replicate_to(replicator_locations)
+
+    def _update_replica(self, replica, local_path):
+        """Synchronize ``replica`` with the bag at ``local_path``, copying
+        only the files that differ. Return ``True`` if the replica was
+        updated and matches this package's checksum.
+        """
+        space = replica.current_location.space
+        if (
+            space.access_protocol not in (Space.LOCAL_FILESYSTEM, Space.NFS)
+            or replica.encrypted
+            or not os.path.isdir(replica.full_path)
+        ):
+            return False
+        try:
+            copied, deleted = _sync_bag(local_path, replica.full_path)
+            checksum = utils.generate_checksum(
+                replica.full_path, self.checksum_algorithm
+            ).hexdigest()
+        except (OSError, bagit.BagError) as err:
+            LOGGER.warning("Unable to update replica %s: %s", replica.uuid, err)
+            return False
+        if checksum != self.checksum:
+            LOGGER.warning(
+                "Checksum of updated replica %s does not match package %s",
+                replica.uuid,
+                self.uuid,
+            )
+            return False
+
+        old_size = replica.size
+        replica.size = self.size
+        replica.checksum = checksum
+        replica.checksum_algorithm = self.checksum_algorithm
+        replica.stored_date = timezone.now()
+        replica.save()
+        self._update_storage_size(space, replica.current_location, old_size)
+        replica._update_quotas(space, replica.current_location)
+        LOGGER.info(
+            "Updated replica %s of package %s: %d files copied, %d files deleted",
+            replica.uuid,
+            self.uuid,
+            copied,
+            deleted,
+        )
+        return True
 
     def _replace_callback_placeholders(self, uri, body):
         """Replace post store callback placeholders with values.
@@ -1598,6 +1847,25 @@ class Package(models.Model):
         deleted.
         """
         ss_internal = Location.active.get(purpose=Location.STORAGE_SERVICE_INTERNAL)
+
+        # A single file can be decrypted straight out of a package encrypted
+        # as a tarball, without a decrypted copy of the whole package.
+        tar_flags = self._encrypted_tar_flags() if relative_path else None
+        if tar_flags is not None:
+            temp_dir = None
+            if extract_path is None:
+                extract_path = temp_dir = tempfile.mkdtemp(dir=ss_internal.full_path)
+            child_space = self.current_location.space.get_child_space()
+            try:
+                output_path = child_space.extract_decrypted(
+                    self.full_path, relative_path, extract_path, tar_flags
+                )
+            except Exception:
+                if temp_dir is not None:
+                    shutil.rmtree(temp_dir, ignore_errors=True)
+                raise
+            return (output_path, extract_path)
+
         full_path = self.fetch_local_path()
 
         if extract_path is None:
@@ -1633,10 +1901,8 @@ class Package(models.Model):
             # differently than 7z/tar do: the resulting .-prefixed files have
             # different sizes than those created via unar. This makes
             # ``bag.validate`` choke.
-            if self.full_pointer_file_path:
-                compression = utils.get_compression(self.full_pointer_file_path)
-            else:
-                compression = None  # no pointer file :. command will be unar
+            # Without a pointer file the command will be unar.
+            compression = self.get_compression()
             command = _get_decompr_cmd(compression, extract_path, full_path)
             if relative_path:
                 command.append(relative_path)
@@ -1763,22 +2029,38 @@ class Package(models.Model):
         :raises StorageException: if the requested METS file cannot be found,
             or if required elements are missing.
         """
+        mets_data = self._stream_mets(prefix)
+        mets_data["files"] = list(mets_data["files"])
+        return mets_data
+
+    def _stream_mets(self, prefix):
+        """
+        Like ``_parse_mets``, but "files" is an iterator that reads the file
+        metadata from the METS file as it is consumed. The METS file is parsed
+        incrementally, so even very large METS files can be read without
+        loading them into memory.
+        """
         relative_path = ["metadata", "submissionDocumentation", "METS.xml"]
         is_bagit = _is_bagit(prefix)
         if is_bagit:
             relative_path.insert(0, "data")
         mets_path = os.path.join(prefix, *relative_path)
-        doc = metsrw.METSDocument.fromfile(mets_path)
+        events = etree.iterparse(mets_path, events=("start", "end"))
         namespaces = metsrw.utils.NAMESPACES
 
+        _event, root = next(events)
         try:
-            transfer_uuid = doc.tree.getroot().attrib["OBJID"]
+            transfer_uuid = root.attrib["OBJID"]
         except KeyError:
             raise StorageException(_("<mets> element did not have an OBJID attribute!"))
 
-        header = doc.tree.find("mets:metsHdr", namespaces=namespaces)
-        if header is None:
+        # The header is the first child of the <mets> element.
+        event, header = next(events, (None, None))
+        if header is None or header.tag != metsrw.utils.lxmlns("mets") + "metsHdr":
             raise StorageException(_("<metsHdr> element not found in METS file!"))
+        for event, elem in events:
+            if event == "end" and elem is header:
+                break
 
         try:
             creation_date = header.attrib["CREATEDATE"]
@@ -1803,45 +2085,23 @@ class Package(models.Model):
         dashboard_uuid = agent[0].text
 
         package_basename = os.path.basename(self.current_path)
-        files_data = []
-        for f in doc.all_files():
-            # Only include files listed in the "processed" structMap;
-            # some files may not be present in this transfer.
-            if not f.file_uuid:
-                continue
-            relative_path = f.path
-            uuid = f.file_uuid
-            # If the filename has been changed ("filename change"), the path in
-            # the fileSec may be outdated; check for a cleanup event and use
-            # that, if present.
-            for item in f.get_premis_events():
-                if item.event_type not in ("name cleanup", "filename change"):
-                    continue
-                event_note = item.event_outcome_detail_note
-                if not event_note:
-                    continue
-                changed_name = re.match(
-                    r'.*(?:cleaned up|new) name="(.*)"$', event_note
-                )
-                if changed_name:
-                    relative_path = changed_name.groups()[0].replace(
-                        "%transferDirectory%", "", 1
-                    )
-            path = [package_basename, relative_path]
-            if is_bagit:
-                path.insert(1, "data")
-            file_data = {"path": os.path.join(*path), "file_uuid": uuid}
-            files_data.append(file_data)
+
+        def files():
+            for uuid, relative_path in _iter_mets_files(events):
+                path = [package_basename, relative_path]
+                if is_bagit:
+                    path.insert(1, "data")
+                yield {"path": os.path.join(*path), "file_uuid": uuid}
 
         return {
             "transfer_uuid": transfer_uuid,
             "creation_date": creation_date,
             "dashboard_uuid": dashboard_uuid,
             "accession_id": accession_id,
-            "files": files_data,
+            "files": files(),
         }
 
-    def index_file_data_from_transfer_mets(self, prefix=None):
+    def index_file_data_from_transfer_mets(self, prefix=None, in_background=False):
         """
         Attempts to read an Archivematica transfer METS file inside this
         package, then uses the retrieved metadata to generate one entry in the
@@ -1849,23 +2109,57 @@ class Package(models.Model):
 
         :param prefix: The location of the transfer containing the METS file
             to parse. If not provided, self.full_path is used.
+        :param in_background: If True, the METS file is parsed before
+            returning but the File entries are created by an async task.
         :raises StorageException: if the transfer METS cannot be found,
             or if required elements are missing.
         """
         if prefix is None:
             prefix = self.full_path
 
-        file_data = self._parse_mets(prefix=prefix)
+        if in_background:
+            AsyncManager.run_task(self._index_file_data, self._parse_mets(prefix))
+        else:
+            self._index_file_data(self._stream_mets(prefix))
 
-        for f in file_data["files"]:
-            File.objects.update_or_create(
-                source_id=f["file_uuid"],
-                source_package=file_data["transfer_uuid"],
-                accessionid=file_data["accession_id"],
+    def _index_file_data(self, file_data):
+        """Create the File entries described by ``file_data`` (see
+        ``_parse_mets``) that don't exist yet, in batches of
+        ``FILE_INDEX_BATCH_SIZE``.
+        """
+        file_fields = {
+            "source_package": file_data["transfer_uuid"],
+            "accessionid": file_data["accession_id"],
+            "origin": file_data["dashboard_uuid"],
+        }
+        with transaction.atomic():
+            batch = {}
+            for f in file_data["files"]:
+                batch[(f["file_uuid"], f["path"])] = None
+                if len(batch) >= FILE_INDEX_BATCH_SIZE:
+                    self._create_files(batch, file_fields)
+                    batch = {}
+            if batch:
+                self._create_files(batch, file_fields)
+
+    def _create_files(self, files, file_fields):
+        """Create the File entries for the ``(source_id, name)`` pairs in
+        ``files`` that don't exist yet.
+        """
+        existing = set(
+            File.objects.filter(
                 package=self,
-                name=f["path"],
-                origin=file_data["dashboard_uuid"],
-            )
+                source_id__in={source_id for source_id, _name in files},
+                **file_fields,
+            ).values_list("source_id", "name")
+        )
+        File.objects.bulk_create(
+            [
+                File(package=self, source_id=source_id, name=name, **file_fields)
+                for source_id, name in files
+                if (source_id, name) not in existing
+            ]
+        )
 
     def backlog_transfer(self, origin_location, origin_path):
         """
@@ -1903,7 +2197,8 @@ class Package(models.Model):
 
         try:
             self.index_file_data_from_transfer_mets(
-                prefix=os.path.join(dest_space.staging_path, self.current_path)
+                prefix=os.path.join(dest_space.staging_path, self.current_path),
+                in_background=settings.TRANSFER_INDEXING_IN_BACKGROUND,
             )  # create File entries for every file in the transfer
         except StorageException as e:
             LOGGER.warning("Transfer METS data could not be read: %s", str(e))
@@ -2594,6 +2889,7 @@ class Package(models.Model):
         ).hexdigest()
         self.checksum = checksum
         self.checksum_algorithm = Package.DEFAULT_CHECKSUM_ALGORITHM
+        self.record_storage_metadata(updated_aip_path, reingest_space, compression)
 
         # 8. Create a pointer file if AM has not done so.
         if (
@@ -2633,8 +2929,12 @@ class Package(models.Model):
                 )
                 write_pointer_file(revised_pointer_file, self.full_pointer_file_path)
 
-        # 10. Create or update replicas if they need to be made.
-        self.create_replicas()
+        # 10. Create or update replicas if they need to be made. Replicas of
+        #     uncompressed AIPs are updated with the files that changed.
+        if not to_be_compressed and not was_compressed:
+            self.update_replicas(updated_aip_path)
+        else:
+            self.create_replicas()
 
         # 11. Update the pointer file.
         self._process_pointer_file_for_reingest(
@@ -2963,11 +3263,167 @@ class Package(models.Model):
         clone = copy.deepcopy(self)
         clone.pk = None
         clone.uuid = uuid4()
+        # Fixity checks are recorded per package.
+        clone.last_fixity_at = None
+        clone.last_fixity_success = None
         clone.save()  # Generate a new id
 
         return clone
 
 
+def _is_encrypted_space(space):
+    """Return whether packages stored in ``space`` are encrypted."""
+    return bool(getattr(space.get_child_space(), "encrypted_space", False))
+
+
+def _get_archive_base_directory(path):
+    """Return the base directory of the package compressed at ``path``."""
+    # Use lsar's JSON output to determine the directories in a
+    # compressed file. Since the index of the base directory may
+    # not be consistent, determine it by filtering all entries
+    # for directories, then determine the directory with the
+    # shortest name. (e.g. foo is the parent of foo/bar)
+    # NOTE: lsar's JSON output is broken in certain circumstances in
+    #       all released versions; make sure to use a patched version
+    #       for this to work.
+    command = ["lsar", "-ja", path]
+    output = subprocess.check_output(command).decode("utf8")
+    output = json.loads(output)
+    directories = [
+        d["XADFileName"]
+        for d in output["lsarContents"]
+        if d.get("XADIsDirectory", False)
+    ]
+    directories = sorted(directories, key=len)
+    return directories[0]
+
+
+class _Replica:
+    """A replica being created by ``Package.replicate_to``."""
+
+    def __init__(self, package, space, destination_path):
+        self.package = package
+        self.space = space
+        self.destination_path = destination_path
+        self.replication_event_uuid = None
+        self.storage_effects = None
+
+    @property
+    def staging_path(self):
+        """Absolute path of the replica in the staging area of its space."""
+        return os.path.join(self.space.staging_path, self.package.current_path)
+
+    def store(self):
+        """Move the replica from the staging area of its space to its
+        replicator location.
+        """
+        self.storage_effects = self.space.move_from_storage_service(
+            source_path=self.package.current_path,
+            destination_path=self.destination_path,
+            package=self.package,
+        )
+        self.space.post_move_from_storage_service(
+            staging_path=self.package.current_path,
+            destination_path=self.destination_path,
+            package=self.package,
+        )
+
+
+def _copy_staged_package(source, destination):
+    """Copy the package staged at ``source`` to ``destination``, hard linking
+    its files when possible. Spaces move or read staged packages but never
+    modify them in place, so the copies can share their files.
+    """
+    destination = os.path.normpath(destination)
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    if os.path.isdir(source):
+        shutil.copytree(source, destination, copy_function=_link_or_copy)
+    else:
+        _link_or_copy(source, destination)
+
+
+def _link_or_copy(source, destination):
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+
+def _sync_bag(source, destination):
+    """Make the bag at ``destination`` a copy of the bag at ``source``.
+
+    Files listed with the same checksums in the manifests of both bags are
+    left alone, other files are copied from ``source`` and files that are
+    not in ``source`` are deleted from ``destination``. Return the number of
+    files copied and deleted.
+    """
+    source_entries = bagit.Bag(source).entries
+    destination_entries = bagit.Bag(destination).entries
+
+    source_files = set()
+    for dirpath, _dirnames, filenames in os.walk(source):
+        for filename in filenames:
+            source_files.add(os.path.relpath(os.path.join(dirpath, filename), source))
+
+    copied = 0
+    for relative_path in sorted(source_files):
+        checksums = source_entries.get(relative_path)
+        destination_path = os.path.join(destination, relative_path)
+        if (
+            checksums
+            and checksums == destination_entries.get(relative_path)
+            and os.path.isfile(destination_path)
+        ):
+            continue
+        os.makedirs(os.path.dirname(destination_path), exist_ok=True)
+        shutil.copy2(os.path.join(source, relative_path), destination_path)
+        copied += 1
+
+    deleted = 0
+    for dirpath, _dirnames, filenames in os.walk(destination, topdown=False):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            if os.path.relpath(path, destination) not in source_files:
+                os.remove(path)
+                deleted += 1
+        if dirpath != destination and not os.listdir(dirpath):
+            relative_dir = os.path.relpath(dirpath, destination)
+            if not os.path.isdir(os.path.join(source, relative_dir)):
+                os.rmdir(dirpath)
+
+    return copied, deleted
+
+
+def _run_concurrently(functions, max_workers):
+    """Call each of ``functions`` using up to ``max_workers`` threads. Return
+    the exception raised by each of them, or ``None`` if it returned, in the
+    order of ``functions`` once all have finished.
+    """
+
+    def call(function):
+        try:
+            function()
+        except Exception as err:
+            return err
+        return None
+
+    if len(functions) == 1 or max_workers <= 1:
+        return [call(function) for function in functions]
+
+    def run(function):
+        try:
+            return call(function)
+        finally:
+            # Threads get their own database connection.
+            connection.close()
+
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=min(max_workers, len(functions))
+    ) as executor:
+        futures = [executor.submit(run, function) for function in functions]
+    return [future.result() for future in futures]
+
+
 def _get_decompr_cmd(compression, extract_path, full_path):
     """Returns a decompression command (as a list), given ``compression``
     (one of ``COMPRESSION_ALGORITHMS``), the destination path
@@ -3191,6 +3647,125 @@ def write_pointer_file(pointer_file, pointer_file_path):
     if not os.path.isdir(pointer_dir_path):
         os.makedirs(pointer_dir_path)
     pointer_file.write(pointer_file_path, pretty_print=True)
+    utils.forget_pointer_file(pointer_file_path)
+
+
+def _iter_mets_files(events):
+    """Yield the ``(file_uuid, relative_path)`` of the files listed in the
+    first physical structMap of a transfer METS file, like iterating over
+    ``metsrw.METSDocument.all_files()`` does. If the file was renamed by a
+    "name cleanup" or "filename change" event, its new path is used.
+
+    ``events`` is an ``etree.iterparse`` iterator of "start" and "end" events,
+    past the METS header. Elements are discarded once they have been read, so
+    only the paths of the files in the fileSec (which precedes the structMap)
+    and of the renamed files are kept in memory.
+    """
+    mets_ns = metsrw.utils.lxmlns("mets")
+    # Paths of the renamed files, keyed by the ID of their amdSec.
+    renamed_paths = {}
+    # (path, amdSec ID) of the files in the fileSec, keyed by their ID.
+    files = {}
+    # For each <div> being read in the structMap, whether its files are
+    # listed (only <div>s reached through directories are) and how many of
+    # its <fptr> elements were read.
+    divs = []
+    structmap = None
+    physical_structmaps = 0
+
+    for event, elem in events:
+        parent = elem.getparent()
+        if event == "start":
+            if elem.tag == mets_ns + "structMap" and parent.getparent() is None:
+                if elem.get("TYPE") == "physical":
+                    physical_structmaps += 1
+                    if physical_structmaps == 1:
+                        structmap = elem
+            elif elem.tag == mets_ns + "div" and structmap is not None:
+                if parent is structmap:
+                    listed = True
+                else:
+                    parent_listed, parent_type, _count = divs[-1]
+                    listed = parent_listed and parent_type == "directory"
+                divs.append([listed, elem.get("TYPE", "").lower(), 0])
+            continue
+
+        if elem.tag == mets_ns + "amdSec":
+            renamed_path = _get_renamed_path(elem)
+            if renamed_path is not None:
+                renamed_paths[elem.get("ID")] = renamed_path
+        elif elem.tag == mets_ns + "file":
+            flocat = elem.find("mets:FLocat", namespaces=metsrw.utils.NAMESPACES)
+            path = flocat.get(metsrw.utils.lxmlns("xlink") + "href")
+            amdsec_id = (elem.get("ADMID") or "").split()[:1]
+            files[elem.get("ID")] = (
+                metsrw.utils.urldecode(path),
+                amdsec_id[0] if amdsec_id else None,
+            )
+        elif elem.tag == mets_ns + "fptr" and divs:
+            div = divs[-1]
+            listed, div_type, count = div
+            div[2] += 1
+            # Items only have one file, directories can have many.
+            if listed and (div_type == "directory" or count == 0):
+                file_id = elem.get("FILEID")
+                try:
+                    path, amdsec_id = files[file_id]
+                except KeyError:
+                    raise StorageException(
+                        _("%(file_id)s exists in structMap but not fileSec")
+                        % {"file_id": file_id}
+                    )
+                file_id_prefix = metsrw.utils.FILE_ID_PREFIX
+                if div_type == "directory" and not file_id.startswith("file-"):
+                    file_id_prefix = os.path.basename(path) + "-"
+                file_uuid = file_id.replace(file_id_prefix, "", 1)
+                if file_uuid:
+                    yield file_uuid, renamed_paths.get(amdsec_id, path)
+            continue
+        elif elem.tag == mets_ns + "div" and divs:
+            divs.pop()
+        elif elem is structmap:
+            # The rest of the document is not needed.
+            return
+        elif parent is None or parent.getparent() is not None:
+            # Only discard whole sections of the document.
+            continue
+
+        # Discard the elements that have been read.
+        elem.clear(keep_tail=True)
+        while elem.getprevious() is not None:
+            del parent[0]
+
+    if physical_structmaps == 0:
+        raise StorageException(_("No physical structMap found in METS file!"))
+
+
+def _get_renamed_path(amdsec):
+    """Return the new path of a file renamed by a "name cleanup" or "filename
+    change" event of its ``amdsec`` element, or None.
+    """
+    renamed_path = None
+    for event in amdsec.xpath(
+        './*/mets:mdWrap[@MDTYPE="PREMIS:EVENT"]/mets:xmlData/*',
+        namespaces=metsrw.utils.NAMESPACES,
+    ):
+        event_type = event.xpath('string(./*[local-name()="eventType"])')
+        if event_type not in ("name cleanup", "filename change"):
+            continue
+        event_note = event.xpath(
+            'string(./*[local-name()="eventOutcomeInformation"]'
+            '/*[local-name()="eventOutcomeDetail"]'
+            '/*[local-name()="eventOutcomeDetailNote"])'
+        )
+        if not event_note:
+            continue
+        changed_name = re.match(r'.*(?:cleaned up|new) name="(.*)"$', event_note)
+        if changed_name:
+            renamed_path = changed_name.groups()[0].replace(
+                "%transferDirectory%", "", 1
+            )
+    return renamed_path
 
 
 def _is_bagit(path):
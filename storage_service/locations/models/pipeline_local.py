@@ -4,6 +4,7 @@ import shutil
 import subprocess
 import tempfile
 
+from django.core.validators import MinValueValidator
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
@@ -44,6 +45,21 @@ class PipelineLocalFS(models.Model):
         default="",
         help_text="RSYNC_PASSWORD value (rsync daemon)",
     )
+    ssh_multiplexing = models.BooleanField(
+        default=False,
+        verbose_name=_("Reuse SSH connections"),
+        help_text=_(
+            "If checked, SSH sessions to the remote machine share a persistent master connection instead of connecting each time. Not used with rsync daemon."
+        ),
+    )
+    rsync_workers = models.PositiveSmallIntegerField(
+        default=1,
+        validators=[MinValueValidator(1)],
+        verbose_name=_("Parallel rsync workers"),
+        help_text=_(
+            "Number of rsync processes used to move a directory. If greater than 1, the files of the directory are split between them."
+        ),
+    )
 
     class Meta:
         verbose_name = _("Pipeline Local FS")
@@ -58,6 +74,49 @@ class PipelineLocalFS(models.Model):
         Location.BACKLOG,
     ]
 
+    # How long an idle SSH master connection is kept open.
+    SSH_CONTROL_PERSIST = "10m"
+    # Directory of the SSH control sockets. Unix socket paths are limited to
+    # 107 characters and ssh adds a 17 character suffix to the 40 character
+    # socket name (%C) while binding it, so this is kept short instead of
+    # following TMPDIR.
+    SSH_CONTROL_DIR = "/tmp/ss-ssh-{uid}"
+
+    @property
+    def ssh_control_dir(self):
+        """Directory of the SSH control sockets, or None if SSH sessions are
+        not multiplexed.
+        """
+        if self.assume_rsync_daemon or not self.ssh_multiplexing:
+            return None
+        return self.SSH_CONTROL_DIR.format(uid=os.getuid())
+
+    @property
+    def ssh_options(self):
+        """Options to multiplex SSH sessions over a master connection.
+
+        The control socket is named after the user, host and port connected
+        to (%C), so the master connection is shared by every process
+        connecting to the same remote machine. The directory is created by
+        ``_create_ssh_control_dir`` before ssh runs.
+        """
+        control_dir = self.ssh_control_dir
+        if control_dir is None:
+            return []
+        return [
+            "-o",
+            "ControlMaster=auto",
+            "-o",
+            f"ControlPath={control_dir}/%C",
+            "-o",
+            f"ControlPersist={self.SSH_CONTROL_PERSIST}",
+        ]
+
+    def _create_ssh_control_dir(self):
+        control_dir = self.ssh_control_dir
+        if control_dir is not None:
+            os.makedirs(control_dir, mode=0o700, exist_ok=True)
+
     def _format_host_path(self, path, user=None, host=None):
         """Formats a remote path suitable for use with rsync."""
         if user is None:
@@ -80,10 +139,12 @@ class PipelineLocalFS(models.Model):
     def browse(self, path):
         path = os.path.join(path, "")
         ssh_path = self._format_host_path(path)
+        self._create_ssh_control_dir()
         return self.space.browse_rsync(
             ssh_path,
             assume_rsync_daemon=self.assume_rsync_daemon,
             rsync_password=self.rsync_password,
+            ssh_options=self.ssh_options,
         )
 
     def delete_path(self, delete_path):
@@ -93,6 +154,7 @@ class PipelineLocalFS(models.Model):
         # empty directory, is everything.
         temp_dir = tempfile.mkdtemp()
         dest_path = self._format_host_path(os.path.join(delete_path, ""))
+        self._create_ssh_control_dir()
         command = [
             "rsync",
             "-vv",
@@ -100,6 +162,7 @@ class PipelineLocalFS(models.Model):
             "--protect-args",
             "--delete",
             "--dirs",
+            *self.space._rsync_rsh(self.ssh_options),
             os.path.join(temp_dir, ""),
             dest_path,
         ]
@@ -134,11 +197,14 @@ class PipelineLocalFS(models.Model):
         # else:
         src_path = self._format_host_path(src_path)
         self.space.create_local_directory(dest_path)
+        self._create_ssh_control_dir()
         return self.space.move_rsync(
             src_path,
             dest_path,
             assume_rsync_daemon=self.assume_rsync_daemon,
             rsync_password=self.rsync_password,
+            ssh_options=self.ssh_options,
+            workers=self.rsync_workers,
         )
 
     def post_move_to_storage_service(self, *args, **kwargs):
@@ -148,8 +214,12 @@ class PipelineLocalFS(models.Model):
     def move_from_storage_service(self, source_path, destination_path, package=None):
         """Moves self.staging_path/src_path to dest_path."""
 
+        self._create_ssh_control_dir()
         self.space.create_rsync_directory(
-            destination_path, self.remote_user, self.remote_name
+            destination_path,
+            self.remote_user,
+            self.remote_name,
+            ssh_options=self.ssh_options,
         )
 
         # Prepend user and host to destination
@@ -161,6 +231,8 @@ class PipelineLocalFS(models.Model):
             destination_path,
             assume_rsync_daemon=self.assume_rsync_daemon,
             rsync_password=self.rsync_password,
+            ssh_options=self.ssh_options,
+            workers=self.rsync_workers,
         )
 
     def isfile(self, path):
@@ -3,8 +3,11 @@ import logging
 import os
 import subprocess
 import time
+import urllib.parse
 
+import requests
 from common import utils
+from django.conf import settings
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
@@ -39,6 +42,9 @@ class RClone(models.Model):
     MAX_RETRIES = 5
     RETRIABLE_EXIT_CODES = (5,)
 
+    # Seconds between checks of the status of rclone rcd jobs.
+    RCD_POLL_INTERVAL = 2
+
     ALLOWED_LOCATION_PURPOSE = [
         Location.AIP_STORAGE,
         Location.DIP_STORAGE,
@@ -106,12 +112,142 @@ class RClone(models.Model):
                 LOGGER.error(err_msg)
                 raise StorageException(err_msg)
 
+    @property
+    def _use_rcd(self):
+        """Whether operations are sent to a long-running ``rclone rcd``."""
+        return bool(settings.RCLONE_RCD_URL)
+
+    def _concurrency_flags(self):
+        """Return the ``--transfers`` and ``--checkers`` flags configured."""
+        flags = []
+        if settings.RCLONE_TRANSFERS:
+            flags.append(f"--transfers={settings.RCLONE_TRANSFERS}")
+        if settings.RCLONE_CHECKERS:
+            flags.append(f"--checkers={settings.RCLONE_CHECKERS}")
+        return flags
+
+    def _call_rcd(self, command, **params):
+        """Call ``command`` in the remote control API of the rclone rcd.
+
+        :param command: rc command, e.g. ``operations/list``
+        :param params: parameters of the command
+
+        :returns: decoded JSON output of the command
+        :throws: StorageException if the rcd can't be reached or the command
+            fails.
+        """
+        url = urllib.parse.urljoin(os.path.join(settings.RCLONE_RCD_URL, ""), command)
+        auth = None
+        if settings.RCLONE_RCD_USER:
+            auth = (settings.RCLONE_RCD_USER, settings.RCLONE_RCD_PASSWORD)
+        LOGGER.debug("rclone rc %s: %s", command, params)
+        try:
+            response = requests.post(
+                url, json=params, auth=auth, timeout=settings.RCLONE_RCD_TIMEOUT
+            )
+        except requests.RequestException as err:
+            err_msg = f"Unable to reach rclone rcd at {settings.RCLONE_RCD_URL}. Details: {err}"
+            LOGGER.error(err_msg)
+            raise StorageException(err_msg)
+        try:
+            output = response.json()
+        except ValueError:
+            output = {"error": response.text}
+        if response.status_code != 200:
+            err_msg = f"rclone rc {command} failed with status {response.status_code}: {output.get('error')}"
+            LOGGER.error(err_msg)
+            raise StorageException(err_msg)
+        return output
+
+    def _run_rcd_job(self, command, **params):
+        """Run ``command`` as an asynchronous rcd job and wait for it.
+
+        The progress of the job is logged while it runs. Transfers and
+        checkers are set from the ``RCLONE_TRANSFERS`` and ``RCLONE_CHECKERS``
+        settings, if configured.
+
+        :returns: output of the job
+        :throws: StorageException if the job fails.
+        """
+        config = {}
+        if settings.RCLONE_TRANSFERS:
+            config["Transfers"] = settings.RCLONE_TRANSFERS
+        if settings.RCLONE_CHECKERS:
+            config["Checkers"] = settings.RCLONE_CHECKERS
+        if config:
+            params["_config"] = config
+        jobid = self._call_rcd(command, _async=True, **params)["jobid"]
+        while True:
+            status = self._call_rcd("job/status", jobid=jobid)
+            if status.get("finished"):
+                break
+            stats = self._call_rcd("core/stats", group=f"job/{jobid}")
+            LOGGER.info(
+                "rclone job %s (%s): %s of %s bytes, %s of %s files transferred",
+                jobid,
+                command,
+                stats.get("bytes", 0),
+                stats.get("totalBytes", 0),
+                stats.get("transfers", 0),
+                stats.get("totalTransfers", 0),
+            )
+            time.sleep(self.RCD_POLL_INTERVAL)
+        if not status.get("success"):
+            err_msg = f"rclone job {jobid} ({command}) failed: {status.get('error')}"
+            LOGGER.error(err_msg)
+            raise StorageException(err_msg)
+        return status.get("output") or {}
+
+    def _list_remotes(self):
+        """Return the names of the remotes configured, ending with ``:``."""
+        if self._use_rcd:
+            remotes = self._call_rcd("config/listremotes").get("remotes") or []
+            return [f"{remote}:" for remote in remotes]
+        return self._execute_rclone_subcommand(["listremotes"]).split("\n")
+
+    def _list(self, path):
+        """Return the objects in ``path`` as listed by ``rclone lsjson``."""
+        if self._use_rcd:
+            return self._call_rcd("operations/list", fs=path, remote="")["list"]
+        stdout = self._execute_rclone_subcommand(["lsjson", path])
+        try:
+            return json.loads(stdout)
+        except json.decoder.JSONDecodeError:
+            raise StorageException("Unable to decode JSON from rclone lsjson")
+
+    def _copy(self, src_path, dest_path, is_file):
+        """Copy the file or directory ``src_path`` to ``dest_path``."""
+        if not self._use_rcd:
+            subcommand = "copyto" if is_file else "copy"
+            cmd = [subcommand, src_path, dest_path] + self._concurrency_flags()
+            self._execute_rclone_subcommand(cmd)
+        elif is_file:
+            src_fs, src_remote = self._split_path(src_path)
+            dest_fs, dest_remote = self._split_path(dest_path)
+            self._run_rcd_job(
+                "operations/copyfile",
+                srcFs=src_fs,
+                srcRemote=src_remote,
+                dstFs=dest_fs,
+                dstRemote=dest_remote,
+            )
+        else:
+            self._run_rcd_job("sync/copy", srcFs=src_path, dstFs=dest_path)
+
+    @staticmethod
+    def _split_path(path):
+        """Split ``path`` into the rc ``fs`` of its parent and its ``remote``."""
+        fs, remote = os.path.split(path)
+        # Keep the root of a remote (e.g. ``remote:``) or of the filesystem.
+        if not fs or fs.endswith(":"):
+            return fs or ".", remote
+        return os.path.join(fs, ""), remote
+
     @property
     def remote_prefix(self):
         """Return remote prefix from env vars matching case-insensitive RClone.remote_name."""
         SUFFIXED_SPACE_REMOTE_NAME = self.remote_name.lower().rstrip(":") + ":"
-        remotes = self._execute_rclone_subcommand(["listremotes"])
-        remotes_list = remotes.split("\n")
+        remotes_list = self._list_remotes()
         for remote in remotes_list:
             if remote == SUFFIXED_SPACE_REMOTE_NAME:
                 LOGGER.debug("rclone remote selected: %s", remote)
@@ -125,14 +261,20 @@ class RClone(models.Model):
         """
         LOGGER.debug("Test that container '%s' exists", self.container)
         prefixed_container_name = f"{self.remote_prefix}{self.container}"
-        cmd = ["ls", prefixed_container_name]
         try:
-            self._execute_rclone_subcommand(cmd)
+            if self._use_rcd:
+                self._call_rcd("operations/list", fs=prefixed_container_name, remote="")
+            else:
+                self._execute_rclone_subcommand(["ls", prefixed_container_name])
         except StorageException:
             LOGGER.info("Creating container '%s'", self.container)
-            create_container_cmd = ["mkdir", prefixed_container_name]
             try:
-                self._execute_rclone_subcommand(create_container_cmd)
+                if self._use_rcd:
+                    self._call_rcd(
+                        "operations/mkdir", fs=prefixed_container_name, remote=""
+                    )
+                else:
+                    self._execute_rclone_subcommand(["mkdir", prefixed_container_name])
             except StorageException:
                 err_msg = (
                     f"Unable to find or create container {prefixed_container_name}"
@@ -151,18 +293,12 @@ class RClone(models.Model):
             container = os.path.join(self.container, "")
 
         prefixed_path = f"{self.remote_prefix}{container}{path}"
-        cmd = ["lsjson", prefixed_path]
-        stdout = self._execute_rclone_subcommand(cmd)
+        objects = self._list(prefixed_path)
 
         directories = set()
         entries = set()
         properties = {}
 
-        try:
-            objects = json.loads(stdout)
-        except json.decoder.JSONDecodeError:
-            raise StorageException("Unable to decode JSON from rclone lsjson")
-
         for object_ in objects:
             name = object_.get("Name")
 
@@ -200,11 +336,18 @@ class RClone(models.Model):
             self._ensure_container_exists()
             container = os.path.join(self.container, "")
 
-        cmd = [
-            "delete",
-            "{}{}{}".format(self.remote_prefix, container, delete_path.lstrip("/")),
-        ]
-        self._execute_rclone_subcommand(cmd)
+        prefixed_path = "{}{}{}".format(
+            self.remote_prefix, container, delete_path.lstrip("/")
+        )
+        if self._use_rcd:
+            # operations/delete only accepts directories.
+            if utils.package_is_file(prefixed_path):
+                fs, remote = self._split_path(prefixed_path)
+                self._run_rcd_job("operations/deletefile", fs=fs, remote=remote)
+            else:
+                self._run_rcd_job("operations/delete", fs=prefixed_path)
+        else:
+            self._execute_rclone_subcommand(["delete", prefixed_path])
 
     def move_to_storage_service(self, src_path, dest_path, dest_space):
         """Moves src_path to dest_space.staging_path/dest_path."""
@@ -212,9 +355,7 @@ class RClone(models.Model):
         src_path = src_path.rstrip(".").lstrip("/")
         dest_path = dest_path.rstrip(".")
 
-        subcommand = "copyto"
-        if not utils.package_is_file(src_path):
-            subcommand = "copy"
+        is_file = utils.package_is_file(src_path)
 
         container = ""
         if self.container:
@@ -226,12 +367,7 @@ class RClone(models.Model):
         if not utils.package_is_file(dest_path):
             dest_path = os.path.join(dest_path, "")
 
-        cmd = [
-            subcommand,
-            f"{self.remote_prefix}{container}{src_path}",
-            dest_path,
-        ]
-        self._execute_rclone_subcommand(cmd)
+        self._copy(f"{self.remote_prefix}{container}{src_path}", dest_path, is_file)
 
     def move_from_storage_service(self, src_path, dest_path, package=None):
         """Moves self.staging_path/src_path to dest_path."""
@@ -239,18 +375,11 @@ class RClone(models.Model):
 
         if not self.container:
             self.space.create_local_directory(dest_path)
-        subcommand = "copyto"
-        if not utils.package_is_file(src_path):
-            subcommand = "copy"
+        is_file = utils.package_is_file(src_path)
 
         container = ""
         if self.container:
             self._ensure_container_exists()
             container = os.path.join(self.container, "")
 
-        cmd = [
-            subcommand,
-            src_path,
-            f"{self.remote_prefix}{container}{dest_path}",
-        ]
-        self._execute_rclone_subcommand(cmd)
+        self._copy(src_path, f"{self.remote_prefix}{container}{dest_path}", is_file)
@@ -1,8 +1,11 @@
+import concurrent.futures
 import datetime
 import errno
+import heapq
 import logging
 import os
 import re
+import shlex
 import shutil
 import stat
 import subprocess
@@ -204,11 +207,36 @@ class Space(models.Model):
         # top of the file causes a circular dependency
         from ..constants import PROTOCOL
 
+        prefetched = getattr(self, "_prefetched_child_space", None)
+        if prefetched is not None:
+            return prefetched
         protocol_model = PROTOCOL[self.access_protocol]["model"]
         protocol_space = protocol_model.objects.get(space=self)
         # TODO try-catch AttributeError if remote_user or remote_name not exist?
         return protocol_space
 
+    @staticmethod
+    def prefetch_child_spaces(spaces):
+        """Fetch the protocol-specific space objects of ``spaces`` with one
+        query per protocol, so that ``get_child_space`` does not query them
+        one by one.
+        """
+        from ..constants import PROTOCOL
+
+        spaces_by_protocol = {}
+        for space in spaces:
+            spaces_by_protocol.setdefault(space.access_protocol, []).append(space)
+        for access_protocol, protocol_spaces in spaces_by_protocol.items():
+            protocol_model = PROTOCOL[access_protocol]["model"]
+            child_spaces = {
+                child_space.space_id: child_space
+                for child_space in protocol_model.objects.filter(
+                    space__in=protocol_spaces
+                )
+            }
+            for space in protocol_spaces:
+                space._prefetched_child_space = child_spaces.get(space.uuid)
+
     def browse(self, path, *args, **kwargs):
         """
         Return information about the objects (files, directories) at `path`.
@@ -503,6 +531,8 @@ class Space(models.Model):
         try_mv_local=False,
         assume_rsync_daemon=False,
         rsync_password=None,
+        ssh_options=None,
+        workers=1,
     ):
         """Moves a file from source to destination.
 
@@ -512,11 +542,16 @@ class Space(models.Model):
         If try_mv_local is True, will attempt to use os.rename, which only works on the same device.
         This will not leave a copy at the source.
 
+        If workers is greater than 1 and source is a directory, its files are
+        split between that many concurrent rsync processes.
+
         :param source: Path to source file or directory. May have user@host: at beginning.
         :param destination: Path to destination file or directory. May have user@host: at the beginning.
         :param bool try_mv_local: If true, try moving/renaming instead of copying.  Should be False if source or destination specify a user@host.  Warning: this will not leave a copy at the source.
         :param bool assume_rsync_daemon: If true, will use rsync daemon-style commands instead of the default rsync with remote shell transport
         :param rsync_password: used if assume_rsync_daemon is true, to specify value of RSYNC_PASSWORD environment variable
+        :param list ssh_options: Options passed to ssh by rsync, e.g. to multiplex connections.
+        :param int workers: Number of rsync processes used to move a directory.
         """
         LOGGER.info("Moving from %s to %s", source, destination)
 
@@ -549,6 +584,16 @@ class Space(models.Model):
 
         # Rsync file over
         # TODO Do this asyncronously, with restarting failed attempts
+        kwargs = {"stdout": subprocess.PIPE, "stderr": subprocess.STDOUT}
+        if assume_rsync_daemon:
+            kwargs["env"] = {"RSYNC_PASSWORD": rsync_password}
+        rsh = self._rsync_rsh(ssh_options)
+        if workers > 1:
+            files = self._rsync_list_files(source, rsh, kwargs.get("env"))
+            if files is not None and len(files) > 1:
+                return self._move_rsync_parallel(
+                    source, destination, files, workers, rsh, kwargs
+                )
         command = [
             "rsync",
             "-t",
@@ -557,13 +602,11 @@ class Space(models.Model):
             "-vv",
             "--chmod=Fug+rw,o-rwx,Dug+rwx,o-rwx",
             "-r",
+            *rsh,
             source,
             destination,
         ]
         LOGGER.info("rsync command: %s", command)
-        kwargs = {"stdout": subprocess.PIPE, "stderr": subprocess.STDOUT}
-        if assume_rsync_daemon:
-            kwargs["env"] = {"RSYNC_PASSWORD": rsync_password}
         p = subprocess.Popen(command, **kwargs)
         stdout, _ = p.communicate()
         if p.returncode != 0:
@@ -571,6 +614,153 @@ class Space(models.Model):
             LOGGER.warning(s)
             raise StorageException(s)
 
+    @staticmethod
+    def _rsync_rsh(ssh_options):
+        """Return the rsync arguments to run ssh with ``ssh_options``."""
+        if not ssh_options:
+            return []
+        # rsync splits the command on spaces, but honours quotes.
+        return ["--rsh", " ".join(shlex.quote(o) for o in ["ssh", *ssh_options])]
+
+    @staticmethod
+    def _rsync_list_files(source, rsh, env=None):
+        """List the contents of the directory ``source`` recursively.
+
+        :returns: List of (type, size, relative path) tuples, where type is
+            the first character of the rsync permissions (``d`` for
+            directories), or None if source is not a directory or can't be
+            listed (e.g. it is a file).
+        """
+        command = [
+            "rsync",
+            "--protect-args",
+            "--list-only",
+            "--recursive",
+            "--8-bit-output",
+            *rsh,
+            os.path.join(source, ""),
+        ]
+        LOGGER.debug("rsync recursive list command: %s", command)
+        try:
+            output = subprocess.check_output(
+                command, env=env, stderr=subprocess.DEVNULL
+            )
+        except (OSError, subprocess.CalledProcessError):
+            LOGGER.debug("Unable to list %s, not splitting it", source, exc_info=True)
+            return None
+        regex = r"^(?P<type>.)(?P<permissions>.{9}) +(?P<size>[\d,]+) (?P<timestamp>..../../.. ..:..:..) (?P<name>.*)$"
+        files = []
+        for line in output.decode("utf-8").splitlines():
+            match = re.match(regex, line)
+            if not match or match.group("name") == ".":
+                continue
+            name = match.group("name")
+            if match.group("type") == "l":
+                # Symlinks are listed as "name -> target".
+                name = name.split(" -> ", 1)[0]
+            files.append(
+                (
+                    match.group("type"),
+                    int(match.group("size").replace(",", "")),
+                    name,
+                )
+            )
+        return files
+
+    def _move_rsync_parallel(self, source, destination, files, workers, rsh, kwargs):
+        """Move the directory ``source`` with concurrent rsync processes.
+
+        Files are split between ``workers`` lists of roughly the same size,
+        each moved by its own rsync process with ``--files-from``. Directories
+        are created by the first process, so empty ones are kept. If a process
+        fails the others are terminated.
+
+        :raises: StorageException if any rsync process fails
+        """
+        # Like rsync, move the contents of source if it ends with /, or the
+        # directory itself otherwise.
+        if source.endswith("/"):
+            base, prefix = source, ""
+        else:
+            sep = max(source.rfind("/"), source.rfind(":"))
+            base, name = source[: sep + 1] or "./", source[sep + 1 :]
+            prefix = f"{name}/"
+            files.append(("d", 0, ""))
+
+        # Greedily assign the largest files to the least loaded worker.
+        buckets = [(0, i, []) for i in range(workers)]
+        directories = []
+        for type_, size, name in sorted(files, key=lambda f: f[1], reverse=True):
+            if type_ == "d":
+                directories.append(f"{prefix}{name}".rstrip("/") or ".")
+                continue
+            load, i, names = heapq.heappop(buckets)
+            names.append(f"{prefix}{name}")
+            heapq.heappush(buckets, (load + size, i, names))
+        buckets = sorted(b for b in buckets if b[2]) or [(0, 0, [])]
+        buckets[0][2].extend(directories)
+        total_size = sum(load for load, _, _ in buckets)
+
+        temp_dir = tempfile.mkdtemp()
+        processes = []
+        try:
+            for load, i, names in buckets:
+                files_from = os.path.join(temp_dir, f"files-{i}")
+                with open(files_from, "w") as f:
+                    f.write("\n".join(names) + "\n")
+                command = [
+                    "rsync",
+                    "-t",
+                    "-O",
+                    "--protect-args",
+                    "-vv",
+                    "--chmod=Fug+rw,o-rwx,Dug+rwx,o-rwx",
+                    f"--files-from={files_from}",
+                    *rsh,
+                    base,
+                    destination,
+                ]
+                LOGGER.info(
+                    "rsync worker %d of %d command (%d entries, %d bytes): %s",
+                    i + 1,
+                    len(buckets),
+                    len(names),
+                    load,
+                    command,
+                )
+                processes.append((load, subprocess.Popen(command, **kwargs)))
+
+            failures = []
+            done_size = 0
+            with concurrent.futures.ThreadPoolExecutor(len(processes)) as executor:
+                futures = {
+                    executor.submit(p.communicate): (load, p) for load, p in processes
+                }
+                for future in concurrent.futures.as_completed(futures):
+                    load, p = futures[future]
+                    stdout, _ = future.result()
+                    if p.returncode != 0:
+                        failures.append(f"status {p.returncode}: {stdout}")
+                        # Stop the other workers, the move failed anyway.
+                        for _, other in processes:
+                            if other.poll() is None:
+                                other.terminate()
+                        continue
+                    done_size += load
+                    LOGGER.info(
+                        "Moved %d of %d bytes from %s to %s",
+                        done_size,
+                        total_size,
+                        source,
+                        destination,
+                    )
+        finally:
+            shutil.rmtree(temp_dir)
+        if failures:
+            s = "Rsync failed with {}".format("; ".join(failures))
+            LOGGER.warning(s)
+            raise StorageException(s)
+
     def create_local_directory(self, path, mode=None):
         """
         Creates directory structure for `path` with `mode` (default 775).
@@ -610,7 +800,7 @@ class Space(models.Model):
         except OSError as e:
             LOGGER.warning(e)
 
-    def create_rsync_directory(self, destination_path, user, host):
+    def create_rsync_directory(self, destination_path, user, host, ssh_options=None):
         """
         Creates a remote directory structure for destination_path.
 
@@ -619,6 +809,7 @@ class Space(models.Model):
             no directories are created.
         :param user: Username on remote host
         :param host: Hostname of remote host
+        :param list ssh_options: Options passed to ssh by rsync, e.g. to multiplex connections.
         """
         # Assemble a set of directories to create on the remote server;
         # these will be created one at a time
@@ -642,6 +833,7 @@ class Space(models.Model):
                 "--protect-args",
                 "--chmod=ug=rwx,o=rx",
                 "--recursive",
+                *self._rsync_rsh(ssh_options),
                 temp_dir,
                 path,
             ]
@@ -671,7 +863,12 @@ class Space(models.Model):
         return path2browse_dict(path)
 
     def browse_rsync(
-        self, path, ssh_key=None, assume_rsync_daemon=False, rsync_password=None
+        self,
+        path,
+        ssh_key=None,
+        assume_rsync_daemon=False,
+        rsync_password=None,
+        ssh_options=None,
     ):
         """
         Returns browse results for a ssh (rsync) accessible space.
@@ -686,6 +883,7 @@ class Space(models.Model):
         :param ssh_key: Path to the SSH key on disk. If None, will use default.
         :param bool assume_rsync_daemon: If true, will use rsync daemon-style commands instead of the default rsync with remote shell transport
         :param rsync_password: used if assume_rsync_daemon is true, to specify value of RSYNC_PASSWORD environment variable
+        :param list ssh_options: Additional options passed to ssh, e.g. to multiplex connections.
         :return: See docstring for Space.browse
         """
         if ssh_key is None:
@@ -701,7 +899,7 @@ class Space(models.Model):
         ]
         if not assume_rsync_daemon:
             # Specify identity file
-            command += ["--rsh", "ssh -i " + ssh_key]
+            command += self._rsync_rsh(["-i", ssh_key] + list(ssh_options or []))
         command += [path]
 
         LOGGER.info("rsync list command: %s", command)
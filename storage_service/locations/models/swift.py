@@ -1,8 +1,14 @@
+import concurrent.futures
+import contextlib
+import hashlib
+import json
 import logging
 import os
+import queue
+import time
 
 import swiftclient
-from common import utils
+from django.conf import settings
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
@@ -11,6 +17,38 @@ from .location import Location
 
 LOGGER = logging.getLogger(__name__)
 
+# Size of the chunks read from the response body when downloading objects.
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# Number of times the upload of a single file is attempted, and seconds to
+# wait before retrying (multiplied by the number of failed attempts).
+UPLOAD_ATTEMPTS = 3
+UPLOAD_RETRY_DELAY = 2
+
+
+class _ConnectionPool:
+    """Swift connections shared by the threads of an upload.
+
+    ``swiftclient.client.Connection`` is not thread-safe, so each upload
+    borrows a connection for its duration and returns it to the pool
+    afterwards. Connections are created on demand, so the pool never holds
+    more connections than there were concurrent uploads.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._connections = queue.LifoQueue()
+
+    @contextlib.contextmanager
+    def connection(self):
+        try:
+            connection = self._connections.get_nowait()
+        except queue.Empty:
+            connection = self._factory()
+        try:
+            yield connection
+        finally:
+            self._connections.put(connection)
+
 
 class Swift(models.Model):
     space = models.OneToOneField("Space", to_field="uuid", on_delete=models.CASCADE)
@@ -69,19 +107,41 @@ class Swift(models.Model):
         super().__init__(*args, **kwargs)
         self._connection = None
 
+    def _new_connection(self, preauthurl=None, preauthtoken=None):
+        return swiftclient.client.Connection(
+            authurl=self.auth_url,
+            user=self.username,
+            key=self.password,
+            tenant_name=self.tenant,
+            auth_version=self.auth_version,
+            os_options={"region_name": self.region},
+            preauthurl=preauthurl,
+            preauthtoken=preauthtoken,
+        )
+
     @property
     def connection(self):
         if self._connection is None:
-            self._connection = swiftclient.client.Connection(
-                authurl=self.auth_url,
-                user=self.username,
-                key=self.password,
-                tenant_name=self.tenant,
-                auth_version=self.auth_version,
-                os_options={"region_name": self.region},
-            )
+            self._connection = self._new_connection()
         return self._connection
 
+    def _connection_pool(self):
+        """Return a new pool of connections for concurrent uploads.
+
+        Pooled connections reuse the token of the main connection (if it has
+        authenticated already) to avoid one authentication round-trip each.
+        """
+        return _ConnectionPool(
+            lambda: self._new_connection(
+                preauthurl=self.connection.url, preauthtoken=self.connection.token
+            )
+        )
+
+    @property
+    def segments_container(self):
+        """Container holding the segments of Static Large Objects."""
+        return f"{self.container}_segments"
+
     def browse(self, path):
         """
         Returns information about the files and simulated-folders in Duracloud.
@@ -124,10 +184,21 @@ class Swift(models.Model):
             "properties": properties,
         }
 
+    def _delete_object(self, obj):
+        """Delete ``obj``, and its segments if it is a Static Large Object.
+
+        :raises: swiftclient.exceptions.ClientException if ``obj`` does not exist
+        """
+        headers = self.connection.head_object(self.container, obj)
+        query_string = None
+        if headers.get("x-static-large-object", "").lower() == "true":
+            query_string = "multipart-manifest=delete"
+        self.connection.delete_object(self.container, obj, query_string=query_string)
+
     def delete_path(self, delete_path):
         # Try to delete object
         try:
-            self.connection.delete_object(self.container, delete_path)
+            self._delete_object(delete_path)
         except swiftclient.exceptions.ClientException:
             # Swift only stores objects and fakes having folders. If delete_path
             # doesn't exist, assume it is supposed to be a folder and fetch all
@@ -145,24 +216,37 @@ class Swift(models.Model):
                 return
             to_delete = [x["name"] for x in content if x.get("name")]
             for d in to_delete:
-                self.connection.delete_object(self.container, d)
+                self._delete_object(d)
 
     def _download_file(self, remote_path, download_path):
         """
         Download the file from download_path in this Space to remote_path.
 
+        The object is streamed to disk in chunks and its MD5 is computed while
+        it is written, so neither the object nor a second read of the file is
+        needed to compare it with the ETag.
+
         :param str remote_path: Full path in Swift
         :param str download_path: Full path to save the file to
         :raises: swiftclient.exceptions.ClientException may be raised and is not caught
         """
-        # TODO find a way to stream content to dest_path, instead of having to put it in memory
-        headers, content = self.connection.get_object(self.container, remote_path)
+        headers, content = self.connection.get_object(
+            self.container, remote_path, resp_chunk_size=DOWNLOAD_CHUNK_SIZE
+        )
         self.space.create_local_directory(download_path)
+        checksum = hashlib.md5()
         with open(download_path, "wb") as f:
-            f.write(content)
-        # Check ETag matches checksum of this file
-        if "etag" in headers:
-            checksum = utils.generate_checksum(download_path)
+            for chunk in content:
+                f.write(chunk)
+                checksum.update(chunk)
+        # Check ETag matches checksum of this file. The ETag of a large object
+        # is the checksum of its segments' ETags, not of its content, so it
+        # can't be compared here (segments are verified when uploaded).
+        is_large_object = (
+            headers.get("x-static-large-object", "").lower() == "true"
+            or "x-object-manifest" in headers
+        )
+        if "etag" in headers and not is_large_object:
             if checksum.hexdigest() != headers["etag"]:
                 message = _(
                     "ETag %(remote_path)s for %(etag)s does not match %(checksum)s"
@@ -199,35 +283,195 @@ class Swift(models.Model):
                 dest = entry.replace(src_path, dest_path, 1)
                 self._download_file(entry, dest)
 
+    def _put_file(self, connection, container, obj, path, offset=0, length=None):
+        """Upload ``length`` bytes of the file at ``path`` from ``offset``.
+
+        The MD5 of the data is computed as swiftclient reads it and compared
+        with the ETag returned by Swift, so the file is only read once.
+
+        :returns: the ETag of the uploaded object
+        :raises: StorageException if the ETag does not match the data sent
+        """
+        if length is None:
+            length = os.path.getsize(path) - offset
+        with open(path, "rb") as f:
+            f.seek(offset)
+            contents = swiftclient.utils.LengthWrapper(f, length, md5=True)
+            etag = connection.put_object(
+                container, obj=obj, contents=contents, content_length=length
+            )
+        checksum = contents.get_md5sum()
+        if etag and etag != checksum:
+            message = _("ETag %(etag)s for %(path)s does not match %(checksum)s") % {
+                "path": obj,
+                "etag": etag,
+                "checksum": checksum,
+            }
+            LOGGER.warning(message)
+            raise StorageException(message)
+        return checksum
+
+    def _put_large_file(self, path, obj):
+        """Upload the file at ``path`` as a Static Large Object.
+
+        Segments of ``settings.SWIFT_SEGMENT_SIZE`` bytes are uploaded
+        concurrently to ``segments_container`` and then referenced by a
+        manifest stored at ``obj``. If the upload fails, the segments that
+        were uploaded are deleted so that retrying does not leave them behind.
+        """
+        size = os.path.getsize(path)
+        segment_size = settings.SWIFT_SEGMENT_SIZE
+        # Same segment naming scheme used by the swift command line client.
+        prefix = f"{obj}/slo/{time.time():f}/{size}/{segment_size}/"
+        segments = [
+            (f"{prefix}{index:08d}", offset, min(segment_size, size - offset))
+            for index, offset in enumerate(range(0, size, segment_size))
+        ]
+        LOGGER.info(
+            "Uploading %s to %s as a large object of %d segments",
+            path,
+            obj,
+            len(segments),
+        )
+        self.connection.put_container(self.segments_container)
+        pool = self._connection_pool()
+        uploaded = []
+
+        def upload_segment(segment):
+            name, offset, length = segment
+            with pool.connection() as connection:
+                etag = self._put_file(
+                    connection,
+                    self.segments_container,
+                    name,
+                    path,
+                    offset=offset,
+                    length=length,
+                )
+            uploaded.append(name)
+            return etag
+
+        try:
+            with concurrent.futures.ThreadPoolExecutor(
+                max_workers=settings.SWIFT_UPLOAD_THREADS
+            ) as executor:
+                futures = [
+                    executor.submit(upload_segment, segment) for segment in segments
+                ]
+                try:
+                    etags = [future.result() for future in futures]
+                finally:
+                    # Don't start uploads still queued if one of them failed.
+                    for future in futures:
+                        future.cancel()
+
+            manifest = [
+                {
+                    "path": f"/{self.segments_container}/{name}",
+                    "etag": etag,
+                    "size_bytes": length,
+                }
+                for (name, _offset, length), etag in zip(segments, etags)
+            ]
+            self.connection.put_object(
+                self.container,
+                obj=obj,
+                contents=json.dumps(manifest),
+                query_string="multipart-manifest=put",
+            )
+        except Exception:
+            self._delete_segments(uploaded)
+            raise
+
+    def _delete_segments(self, names):
+        """Delete the segments ``names`` of a large object that could not be
+        uploaded.
+        """
+        for name in names:
+            try:
+                self.connection.delete_object(self.segments_container, name)
+            except swiftclient.exceptions.ClientException as err:
+                LOGGER.warning("Unable to delete segment %s: %s", name, err)
+
+    def _upload_file(self, path, obj, connection=None):
+        """Upload the file at ``path`` to ``obj``, retrying on failure.
+
+        Only this file is retried, so a transient error does not restart the
+        upload of the rest of a directory.
+        """
+        if connection is None:
+            connection = self.connection
+        for attempt in range(1, UPLOAD_ATTEMPTS + 1):
+            try:
+                if os.path.getsize(path) > settings.SWIFT_SEGMENT_SIZE:
+                    self._put_large_file(path, obj)
+                else:
+                    self._put_file(connection, self.container, obj, path)
+                return
+            except (StorageException, swiftclient.exceptions.ClientException) as err:
+                if attempt == UPLOAD_ATTEMPTS:
+                    raise
+                LOGGER.warning(
+                    "Upload of %s to %s failed (attempt %d of %d), retrying: %s",
+                    path,
+                    obj,
+                    attempt,
+                    UPLOAD_ATTEMPTS,
+                    err,
+                )
+                time.sleep(UPLOAD_RETRY_DELAY * attempt)
+
+    def _upload_directory(self, source_path, destination_path):
+        """Upload every file under ``source_path`` concurrently.
+
+        Swift does not accept folders, so each file is uploaded as its own
+        object. Files are uploaded by ``settings.SWIFT_UPLOAD_THREADS``
+        threads, each using a pooled connection. Large files are uploaded one
+        at a time afterwards, as their segments are already uploaded
+        concurrently.
+        """
+        small_files = []
+        large_files = []
+        for path, _dirs, files in os.walk(source_path):
+            for basename in files:
+                entry = os.path.join(path, basename)
+                dest = entry.replace(source_path, destination_path, 1)
+                if os.path.getsize(entry) > settings.SWIFT_SEGMENT_SIZE:
+                    large_files.append((entry, dest))
+                else:
+                    small_files.append((entry, dest))
+
+        pool = self._connection_pool()
+
+        def upload(item):
+            entry, dest = item
+            with pool.connection() as connection:
+                self._upload_file(entry, dest, connection=connection)
+
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=settings.SWIFT_UPLOAD_THREADS
+        ) as executor:
+            futures = [executor.submit(upload, item) for item in small_files]
+            try:
+                # Raise the first error, if any.
+                for future in futures:
+                    future.result()
+            finally:
+                # Don't start uploads still queued if one of them failed.
+                for future in futures:
+                    future.cancel()
+
+        for entry, dest in large_files:
+            self._upload_file(entry, dest)
+
     def move_from_storage_service(self, source_path, destination_path, package=None):
         """Moves self.staging_path/src_path to dest_path."""
         if os.path.isdir(source_path):
             # Both source and destination paths should end with /
             destination_path = os.path.join(destination_path, "")
-            # Swift does not accept folders, so upload each file individually
-            for path, _dirs, files in os.walk(source_path):
-                for basename in files:
-                    entry = os.path.join(path, basename)
-                    dest = entry.replace(source_path, destination_path, 1)
-                    checksum = utils.generate_checksum(entry)
-                    with open(entry, "rb") as f:
-                        self.connection.put_object(
-                            self.container,
-                            obj=dest,
-                            contents=f,
-                            etag=checksum.hexdigest(),
-                            content_length=os.path.getsize(entry),
-                        )
+            self._upload_directory(source_path, destination_path)
         elif os.path.isfile(source_path):
-            checksum = utils.generate_checksum(source_path)
-            with open(source_path, "rb") as f:
-                self.connection.put_object(
-                    self.container,
-                    obj=destination_path,
-                    contents=f,
-                    etag=checksum.hexdigest(),
-                    content_length=os.path.getsize(source_path),
-                )
+            self._upload_file(source_path, destination_path)
         else:
             raise StorageException(
                 _("%(path)s is neither a file nor a directory, may not exist")
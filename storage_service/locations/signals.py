@@ -60,9 +60,11 @@ def _log_report(uuid, success, message=None):
     from . import models
 
     package = models.Package.objects.get(uuid=uuid)
-    return models.FixityLog.objects.create(
+    fixity_log = models.FixityLog.objects.create(
         package=package, success=success, error_details=message
     )
+    package.record_fixity_check(fixity_log)
+    return fixity_log
 
 
 @receiver(failed_fixity_check, dispatch_uid="fixity_check")
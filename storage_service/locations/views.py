@@ -79,6 +79,7 @@ def package_list(request):
     return render(request, "locations/package_list.html", context)
 
 
+@decorators.read_replica
 def package_list_ajax(request):
     datatable = datatable_utils.PackageDataTable(request.GET)
     data = []
@@ -122,6 +123,7 @@ def package_fixity(request, package_uuid):
     return render(request, "locations/fixity_results.html", context)
 
 
+@decorators.read_replica
 def fixity_logs_ajax(request):
     datatable = datatable_utils.FixityLogDataTable(request.GET)
     data = []
@@ -14,7 +14,9 @@ from common.helpers import is_true
 from django.core.exceptions import ImproperlyConfigured
 from django.utils.translation import gettext_lazy as _
 
+from .components.rclone import *
 from .components.s3 import *
+from .components.swift import *
 
 try:
     import ldap
@@ -668,6 +670,24 @@ try:
 except ValueError:
     BAG_VALIDATION_NO_PROCESSES = 1
 
+# Number of replicator locations a package is copied to concurrently.
+try:
+    REPLICATION_WORKERS = int(environ.get("SS_REPLICATION_WORKERS", 4))
+except ValueError:
+    REPLICATION_WORKERS = 4
+
+# Validate pointer files in a background thread instead of while the package
+# is being stored.
+POINTER_FILE_VALIDATION_IN_BACKGROUND = is_true(
+    environ.get("SS_POINTER_FILE_VALIDATION_IN_BACKGROUND", "")
+)
+
+# Index the files of transfers stored in backlog in a background thread instead
+# of while the transfer is being stored.
+TRANSFER_INDEXING_IN_BACKGROUND = is_true(
+    environ.get("SS_TRANSFER_INDEXING_IN_BACKGROUND", "")
+)
+
 GNUPG_HOME_PATH = environ.get("SS_GNUPG_HOME_PATH", None)
 
 # SS uses a Python HTTP library called requests. If this setting is set to True,
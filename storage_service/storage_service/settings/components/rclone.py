@@ -0,0 +1,45 @@
+"""Configure rclone
+
+From here we can configure aspects of rclone in the Storage Service.
+"""
+
+from os import environ
+
+from django.core.exceptions import ImproperlyConfigured
+
+# URL of the remote control API of a long-running ``rclone rcd``. When set,
+# RClone spaces send their operations to it instead of running the rclone
+# command for each of them. The rcd must have the same remotes configured.
+RCLONE_RCD_URL = environ.get("SS_RCLONE_RCD_URL", "")
+RCLONE_RCD_USER = environ.get("SS_RCLONE_RCD_USER", "")
+RCLONE_RCD_PASSWORD = environ.get("SS_RCLONE_RCD_PASSWORD", "")
+
+# Timeout in seconds of the requests sent to the rclone rcd. Copies are run as
+# asynchronous jobs, so this only bounds the calls that start and poll them and
+# other short operations like listings.
+RCLONE_RCD_TIMEOUT = 900
+try:
+    RCLONE_RCD_TIMEOUT = int(environ.get("SS_RCLONE_RCD_TIMEOUT", RCLONE_RCD_TIMEOUT))
+except ValueError:
+    err_msg = "rclone rcd timeout configured incorrectly in the environment - please check the 'SS_RCLONE_RCD_TIMEOUT' variable"
+    raise ImproperlyConfigured(err_msg)
+
+
+def _concurrency(name):
+    value = environ.get(name)
+    if not value:
+        return None
+    try:
+        value = int(value)
+    except ValueError:
+        value = 0
+    if value < 1:
+        err_msg = f"rclone concurrency must be a positive integer - please check the '{name}' variable"
+        raise ImproperlyConfigured(err_msg)
+    return value
+
+
+# Number of file transfers and checkers run in parallel by rclone copies
+# (``--transfers`` and ``--checkers``). rclone's defaults are used if unset.
+RCLONE_TRANSFERS = _concurrency("SS_RCLONE_TRANSFERS")
+RCLONE_CHECKERS = _concurrency("SS_RCLONE_CHECKERS")
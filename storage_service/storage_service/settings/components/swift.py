@@ -0,0 +1,35 @@
+"""Configure Swift
+
+From here we can configure aspects of Swift in the Storage Service.
+"""
+
+from os import environ
+
+from django.core.exceptions import ImproperlyConfigured
+
+# Swift rejects single objects larger than 5 GiB, so files bigger than the
+# segment size are uploaded as a Static Large Object made of segments of
+# this size.
+SWIFT_MAX_SEGMENT_SIZE = 5 * 1024 * 1024 * 1024
+SWIFT_SEGMENT_SIZE = 1024 * 1024 * 1024
+try:
+    SWIFT_SEGMENT_SIZE = int(environ.get("SS_SWIFT_SEGMENT_SIZE", SWIFT_SEGMENT_SIZE))
+except ValueError:
+    err_msg = "Swift segment size configured incorrectly in the environment - please check the 'SS_SWIFT_SEGMENT_SIZE' variable"
+    raise ImproperlyConfigured(err_msg)
+if not 0 < SWIFT_SEGMENT_SIZE <= SWIFT_MAX_SEGMENT_SIZE:
+    err_msg = f"Swift segment size must be between 1 and {SWIFT_MAX_SEGMENT_SIZE} bytes - please check the 'SS_SWIFT_SEGMENT_SIZE' variable"
+    raise ImproperlyConfigured(err_msg)
+
+# Number of concurrent uploads (each one using its own Swift connection).
+SWIFT_UPLOAD_THREADS = 4
+try:
+    SWIFT_UPLOAD_THREADS = int(
+        environ.get("SS_SWIFT_UPLOAD_THREADS", SWIFT_UPLOAD_THREADS)
+    )
+except ValueError:
+    err_msg = "Swift upload threads configured incorrectly in the environment - please check the 'SS_SWIFT_UPLOAD_THREADS' variable"
+    raise ImproperlyConfigured(err_msg)
+if SWIFT_UPLOAD_THREADS < 1:
+    err_msg = "Swift upload threads must be at least 1 - please check the 'SS_SWIFT_UPLOAD_THREADS' variable"
+    raise ImproperlyConfigured(err_msg)
@@ -23,6 +23,14 @@ else:
         ),  # Set to empty string forr localhost. Not used with sqlite3.
         "PORT": "",  # Set to empty string for default. Not used with sqlite3.
     }
+
+# Optional read replica of the default database, see common.db_routers.
+if "SS_DB_READ_REPLICA_URL" in environ:
+    DATABASES["replica"] = dj_database_url.config(
+        env="SS_DB_READ_REPLICA_URL", conn_max_age=600
+    )
+    DATABASES["replica"]["TEST"] = {"MIRROR": "default"}
+    DATABASE_ROUTERS = ["common.db_routers.ReadReplicaRouter"]
 # ######## END DATABASE CONFIGURATION
 
 
@@ -0,0 +1,269 @@
+import pathlib
+from typing import List
+from typing import Set
+from unittest import mock
+
+import pytest
+from common.management.commands.create_aip_replicas import BandwidthLimiter
+from django.core.management import call_command
+from locations import models
+
+
+@pytest.fixture(autouse=True)
+def logging_config():
+    # The command disables all the existing loggers.
+    with mock.patch("logging.config.dictConfig"):
+        yield
+
+
+@pytest.fixture
+def fs_space(tmp_path: pathlib.Path) -> models.Space:
+    space_dir = tmp_path / "space"
+    space_dir.mkdir()
+
+    staging_dir = tmp_path / "staging"
+    staging_dir.mkdir()
+
+    result = models.Space.objects.create(
+        access_protocol=models.Space.LOCAL_FILESYSTEM,
+        path=str(space_dir),
+        staging_path=str(staging_dir),
+    )
+    models.LocalFilesystem.objects.create(space=result)
+
+    return result
+
+
+@pytest.fixture
+def aip_storage_fs_location(fs_space: models.Space) -> models.Location:
+    return models.Location.objects.create(
+        space=fs_space,
+        purpose=models.Location.AIP_STORAGE,
+        relative_path="fs-aips",
+    )
+
+
+@pytest.fixture
+def replicator_fs_location(
+    fs_space: models.Space, aip_storage_fs_location: models.Location
+) -> models.Location:
+    result = models.Location.objects.create(
+        space=fs_space,
+        purpose=models.Location.REPLICATOR,
+        relative_path="fs-replicas",
+    )
+    aip_storage_fs_location.replicators.add(result)
+    return result
+
+
+@pytest.fixture
+def second_replicator_fs_location(
+    fs_space: models.Space, aip_storage_fs_location: models.Location
+) -> models.Location:
+    result = models.Location.objects.create(
+        space=fs_space,
+        purpose=models.Location.REPLICATOR,
+        relative_path="fs-replicas-2",
+    )
+    aip_storage_fs_location.replicators.add(result)
+    return result
+
+
+@pytest.fixture
+def aips(aip_storage_fs_location: models.Location) -> List[models.Package]:
+    return [
+        models.Package.objects.create(
+            package_type=models.Package.AIP,
+            status=models.Package.UPLOADED,
+            current_location=aip_storage_fs_location,
+            current_path=f"aip-{i}.7z",
+            size=(i + 1) * 10**9,
+        )
+        for i in range(2)
+    ]
+
+
+def create_replica(package: models.Package, location: models.Location) -> None:
+    models.Package.objects.create(
+        package_type=models.Package.AIP,
+        status=models.Package.UPLOADED,
+        current_location=location,
+        replicated_package=package,
+    )
+
+
+def replicate_to(
+    package: models.Package, replicator_locations: List[models.Location]
+) -> None:
+    for location in replicator_locations:
+        create_replica(package, location)
+
+
+def replicated_aips(location: models.Location = None) -> Set[models.Package]:
+    replicas = models.Package.objects.exclude(replicated_package=None)
+    if location is not None:
+        replicas = replicas.filter(current_location=location)
+    return {replica.replicated_package for replica in replicas}
+
+
+@pytest.mark.django_db
+@mock.patch.object(
+    models.Package, "replicate_to", autospec=True, side_effect=replicate_to
+)
+@mock.patch("common.management.commands.StorageServiceCommand.error")
+@mock.patch("common.management.commands.StorageServiceCommand.success")
+def test_command_skips_aips_listed_in_checkpoint_file(
+    success: mock.Mock,
+    error: mock.Mock,
+    replicate_to: mock.Mock,
+    tmp_path: pathlib.Path,
+    aip_storage_fs_location: models.Location,
+    replicator_fs_location: models.Location,
+    aips: List[models.Package],
+) -> None:
+    checkpoint_file = tmp_path / "checkpoint"
+    checkpoint_file.write_text(f"{aips[0].uuid} {replicator_fs_location.uuid}\n")
+
+    call_command(
+        "create_aip_replicas",
+        "--aip-store-location",
+        aip_storage_fs_location.uuid,
+        "--checkpoint-file",
+        str(checkpoint_file),
+    )
+
+    assert replicated_aips() == {aips[1]}
+    assert checkpoint_file.read_text().splitlines() == [
+        f"{aip.uuid} {replicator_fs_location.uuid}" for aip in aips
+    ]
+    success.assert_called_once_with(
+        "Replica creation complete. 0 existing replicas deleted. "
+        "New replicas created for 1 of 1 AIPs in location."
+    )
+    error.assert_not_called()
+
+
+@pytest.mark.django_db
+@mock.patch.object(
+    models.Package, "replicate_to", autospec=True, side_effect=replicate_to
+)
+@mock.patch("common.management.commands.StorageServiceCommand.error")
+@mock.patch("common.management.commands.StorageServiceCommand.success")
+def test_command_checkpoint_file_is_kept_per_replicator_location(
+    success: mock.Mock,
+    error: mock.Mock,
+    replicate_to: mock.Mock,
+    tmp_path: pathlib.Path,
+    aip_storage_fs_location: models.Location,
+    replicator_fs_location: models.Location,
+    second_replicator_fs_location: models.Location,
+    aips: List[models.Package],
+) -> None:
+    checkpoint_file = tmp_path / "checkpoint"
+    call_command(
+        "create_aip_replicas",
+        "--aip-store-location",
+        aip_storage_fs_location.uuid,
+        "--replicator-location",
+        replicator_fs_location.uuid,
+        "--checkpoint-file",
+        str(checkpoint_file),
+    )
+
+    call_command(
+        "create_aip_replicas",
+        "--aip-store-location",
+        aip_storage_fs_location.uuid,
+        "--replicator-location",
+        second_replicator_fs_location.uuid,
+        "--checkpoint-file",
+        str(checkpoint_file),
+    )
+
+    assert replicated_aips(replicator_fs_location) == set(aips)
+    assert replicated_aips(second_replicator_fs_location) == set(aips)
+    assert sorted(checkpoint_file.read_text().splitlines()) == sorted(
+        f"{aip.uuid} {location.uuid}"
+        for aip in aips
+        for location in (replicator_fs_location, second_replicator_fs_location)
+    )
+    error.assert_not_called()
+
+
+@pytest.mark.django_db(transaction=True)
+@mock.patch.object(
+    models.Package, "replicate_to", autospec=True, side_effect=replicate_to
+)
+@mock.patch("common.management.commands.StorageServiceCommand.error")
+@mock.patch("common.management.commands.StorageServiceCommand.success")
+def test_command_replicates_aips_concurrently(
+    success: mock.Mock,
+    error: mock.Mock,
+    replicate_to: mock.Mock,
+    aip_storage_fs_location: models.Location,
+    replicator_fs_location: models.Location,
+    aips: List[models.Package],
+) -> None:
+    call_command(
+        "create_aip_replicas",
+        "--aip-store-location",
+        aip_storage_fs_location.uuid,
+        "--jobs",
+        "2",
+    )
+
+    assert replicated_aips() == set(aips)
+    success.assert_called_once_with(
+        "Replica creation complete. 0 existing replicas deleted. "
+        "New replicas created for 2 of 2 AIPs in location."
+    )
+    error.assert_not_called()
+
+
+@pytest.mark.django_db
+@mock.patch.object(models.Package, "replicate_to")
+@mock.patch("common.management.commands.StorageServiceCommand.info")
+@mock.patch("common.management.commands.StorageServiceCommand.success")
+def test_command_plans_replication_without_replicating(
+    success: mock.Mock,
+    info: mock.Mock,
+    replicate_to: mock.Mock,
+    aip_storage_fs_location: models.Location,
+    replicator_fs_location: models.Location,
+    second_replicator_fs_location: models.Location,
+    aips: List[models.Package],
+) -> None:
+    create_replica(aips[0], second_replicator_fs_location)
+
+    call_command(
+        "create_aip_replicas",
+        "--aip-store-location",
+        aip_storage_fs_location.uuid,
+        "--plan",
+        "--bandwidth-limit",
+        "10",
+    )
+
+    replicate_to.assert_not_called()
+    info.assert_any_call(
+        f"Replicator location {replicator_fs_location.uuid}: 2 AIPs,"
+        " 3000000000 bytes, estimated time 0:05:00 at 10.0 MB/s"
+    )
+    # The replica of the first AIP isn't created again.
+    info.assert_any_call(
+        f"Replicator location {second_replicator_fs_location.uuid}: 1 AIPs,"
+        " 2000000000 bytes, estimated time 0:03:20 at 10.0 MB/s"
+    )
+    success.assert_called_once_with("Replication plan complete. AIPs to replicate: 2")
+
+
+@mock.patch(
+    "common.management.commands.create_aip_replicas.time.monotonic",
+    return_value=100.0,
+)
+def test_bandwidth_limiter_delays_copies_beyond_rate(monotonic: mock.Mock) -> None:
+    limiter = BandwidthLimiter(rate=10)
+
+    assert limiter.reserve(50) == 0
+    assert limiter.reserve(20) == 5
+    assert limiter.reserve(10) == 7
@@ -0,0 +1,116 @@
+import pathlib
+from typing import Any
+from unittest import mock
+
+import bagit
+import pytest
+from common import utils
+from common.management.commands.populate_aip_checksums import Command
+from django.core.management import call_command
+from locations import models
+
+
+@pytest.fixture
+def aip_storage_fs_location(tmp_path: pathlib.Path) -> models.Location:
+    space_dir = tmp_path / "space"
+    space_dir.mkdir()
+    space = models.Space.objects.create(
+        access_protocol=models.Space.LOCAL_FILESYSTEM,
+        path=str(space_dir),
+        staging_path=str(tmp_path / "staging"),
+    )
+    models.LocalFilesystem.objects.create(space=space)
+    return models.Location.objects.create(
+        space=space,
+        purpose=models.Location.AIP_STORAGE,
+        relative_path="fs-aips",
+    )
+
+
+def create_uncompressed_aip(
+    location: models.Location, name: str, **kwargs: Any
+) -> models.Package:
+    aip = models.Package.objects.create(
+        package_type=models.Package.AIP,
+        status=models.Package.UPLOADED,
+        current_location=location,
+        current_path=name,
+        **kwargs,
+    )
+    bag_path = pathlib.Path(aip.full_path)
+    bag_path.mkdir(parents=True)
+    (bag_path / "file.txt").write_text(name)
+    bagit.make_bag(str(bag_path))
+    return aip
+
+
+@pytest.mark.django_db(transaction=True)
+@mock.patch("common.management.commands.StorageServiceCommand.error")
+@mock.patch("common.management.commands.StorageServiceCommand.info")
+def test_command_hashes_uncompressed_aips_concurrently(
+    info: mock.Mock,
+    error: mock.Mock,
+    aip_storage_fs_location: models.Location,
+) -> None:
+    aips = [
+        create_uncompressed_aip(aip_storage_fs_location, f"aip-{i}") for i in range(3)
+    ]
+
+    with mock.patch.object(
+        models.Package.objects, "bulk_update", wraps=models.Package.objects.bulk_update
+    ) as bulk_update:
+        call_command("populate_aip_checksums", "--jobs", "2")
+
+    bulk_update.assert_called_once()
+    for aip in aips:
+        aip.refresh_from_db()
+        assert (
+            aip.checksum == utils.generate_checksum(aip.full_path, "sha256").hexdigest()
+        )
+        assert aip.checksum_algorithm == "sha256"
+    info.assert_called_with("Complete. Checksums added for all 3 identified AIPs.")
+    error.assert_not_called()
+
+
+@pytest.mark.django_db
+@mock.patch("common.management.commands.StorageServiceCommand.info")
+def test_command_skips_aips_with_checksums_unless_forced(
+    info: mock.Mock,
+    aip_storage_fs_location: models.Location,
+) -> None:
+    aip = create_uncompressed_aip(aip_storage_fs_location, "aip", checksum="abc")
+
+    call_command("populate_aip_checksums")
+
+    aip.refresh_from_db()
+    assert aip.checksum == "abc"
+    info.assert_called_with("Complete. No matching AIPs identified.")
+
+    call_command("populate_aip_checksums", "--force")
+
+    aip.refresh_from_db()
+    assert aip.checksum == utils.generate_checksum(aip.full_path, "sha256").hexdigest()
+
+
+@pytest.mark.django_db
+def test_generate_checksum_counts_bytes_read(
+    aip_storage_fs_location: models.Location,
+) -> None:
+    aip = create_uncompressed_aip(aip_storage_fs_location, "aip", size=10**9)
+    tagmanifest = utils.find_tagmanifest(pathlib.Path(aip.full_path))
+
+    # Only the tagmanifest of a local AIP is read.
+    checksum, read_size = Command.generate_checksum(aip)
+    assert checksum == utils.generate_checksum(aip.full_path, "sha256").hexdigest()
+    assert read_size == tagmanifest.stat().st_size
+
+    # A remote AIP is downloaded first.
+    def fetch_local_path():
+        aip.local_tempdirs.append("/tmp/download")
+        return aip.full_path
+
+    with mock.patch.object(
+        aip, "fetch_local_path", fetch_local_path
+    ), mock.patch.object(aip, "clear_local_tempdirs"):
+        _, read_size = Command.generate_checksum(aip)
+    assert read_size == tagmanifest.stat().st_size + 10**9
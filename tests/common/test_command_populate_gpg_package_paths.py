@@ -0,0 +1,93 @@
+import pathlib
+from unittest import mock
+
+import pytest
+from django.core.management import call_command
+from locations import models
+from locations.models.gpg import GPGPackagePath
+
+
+@pytest.fixture
+@pytest.mark.django_db
+def gpg_location(tmp_path: pathlib.Path) -> models.Location:
+    space = models.Space.objects.create(
+        access_protocol=models.Space.GPG,
+        path=str(tmp_path / "space"),
+        staging_path=str(tmp_path / "staging"),
+    )
+    models.GPG.objects.create(space=space, key="some-key")
+    return models.Location.objects.create(
+        space=space,
+        purpose=models.Location.AIP_STORAGE,
+        relative_path="gpg-aips",
+    )
+
+
+@pytest.fixture
+@pytest.mark.django_db
+def encrypted_aip(gpg_location: models.Location) -> models.Package:
+    return models.Package.objects.create(
+        package_type=models.Package.AIP,
+        status=models.Package.UPLOADED,
+        current_location=gpg_location,
+        current_path="encrypted-aip.7z",
+        encryption_key_fingerprint="some-key",
+    )
+
+
+@pytest.fixture
+@pytest.mark.django_db
+def unencrypted_aip(tmp_path: pathlib.Path) -> models.Package:
+    space = models.Space.objects.create(
+        access_protocol=models.Space.LOCAL_FILESYSTEM,
+        path=str(tmp_path / "fs-space"),
+        staging_path=str(tmp_path / "staging"),
+    )
+    models.LocalFilesystem.objects.create(space=space)
+    location = models.Location.objects.create(
+        space=space,
+        purpose=models.Location.AIP_STORAGE,
+        relative_path="fs-aips",
+    )
+    return models.Package.objects.create(
+        package_type=models.Package.AIP,
+        status=models.Package.UPLOADED,
+        current_location=location,
+        current_path="aip.7z",
+    )
+
+
+@pytest.mark.django_db
+@mock.patch("common.management.commands.StorageServiceCommand.success")
+def test_command_records_paths_of_encrypted_packages(
+    success: mock.Mock,
+    encrypted_aip: models.Package,
+    unencrypted_aip: models.Package,
+) -> None:
+    call_command("populate_gpg_package_paths")
+
+    record = GPGPackagePath.objects.get()
+    assert record.package == encrypted_aip
+    assert record.path == encrypted_aip.full_path
+    success.assert_called_once_with("Complete. Paths of 1 packages recorded.")
+
+
+@pytest.mark.django_db
+@mock.patch("common.management.commands.StorageServiceCommand.success")
+def test_command_skips_recorded_packages_unless_forced(
+    success: mock.Mock,
+    encrypted_aip: models.Package,
+) -> None:
+    GPGPackagePath.record("/old/path", encrypted_aip)
+
+    call_command("populate_gpg_package_paths")
+
+    success.assert_called_once_with("Complete. No matching packages found.")
+    assert GPGPackagePath.objects.get().path == "/old/path"
+
+    call_command("populate_gpg_package_paths", "--force")
+
+    assert {r.path for r in GPGPackagePath.objects.all()} == {
+        "/old/path",
+        encrypted_aip.full_path,
+    }
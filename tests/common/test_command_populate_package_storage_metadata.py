@@ -0,0 +1,120 @@
+import pathlib
+from unittest import mock
+
+import pytest
+from common import utils
+from django.core.management import call_command
+from locations import models
+
+
+@pytest.fixture
+@pytest.mark.django_db
+def aip_storage_fs_location(tmp_path: pathlib.Path) -> models.Location:
+    space = models.Space.objects.create(
+        access_protocol=models.Space.LOCAL_FILESYSTEM,
+        path=str(tmp_path / "space"),
+        staging_path=str(tmp_path / "staging"),
+    )
+    models.LocalFilesystem.objects.create(space=space)
+    result = models.Location.objects.create(
+        space=space,
+        purpose=models.Location.AIP_STORAGE,
+        relative_path="fs-aips",
+    )
+    pathlib.Path(result.full_path).mkdir(parents=True)
+    return result
+
+
+@pytest.fixture
+@pytest.mark.django_db
+def uncompressed_aip(aip_storage_fs_location: models.Location) -> models.Package:
+    result = models.Package.objects.create(
+        package_type=models.Package.AIP,
+        status=models.Package.UPLOADED,
+        current_location=aip_storage_fs_location,
+        current_path="uncompressed-aip",
+    )
+    (pathlib.Path(result.full_path) / "data").mkdir(parents=True)
+    return result
+
+
+@pytest.fixture
+@pytest.mark.django_db
+def remote_aip(aip_storage_fs_location: models.Location) -> models.Package:
+    return models.Package.objects.create(
+        package_type=models.Package.AIP,
+        status=models.Package.UPLOADED,
+        current_location=aip_storage_fs_location,
+        current_path="remote-aip.7z",
+    )
+
+
+@pytest.mark.django_db
+@mock.patch("common.management.commands.StorageServiceCommand.error")
+@mock.patch("common.management.commands.StorageServiceCommand.success")
+def test_command_records_local_packages_and_skips_remote_ones(
+    success: mock.Mock,
+    error: mock.Mock,
+    uncompressed_aip: models.Package,
+    remote_aip: models.Package,
+) -> None:
+    call_command("populate_package_storage_metadata")
+
+    uncompressed_aip.refresh_from_db()
+    assert uncompressed_aip.is_file is False
+    assert uncompressed_aip.compression is None
+    assert uncompressed_aip.encrypted is False
+    assert uncompressed_aip.base_directory == "uncompressed-aip"
+    remote_aip.refresh_from_db()
+    assert remote_aip.is_file is None
+
+    success.assert_called_once_with(
+        "Complete. Storage metadata for 1 of 2 identified packages added. 1 remote packages were skipped."
+    )
+    error.assert_not_called()
+
+
+@pytest.mark.django_db
+@mock.patch("common.management.commands.StorageServiceCommand.success")
+def test_command_skips_packages_with_storage_metadata_unless_forced(
+    success: mock.Mock,
+    uncompressed_aip: models.Package,
+) -> None:
+    uncompressed_aip.is_file = True
+    uncompressed_aip.compression = utils.COMPRESSION_7Z_BZIP
+    uncompressed_aip.save()
+
+    call_command("populate_package_storage_metadata")
+
+    success.assert_called_once_with("Complete. No matching packages found.")
+    uncompressed_aip.refresh_from_db()
+    assert uncompressed_aip.is_file is True
+
+    call_command("populate_package_storage_metadata", "--force")
+
+    uncompressed_aip.refresh_from_db()
+    assert uncompressed_aip.is_file is False
+    assert uncompressed_aip.compression is None
+
+
+@pytest.mark.django_db
+@mock.patch("common.management.commands.StorageServiceCommand.error")
+@mock.patch("common.management.commands.StorageServiceCommand.success")
+def test_command_infers_storage_metadata_of_encrypted_packages(
+    success: mock.Mock,
+    error: mock.Mock,
+    uncompressed_aip: models.Package,
+) -> None:
+    encrypted_path = pathlib.Path(uncompressed_aip.full_path)
+    (encrypted_path / "data").rmdir()
+    encrypted_path.rmdir()
+    encrypted_path.write_bytes(b"encrypted tar")
+
+    with mock.patch.object(models.Package, "is_encrypted", return_value=True):
+        call_command("populate_package_storage_metadata")
+
+    uncompressed_aip.refresh_from_db()
+    assert uncompressed_aip.is_file is False
+    assert uncompressed_aip.encrypted is True
+    assert uncompressed_aip.base_directory == "uncompressed-aip"
+    error.assert_not_called()
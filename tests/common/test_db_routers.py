@@ -0,0 +1,75 @@
+from unittest import mock
+
+import pytest
+from common import db_routers
+from common.decorators import read_replica
+from django.db import connections
+from django.db import transaction
+from django.http import HttpResponse
+from django.http import StreamingHttpResponse
+from django.test import RequestFactory
+from locations import models
+
+router = db_routers.ReadReplicaRouter()
+
+
+@pytest.fixture(autouse=True)
+def replica_database():
+    with mock.patch.dict(connections.databases, {"replica": {}}):
+        yield
+
+
+def test_reads_use_default_database_outside_read_replica_context():
+    assert router.db_for_read(models.Package) is None
+
+
+def test_reads_use_replica_until_a_write_is_made():
+    with db_routers.use_read_replica():
+        assert router.db_for_read(models.Package) == "replica"
+        assert router.db_for_write(models.Package) == "default"
+        assert router.db_for_read(models.Package) is None
+
+    with db_routers.use_read_replica():
+        assert router.db_for_read(models.Package) == "replica"
+
+
+@pytest.mark.django_db(transaction=True)
+def test_reads_use_default_database_in_transactions():
+    with db_routers.use_read_replica():
+        assert router.db_for_read(models.Package) == "replica"
+        with transaction.atomic():
+            assert router.db_for_read(models.Package) is None
+        assert router.db_for_read(models.Package) == "replica"
+
+
+def test_reads_use_default_database_if_replica_is_not_configured():
+    del connections.databases["replica"]
+    with db_routers.use_read_replica():
+        assert router.db_for_read(models.Package) is None
+
+
+def test_replica_is_not_migrated():
+    assert router.allow_migrate("replica", "locations") is False
+    assert router.allow_migrate("default", "locations") is None
+
+
+def test_read_replica_decorator_only_routes_safe_requests():
+    @read_replica
+    def view(request):
+        return HttpResponse(router.db_for_read(models.Package) or "default")
+
+    factory = RequestFactory()
+    assert view(factory.get("/")).content == b"replica"
+    assert view(factory.post("/")).content == b"default"
+
+
+def test_read_replica_decorator_routes_streamed_reads():
+    @read_replica
+    def view(request):
+        return StreamingHttpResponse(
+            router.db_for_read(models.Package) or "default" for _ in range(2)
+        )
+
+    response = view(RequestFactory().get("/"))
+
+    assert list(response.streaming_content) == [b"replica", b"replica"]
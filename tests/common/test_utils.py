@@ -533,6 +533,49 @@ def test_get_compressed_package_checksum():
     ) == ("c2924159fcbbeadf8d7f3962b43ec1bf301e1b4f12dd28a8b89ec819f3714747", "sha256")
 
 
+def test_pointer_file_is_parsed_once_until_modified(mocker, tmp_path):
+    pointer_path = tmp_path / "pointer.xml"
+    shutil.copy(FIXTURES_DIR / "premis_3_pointer.xml", pointer_path)
+    parse = mocker.spy(utils.etree, "parse")
+
+    checksum = utils.get_compressed_package_checksum(str(pointer_path))
+    utils.get_compression(str(pointer_path))
+    utils.read_pointer_file(str(pointer_path))
+    assert parse.call_count == 1
+
+    pointer_path.write_text(pointer_path.read_text().replace(checksum[0], "abc"))
+    assert utils.get_compressed_package_checksum(str(pointer_path)) == (
+        "abc",
+        "sha256",
+    )
+    assert parse.call_count == 2
+
+
+def test_read_pointer_file_returns_a_copy(tmp_path):
+    pointer_path = tmp_path / "pointer.xml"
+    shutil.copy(FIXTURES_DIR / "premis_3_pointer.xml", pointer_path)
+
+    root = utils.read_pointer_file(str(pointer_path))
+    for element in root.iterfind(".//premis3:messageDigest", namespaces=utils.NSMAP):
+        element.text = "modified"
+
+    assert utils.get_compressed_package_checksum(str(pointer_path))[0] != "modified"
+    assert utils.read_pointer_file(str(pointer_path)) is not root
+
+
+def test_forget_pointer_file(mocker, tmp_path):
+    pointer_path = tmp_path / "pointer.xml"
+    shutil.copy(FIXTURES_DIR / "premis_3_pointer.xml", pointer_path)
+    utils.get_pointer_file_facts(str(pointer_path))
+    parse = mocker.spy(utils.etree, "parse")
+
+    utils.forget_pointer_file(str(pointer_path))
+    facts = utils.get_pointer_file_facts(str(pointer_path))
+
+    parse.assert_called_once()
+    assert facts.checksum_algorithm == "sha256"
+
+
 def test_get_mimetype():
     assert utils.get_mimetype("video.mp4") == "video/mp4"
     assert utils.get_mimetype("C:\\Windows\\Path\\windowsfile.xml") == "application/xml"
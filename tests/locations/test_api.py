@@ -10,8 +10,10 @@ from urllib.parse import urlparse
 import pytest
 from administration import roles
 from django.contrib.auth.models import User
+from django.db import connection
 from django.test import Client
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from locations import models
 from locations.api.sword.views import _parse_name_and_content_urls_from_mets_file
@@ -21,6 +23,16 @@ from . import TempDirMixin
 FIXTURES_DIR = pathlib.Path(__file__).parent / "fixtures"
 
 
+def get_list_query_count(client, url):
+    """Return the number of queries run to list all the resources at ``url``."""
+    # The first request authenticating a user may upgrade its password hash.
+    client.get(url)
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url, {"limit": 0})
+    assert response.status_code == 200
+    return len(queries)
+
+
 class TestSpaceAPI(TempDirMixin, TestCase):
     fixture_files = ["base.json"]
     fixtures = [FIXTURES_DIR / f for f in fixture_files]
@@ -191,6 +203,18 @@ class TestSpaceAPI(TempDirMixin, TestCase):
         )
         assert response.status_code == 400
 
+    def test_list_query_count_does_not_depend_on_number_of_spaces(self):
+        query_count = get_list_query_count(self.client, "/api/v2/space/")
+        for _ in range(3):
+            space = models.Space.objects.create(
+                access_protocol=models.Space.LOCAL_FILESYSTEM,
+                path=str(self.tmpdir),
+                staging_path=str(self.tmpdir),
+            )
+            models.LocalFilesystem.objects.create(space=space)
+
+        assert get_list_query_count(self.client, "/api/v2/space/") == query_count
+
 
 class TestLocationAPI(TempDirMixin, TestCase):
     fixture_files = ["base.json", "pipelines.json", "package.json"]
@@ -543,6 +567,18 @@ class TestLocationAPI(TempDirMixin, TestCase):
         )
         assert response.status_code == 400
 
+    def test_list_query_count_does_not_depend_on_number_of_locations(self):
+        query_count = get_list_query_count(self.client, "/api/v2/location/")
+        space = models.Space.objects.first()
+        pipeline = models.Pipeline.objects.first()
+        for i in range(3):
+            location = models.Location.objects.create(
+                space=space, purpose=models.Location.AIP_STORAGE, relative_path=f"{i}"
+            )
+            models.LocationPipeline.objects.create(location=location, pipeline=pipeline)
+
+        assert get_list_query_count(self.client, "/api/v2/location/") == query_count
+
 
 class TestPackageAPI(TempDirMixin, TestCase):
     fixture_files = ["base.json", "package.json", "arkivum.json"]
@@ -612,6 +648,82 @@ class TestPackageAPI(TempDirMixin, TestCase):
         response_content = json.loads(response.content)
         assert len(response_content["objects"]) != 0
 
+    def test_list_query_count_does_not_depend_on_number_of_packages(self):
+        query_count = get_list_query_count(self.client, "/api/v2/file/")
+        pipeline = models.Pipeline.objects.first()
+        for i in range(3):
+            package = models.Package.objects.create(
+                current_location=self.test_location,
+                current_path=f"package-{i}",
+                package_type=models.Package.AIP,
+                origin_pipeline=pipeline,
+            )
+            replica = models.Package.objects.create(
+                current_location=self.test_location,
+                current_path=f"replica-{i}",
+                package_type=models.Package.AIP,
+                origin_pipeline=pipeline,
+                replicated_package=package,
+            )
+            package.related_packages.add(replica)
+
+        assert get_list_query_count(self.client, "/api/v2/file/") == query_count
+
+    def test_list_cursor_pagination_returns_each_package_once(self):
+        uuids = []
+        url = "/api/v2/file/"
+        params = {"cursor": "", "limit": 2}
+        while url:
+            response = self.client.get(url, params)
+            assert response.status_code == 200
+            response_content = json.loads(response.content)
+            assert response_content["meta"]["total_count"] is None
+            uuids.extend(package["uuid"] for package in response_content["objects"])
+            url, params = response_content["meta"]["next"], None
+            if len(uuids) == 2:
+                # Packages stored while paging are added to the last pages.
+                models.Package.objects.create(
+                    current_location=self.test_location,
+                    current_path="new-package",
+                    package_type=models.Package.AIP,
+                    origin_pipeline=models.Pipeline.objects.first(),
+                )
+
+        assert uuids == [
+            str(uuid)
+            for uuid in models.Package.objects.order_by("id").values_list(
+                "uuid", flat=True
+            )
+        ]
+
+    def test_list_cursor_pagination_applies_filters(self):
+        response = self.client.get(
+            "/api/v2/file/",
+            {"cursor": "", "limit": 1, "package_type": models.Package.AIP},
+        )
+        assert response.status_code == 200
+        response_content = json.loads(response.content)
+        assert [package["package_type"] for package in response_content["objects"]] == [
+            models.Package.AIP
+        ]
+        assert "package_type=AIP" in response_content["meta"]["next"]
+
+        response = self.client.get(response_content["meta"]["next"])
+        assert response.status_code == 200
+        response_content = json.loads(response.content)
+        assert {package["package_type"] for package in response_content["objects"]} == {
+            models.Package.AIP
+        }
+
+    def test_list_cursor_pagination_rejects_invalid_cursor(self):
+        response = self.client.get("/api/v2/file/", {"cursor": "abc"})
+        assert response.status_code == 400
+
+        response = self.client.get(
+            "/api/v2/file/", {"cursor": "", "order_by": "stored_date"}
+        )
+        assert response.status_code == 400
+
     def test_non_admins_can_read_detail(self):
         self.as_reader()
         response = self.client.get("/api/v2/file/0d4e739b-bf60-4b87-bc20-67a379b28cea/")
@@ -691,6 +803,79 @@ class TestPackageAPI(TempDirMixin, TestCase):
         assert body[0]["relative_path"] == path
         assert body[0]["fileuuid"] == "86bfde11-e2a1-4ee7-b98d-9556b5f05198"
 
+    def test_file_data_searches_relative_path_prefix(self):
+        package = models.Package.objects.get(
+            uuid="e0a41934-c1d7-45ba-9a95-a7531c063ed1"
+        )
+        for name in ("test_sip/objects/sub/a.txt", "test_sip/objects_2/b.txt"):
+            models.File.objects.create(package=package, name=name, source_id=name)
+
+        response = self.client.get(
+            "/api/v2/file/metadata/", {"relative_path_prefix": "test_sip/objects/"}
+        )
+        assert response.status_code == 200
+        body = json.loads(response.content.decode("utf8"))
+        assert [f["relative_path"] for f in body] == [
+            "test_sip/objects/file.txt",
+            "test_sip/objects/file.txt",
+            "test_sip/objects/sub/a.txt",
+        ]
+
+    @mock.patch("locations.api.resources.FILE_DATA_CHUNK_SIZE", 2)
+    def test_file_data_streams_json_lines_in_chunks(self):
+        package = models.Package.objects.get(
+            uuid="e0a41934-c1d7-45ba-9a95-a7531c063ed1"
+        )
+        names = [f"test_sip/objects/sub/{c}.txt" for c in "abc"]
+        for name in names:
+            models.File.objects.create(package=package, name=name, source_id=name)
+
+        response = self.client.get(
+            "/api/v2/file/metadata/",
+            {"relative_path_prefix": "test_sip/objects/sub/", "format": "jsonl"},
+        )
+        assert response.status_code == 200
+        with CaptureQueriesContext(connection) as queries:
+            content = list(response.streaming_content)
+
+        assert len(content) == 2
+        lines = b"".join(content).decode("utf8").splitlines()
+        assert [json.loads(line)["relative_path"] for line in lines] == names
+        # The first chunk was fetched to know if there are any files.
+        assert len(queries) == 1
+
+    def test_file_data_streams_pages_as_json_lines(self):
+        path = "test_sip/objects/file.txt"
+        pages = []
+        for offset in (0, 1, 2):
+            response = self.client.get(
+                "/api/v2/file/metadata/",
+                {
+                    "relative_path": path,
+                    "format": "jsonl",
+                    "limit": 1,
+                    "offset": offset,
+                },
+            )
+            if response.status_code == 404:
+                break
+            assert response.status_code == 200
+            assert response["content-type"] == "application/x-ndjson"
+            lines = b"".join(response.streaming_content).decode("utf8").splitlines()
+            pages.append([json.loads(line)["fileuuid"] for line in lines])
+
+        assert pages == [
+            ["86bfde11-e2a1-4ee7-b98d-9556b5f05198"],
+            ["2b24a977-ad7a-4886-b17c-8b32ab4a7955"],
+        ]
+
+    def test_file_data_returns_400_with_invalid_pagination(self):
+        response = self.client.get(
+            "/api/v2/file/metadata/",
+            {"relative_path": "test_sip/objects/file.txt", "limit": -1},
+        )
+        assert response.status_code == 400
+
     def test_file_data_returns_bad_response_with_no_accepted_parameters(self):
         response = self.client.post("/api/v2/file/metadata/")
         assert response.status_code == 400
@@ -699,17 +884,142 @@ class TestPackageAPI(TempDirMixin, TestCase):
         response = self.client.get("/api/v2/file/metadata/", {"fileuuid": "nosuchfile"})
         assert response.status_code == 404
 
+    def test_bulk_status_returns_packages_in_requested_order(self):
+        package = models.Package.objects.get(
+            uuid="79245866-ca80-4f84-b904-a02b3e0ab621"
+        )
+        replica = models.Package.objects.create(
+            current_location=self.test_location,
+            current_path="replica",
+            package_type=models.Package.TRANSFER,
+            replicated_package=package,
+        )
+        missing_uuid = str(uuid.uuid4())
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                "/api/v2/file/status/",
+                data=json.dumps(
+                    {
+                        "uuids": [
+                            str(package.uuid),
+                            missing_uuid,
+                            "E0A41934-C1D7-45BA-9A95-A7531C063ED1",
+                            str(package.uuid),
+                        ]
+                    }
+                ),
+                content_type="application/json",
+            )
+
+        assert response.status_code == 200
+        package_queries = [
+            query for query in queries if "locations_package" in query["sql"]
+        ]
+        assert len(package_queries) == 2
+        response_content = json.loads(response.content)
+        assert response_content["not_found"] == [missing_uuid]
+        assert response_content["objects"] == [
+            {
+                "uuid": "79245866-ca80-4f84-b904-a02b3e0ab621",
+                "status": "Uploaded",
+                "size": 0,
+                "current_location": "/api/v2/location/4056b25d-6a85-4557-b9a5-9c85565fd892/",
+                "replicas": [f"/api/v2/file/{replica.uuid}/"],
+                "last_fixity_at": package.last_fixity_at.isoformat(),
+                "last_fixity_success": True,
+            },
+            {
+                "uuid": "e0a41934-c1d7-45ba-9a95-a7531c063ed1",
+                "status": "Uploaded",
+                "size": 0,
+                "current_location": "/api/v2/location/4056b25d-6a85-4557-b9a5-9c85565fd892/",
+                "replicas": [],
+                "last_fixity_at": models.Package.objects.get(
+                    uuid="e0a41934-c1d7-45ba-9a95-a7531c063ed1"
+                ).last_fixity_at.isoformat(),
+                "last_fixity_success": False,
+            },
+        ]
+
+    def test_bulk_status_returns_400_if_post_body_is_invalid(self):
+        for data in ("not json", "[]", '{"uuids": "abc"}', '{"uuids": ["abc"]}'):
+            response = self.client.post(
+                "/api/v2/file/status/", data=data, content_type="application/json"
+            )
+            assert response.status_code == 400
+
+        with mock.patch("locations.api.resources.BULK_STATUS_MAX_PACKAGES", 1):
+            response = self.client.post(
+                "/api/v2/file/status/",
+                data=json.dumps({"uuids": [str(uuid.uuid4()), str(uuid.uuid4())]}),
+                content_type="application/json",
+            )
+        assert response.status_code == 400
+
     def test_package_contents_returns_metadata(self):
         response = self.client.get(
             "/api/v2/file/e0a41934-c1d7-45ba-9a95-a7531c063ed1/contents/"
         )
         assert response.status_code == 200
         assert response["content-type"] == "application/json"
-        body = json.loads(response.content.decode("utf8"))
+        body = json.loads(b"".join(response.streaming_content).decode("utf8"))
         assert body["success"] is True
         assert len(body["files"]) == 1
         assert body["files"][0]["name"] == "test_sip/objects/file.txt"
 
+    def test_package_contents_returns_pages(self):
+        package = models.Package.objects.get(
+            uuid="e0a41934-c1d7-45ba-9a95-a7531c063ed1"
+        )
+        for name in ("test_sip/objects/a.txt", "test_sip/objects/b.txt"):
+            models.File.objects.create(package=package, name=name, source_id=name)
+
+        pages = []
+        for offset in (0, 2, 4):
+            response = self.client.get(
+                f"/api/v2/file/{package.uuid}/contents/",
+                {"limit": 2, "offset": offset},
+            )
+            assert response.status_code == 200
+            body = json.loads(b"".join(response.streaming_content).decode("utf8"))
+            assert body["package"] == str(package.uuid)
+            pages.append([f["name"] for f in body["files"]])
+
+        assert pages == [
+            ["test_sip/objects/file.txt", "test_sip/objects/a.txt"],
+            ["test_sip/objects/b.txt"],
+            [],
+        ]
+
+        response = self.client.get(
+            f"/api/v2/file/{package.uuid}/contents/", {"limit": "a"}
+        )
+        assert response.status_code == 400
+
+    @mock.patch("locations.api.resources.FILE_DATA_CHUNK_SIZE", 2)
+    def test_package_contents_streams_files_in_chunks(self):
+        package = models.Package.objects.get(
+            uuid="e0a41934-c1d7-45ba-9a95-a7531c063ed1"
+        )
+        names = [f"test_sip/objects/{c}.txt" for c in "abc"]
+        for name in names:
+            models.File.objects.create(package=package, name=name, source_id=name)
+
+        response = self.client.get(
+            f"/api/v2/file/{package.uuid}/contents/", {"offset": 1}
+        )
+        with CaptureQueriesContext(connection) as queries:
+            content = list(response.streaming_content)
+
+        # The header, one piece per chunk of files and the footer.
+        assert len(content) == 4
+        body = json.loads(b"".join(content).decode("utf8"))
+        assert [f["name"] for f in body["files"]] == names
+        # Each chunk starts after the last file of the previous one.
+        assert len(queries) == 2
+        assert "OFFSET" not in queries[1]["sql"]
+
     def test_adding_package_files_returns_400_with_empty_post_body(self):
         response = self.client.put(
             "/api/v2/file/e0a41934-c1d7-45ba-9a95-a7531c063ed1/contents/",
@@ -449,3 +449,58 @@ class TestFixityLogDataTable(TestCase):
             log.datetime_reported.strftime("%Y-%m-%dT%H:%M:%S")
             for log in datatable.records
         ] == expected_datetimes
+
+
+class TestPackageDataTableSorting(TestCase):
+    fixture_files = ["base.json", "package.json", "fixity_log.json"]
+    fixtures = [FIXTURES_DIR / f for f in fixture_files]
+
+    def _sorted_records(self, column, direction):
+        datatable = datatable_utils.PackageDataTable(
+            {
+                "iSortingCols": 1,
+                "iSortCol_0": column,
+                f"bSortable_{column}": "true",
+                "sSortDir_0": direction,
+                "iDisplayStart": 0,
+                "iDisplayLength": 20,
+                "sEcho": "1",
+            }
+        )
+        # sorting and pagination are done by a single query
+        with self.assertNumQueries(1):
+            return list(datatable.records)
+
+    def test_sorting_by_fixity_date_helper(self):
+        records = self._sorted_records(8, "asc")
+
+        assert [package.uuid for package in records[:2]] == [
+            uuid.UUID("e0a41934-c1d7-45ba-9a95-a7531c063ed1"),
+            uuid.UUID("79245866-ca80-4f84-b904-a02b3e0ab621"),
+        ]
+        assert all(package.last_fixity_at is not None for package in records[:2])
+        # packages without fixity checks are sorted last
+        assert len(records) == TOTAL_FIXTURE_PACKAGES
+        assert all(package.last_fixity_at is None for package in records[2:])
+
+    def test_sorting_by_fixity_status_helper(self):
+        records = self._sorted_records(9, "desc")
+
+        assert [package.uuid for package in records[:2]] == [
+            uuid.UUID("79245866-ca80-4f84-b904-a02b3e0ab621"),
+            uuid.UUID("e0a41934-c1d7-45ba-9a95-a7531c063ed1"),
+        ]
+
+    def test_sorting_by_package_type_helper(self):
+        records = self._sorted_records(4, "desc")
+
+        displays = [package.get_package_type_display() for package in records]
+        assert displays == sorted(displays, reverse=True)
+
+    def test_sorting_by_stored_date_helper(self):
+        records = self._sorted_records(7, "asc")
+
+        stored_dates = [package.stored_date for package in records]
+        dated = [date for date in stored_dates if date is not None]
+        # packages without stored dates are sorted last
+        assert stored_dates == sorted(dated) + [None] * (len(stored_dates) - len(dated))
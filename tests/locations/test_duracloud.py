@@ -10,6 +10,28 @@ def space():
     return Space.objects.create()
 
 
+def _response(mocker, status_code, content=b""):
+    """Mock a streamed response with ``content`` as its body."""
+    response = mocker.Mock(
+        status_code=status_code, content=content, spec=requests.Response
+    )
+    response.iter_content.return_value = [content]
+    return response
+
+
+def _send_by_url(responses):
+    """Mock Session.send returning the next response listed for each URL.
+
+    Chunks are downloaded concurrently, so responses can't be returned in a
+    fixed order.
+    """
+
+    def send(request, **kwargs):
+        return responses[request.url].pop(0)
+
+    return send
+
+
 @pytest.mark.django_db
 def test_duraspace_url(space):
     d = Duracloud.objects.create(space=space, host="duracloud.org", duraspace="myspace")
@@ -218,9 +240,7 @@ def test_delete_path_deletes_folder(space, mocker):
 def test_move_to_storage_service_downloads_file(space, mocker, tmp_path):
     mocker.patch(
         "requests.Session.send",
-        side_effect=[
-            mocker.Mock(status_code=200, content=b"a file", spec=requests.Response)
-        ],
+        side_effect=[_response(mocker, 200, b"a file")],
     )
     d = Duracloud.objects.create(space=space, host="duracloud.org", duraspace="myspace")
     dst = tmp_path / "dst" / "file.txt"
@@ -234,11 +254,19 @@ def test_move_to_storage_service_downloads_file(space, mocker, tmp_path):
 def test_move_to_storage_service_downloads_chunked_file(space, mocker, tmp_path):
     mocker.patch(
         "requests.Session.send",
-        side_effect=[
-            mocker.Mock(status_code=404, spec=requests.Response),
-            mocker.Mock(status_code=200, content=b"a ch", spec=requests.Response),
-            mocker.Mock(status_code=200, content=b"unked file", spec=requests.Response),
-        ],
+        side_effect=_send_by_url(
+            {
+                "https://duracloud.org/durastore/myspace/some/file.txt": [
+                    _response(mocker, 404)
+                ],
+                "https://duracloud.org/durastore/myspace/some/file.txt.dura-chunk-0001": [
+                    _response(mocker, 200, b"a ch")
+                ],
+                "https://duracloud.org/durastore/myspace/some/file.txt.dura-chunk-0002": [
+                    _response(mocker, 200, b"unked file")
+                ],
+            }
+        ),
     )
     mocker.patch(
         "requests.Session.get",
@@ -285,8 +313,8 @@ def test_move_to_storage_service_downloads_folder(space, mocker, tmp_path):
         "requests.Session.send",
         side_effect=[
             mocker.Mock(status_code=404, spec=requests.Response),
-            mocker.Mock(status_code=200, content=b"file A", spec=requests.Response),
-            mocker.Mock(status_code=200, content=b"file B", spec=requests.Response),
+            _response(mocker, 200, b"file A"),
+            _response(mocker, 200, b"file B"),
         ],
     )
     mocker.patch(
@@ -332,12 +360,20 @@ def test_move_to_storage_service_retries_after_chunk_download_errors(
 ):
     send = mocker.patch(
         "requests.Session.send",
-        side_effect=[
-            mocker.Mock(status_code=404, spec=requests.Response),
-            mocker.Mock(status_code=200, content=b"a", spec=requests.Response),
-            mocker.Mock(status_code=200, content=b"a ch", spec=requests.Response),
-            mocker.Mock(status_code=200, content=b"unked file", spec=requests.Response),
-        ],
+        side_effect=_send_by_url(
+            {
+                "https://duracloud.org/durastore/myspace/some/file.txt": [
+                    _response(mocker, 404)
+                ],
+                "https://duracloud.org/durastore/myspace/some/file.txt.dura-chunk-0001": [
+                    _response(mocker, 200, b"a"),
+                    _response(mocker, 200, b"a ch"),
+                ],
+                "https://duracloud.org/durastore/myspace/some/file.txt.dura-chunk-0002": [
+                    _response(mocker, 200, b"unked file")
+                ],
+            }
+        ),
     )
     mocker.patch(
         "requests.Session.get",
@@ -387,14 +423,20 @@ def test_move_to_storage_service_fails_if_chunk_size_does_not_match(
 ):
     send = mocker.patch(
         "requests.Session.send",
-        side_effect=[
-            mocker.Mock(status_code=404, spec=requests.Response),
-            # Fail all the download retry attempts.
-            mocker.Mock(status_code=200, content=b"ERRORERROR", spec=requests.Response),
-            mocker.Mock(status_code=200, content=b"ERRORERROR", spec=requests.Response),
-            mocker.Mock(status_code=200, content=b"ERRORERROR", spec=requests.Response),
-            mocker.Mock(status_code=200, content=b"unked file", spec=requests.Response),
-        ],
+        side_effect=_send_by_url(
+            {
+                "https://duracloud.org/durastore/myspace/some/file.txt": [
+                    _response(mocker, 404)
+                ],
+                # Fail all the download retry attempts.
+                "https://duracloud.org/durastore/myspace/some/file.txt.dura-chunk-0001": [
+                    _response(mocker, 200, b"ERRORERROR") for _ in range(4)
+                ],
+                "https://duracloud.org/durastore/myspace/some/file.txt.dura-chunk-0002": [
+                    _response(mocker, 200, b"unked file")
+                ],
+            }
+        ),
     )
     mocker.patch(
         "requests.Session.get",
@@ -428,6 +470,7 @@ def test_move_to_storage_service_fails_if_chunk_size_does_not_match(
         ],
     )
     d = Duracloud.objects.create(space=space, host="duracloud.org", duraspace="myspace")
+    url = "https://duracloud.org/durastore/myspace/some/file.txt"
     dst = tmp_path / "dst" / "file.txt"
 
     # Look for a partial match since the exception receives multiple parameters.
@@ -441,11 +484,12 @@ def test_move_to_storage_service_fails_if_chunk_size_does_not_match(
         {"actual_size": 10, "expected_size": 4, "path": f"{dst}.dura-chunk-0001"},
     )
 
-    # The destination file was created but no chunks were written to it.
-    assert dst.read_text() == ""
+    # The partially downloaded file was removed.
+    assert not dst.exists()
 
-    # The session.send mock was called the maximum amount of download retries.
-    assert len(send.mock_calls) == 5
+    # The first chunk was downloaded the maximum amount of download retries.
+    chunk_urls = [c.args[0].url for c in send.mock_calls]
+    assert chunk_urls.count(f"{url}.dura-chunk-0001") == 4
 
 
 @pytest.mark.django_db
@@ -454,11 +498,19 @@ def test_move_to_storage_service_fails_if_chunk_checksum_does_not_match(
 ):
     send = mocker.patch(
         "requests.Session.send",
-        side_effect=[
-            mocker.Mock(status_code=404, spec=requests.Response),
-            mocker.Mock(status_code=200, content=b"a ch", spec=requests.Response),
-            mocker.Mock(status_code=200, content=b"unked file", spec=requests.Response),
-        ],
+        side_effect=_send_by_url(
+            {
+                "https://duracloud.org/durastore/myspace/some/file.txt": [
+                    _response(mocker, 404)
+                ],
+                "https://duracloud.org/durastore/myspace/some/file.txt.dura-chunk-0001": [
+                    _response(mocker, 200, b"a ch")
+                ],
+                "https://duracloud.org/durastore/myspace/some/file.txt.dura-chunk-0002": [
+                    _response(mocker, 200, b"unked file")
+                ],
+            }
+        ),
     )
     mocker.patch(
         "requests.Session.get",
@@ -492,6 +544,7 @@ def test_move_to_storage_service_fails_if_chunk_checksum_does_not_match(
         ],
     )
     d = Duracloud.objects.create(space=space, host="duracloud.org", duraspace="myspace")
+    url = "https://duracloud.org/durastore/myspace/some/file.txt"
     dst = tmp_path / "dst" / "file.txt"
 
     # Look for a partial match since the exception receives multiple parameters.
@@ -507,11 +560,12 @@ def test_move_to_storage_service_fails_if_chunk_checksum_does_not_match(
         "1781a616499ac88f78b56af57fcca974",
     )
 
-    # The destination file was created but no chunks were written to it.
-    assert dst.read_text() == ""
+    # The partially downloaded file was removed.
+    assert not dst.exists()
 
-    # The session.send mock was not called after the first chunk failed validation.
-    assert len(send.mock_calls) == 2
+    # The download of the chunk that failed validation was not retried.
+    chunk_urls = [c.args[0].url for c in send.mock_calls]
+    assert chunk_urls.count(f"{url}.dura-chunk-0001") == 1
 
 
 @pytest.mark.django_db
@@ -542,14 +596,13 @@ def test_move_from_storage_service_uploads_file(space, mocker, tmp_path):
 
 @pytest.mark.django_db
 def test_move_from_storage_service_uploads_chunked_file(space, mocker, tmp_path):
-    put = mocker.patch(
-        "requests.Session.put",
-        side_effect=[
-            mocker.Mock(status_code=201, spec=requests.Response),
-            mocker.Mock(status_code=201, spec=requests.Response),
-            mocker.Mock(status_code=201, spec=requests.Response),
-        ],
-    )
+    uploaded = {}
+
+    def put_side_effect(url, data, headers):
+        uploaded[url] = data.read()
+        return mocker.Mock(status_code=201, spec=requests.Response)
+
+    put = mocker.patch("requests.Session.put", side_effect=put_side_effect)
     d = Duracloud.objects.create(space=space, host="duracloud.org", duraspace="myspace")
     d.CHUNK_SIZE = 4
     d.BUFFER_SIZE = 2
@@ -560,7 +613,8 @@ def test_move_from_storage_service_uploads_chunked_file(space, mocker, tmp_path)
 
     d.move_from_storage_service(f.as_posix(), "some/file.txt")
 
-    assert put.mock_calls == [
+    # Chunks are uploaded concurrently, the manifest is uploaded last.
+    chunk_calls = [
         mocker.call(
             "https://duracloud.org/durastore/myspace/some/file.txt.dura-chunk-0000",
             data=mocker.ANY,
@@ -571,12 +625,49 @@ def test_move_from_storage_service_uploads_chunked_file(space, mocker, tmp_path)
             data=mocker.ANY,
             headers={"Content-MD5": "d9180594744f870aeefb086982e980bb"},
         ),
-        mocker.call(
-            "https://duracloud.org/durastore/myspace/some/file.txt.dura-manifest",
-            data=mocker.ANY,
-            headers={"Content-MD5": "59e5f62e5ed85ba339e73db5756e57c7"},
-        ),
     ]
+    assert len(put.mock_calls) == 3
+    put.assert_has_calls(chunk_calls, any_order=True)
+    assert put.mock_calls[-1] == mocker.call(
+        "https://duracloud.org/durastore/myspace/some/file.txt.dura-manifest",
+        data=mocker.ANY,
+        headers={"Content-MD5": "59e5f62e5ed85ba339e73db5756e57c7"},
+    )
+
+    # Chunks were streamed from the source file without writing copies.
+    url = "https://duracloud.org/durastore/myspace/some/file.txt"
+    assert uploaded[f"{url}.dura-chunk-0000"] == b"a fi"
+    assert uploaded[f"{url}.dura-chunk-0001"] == b"le"
+    assert [e.name for e in src.iterdir()] == ["file.txt"]
+
+
+@pytest.mark.django_db
+def test_move_from_storage_service_resumes_chunked_file(space, mocker, tmp_path):
+    put = mocker.patch(
+        "requests.Session.put",
+        return_value=mocker.Mock(status_code=201, spec=requests.Response),
+    )
+    mocker.patch(
+        "locations.models.duracloud.Duracloud._get_files_list",
+        return_value=["some/file.txt.dura-chunk-0000"],
+    )
+    d = Duracloud.objects.create(space=space, host="duracloud.org", duraspace="myspace")
+    d.CHUNK_SIZE = 4
+    src = tmp_path / "src"
+    src.mkdir()
+    f = src / "file.txt"
+    f.write_text("a file")
+
+    d.move_from_storage_service(f.as_posix(), "some/file.txt", resume=True)
+
+    # The existing chunk was skipped but is still listed in the manifest.
+    assert [c.args[0] for c in put.mock_calls] == [
+        "https://duracloud.org/durastore/myspace/some/file.txt.dura-chunk-0001",
+        "https://duracloud.org/durastore/myspace/some/file.txt.dura-manifest",
+    ]
+    assert put.mock_calls[-1].kwargs["headers"] == {
+        "Content-MD5": "59e5f62e5ed85ba339e73db5756e57c7"
+    }
 
 
 @pytest.mark.django_db
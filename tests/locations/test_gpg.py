@@ -1,17 +1,25 @@
 """Tests for the GPG encrypted space."""
 
+import io
 import os
 import pathlib
+import queue
 import tarfile
 from collections import namedtuple
 from typing import Any
 from typing import Dict
+from unittest import mock
 
+import gnupg
 import pytest
 from common import gpgutils
 from common import utils
+from django.db import connection
 from django.test import TestCase
+from django.urls import reverse
+from locations.models import Location
 from locations.models import Package
+from locations.models import Space
 from locations.models import gpg
 from locations.models import space
 from metsrw.plugins import premisrw
@@ -48,10 +56,6 @@ BROWSE_FAIL_DICT: Dict[str, Any] = {"directories": [], "entries": [], "propertie
 FakeGPGRet = namedtuple("FakeGPGRet", "ok status stderr")
 ExTarCase = namedtuple("ExTarCase", "path isdir raises expected")
 CrTarCase = namedtuple("CrTarCase", "path isfile istar raises expected")
-DecryptCase = namedtuple(
-    "DecryptCase", "path isfile createsdecryptfile decryptret expected"
-)
-EncryptCase = namedtuple("EncryptCase", "path isdir encrpathisfile encryptret expected")
 BrowseCase = namedtuple("BrowseCase", "path encrpath existsafter expect")
 MoveFromCase = namedtuple(
     "MoveFromCase", "src_path dst_path package encrypt_ret expect"
@@ -131,6 +135,7 @@ def test_move_to_storage_service(
         gpg, "_encr_path2key_fingerprint", return_value=SOME_FINGERPRINT
     )
     mocker.patch.object(gpg, "_get_encrypted_path", return_value=encr_path)
+    mocker.patch.object(gpg, "_find_encr_path_package")
     mocker.patch.object(os.path, "exists", side_effect=(src_exists1, src_exists2))
     if expect == "success":
         ret = gpg_space.move_to_storage_service(src_path, dst_path, None)
@@ -154,6 +159,7 @@ def test_move_to_storage_service(
     else:
         assert not gpg_space.space.move_rsync.called
     if src_exists1:
+        gpg._find_encr_path_package.assert_called_once_with(src_path)
         gpg._gpg_decrypt.assert_called_once_with(dst_path)
         assert not gpg._gpg_encrypt.called
     else:
@@ -216,6 +222,7 @@ def test_move_from_storage_service(
     gpg_space = gpg.GPG(key=SOME_FINGERPRINT, space=space.Space())
     mocker.patch.object(gpg_space.space, "create_local_directory")
     mocker.patch.object(gpg_space.space, "move_rsync")
+    mocker.patch.object(gpg.GPGPackagePath, "record")
     encryption_event = 42
     mocker.patch(
         "locations.models.gpg.premis.create_encryption_event",
@@ -232,6 +239,7 @@ def test_move_from_storage_service(
         if orig_pkg_key != gpg_space.key:
             assert package.encryption_key_fingerprint == gpg_space.key
             assert package.save_called == 1
+        gpg.GPGPackagePath.record.assert_called_once_with(dst_path, package)
     else:
         with pytest.raises(gpg.GPGException) as excinfo:
             gpg_space.move_from_storage_service(src_path, dst_path, package=package)
@@ -239,6 +247,7 @@ def test_move_from_storage_service(
             assert excinfo.value == encrypt_ret
         else:
             assert str(excinfo.value) == "GPG spaces can only contain packages"
+        assert not gpg.GPGPackagePath.record.called
     if package:
         gpg_space.space.create_local_directory.assert_called_once_with(dst_path)
         gpg_space.space.move_rsync.assert_any_call(
@@ -291,68 +300,300 @@ def test_browse(mocker, path, encr_path, exists_after_decrypt, expect):
         gpg._gpg_encrypt.assert_called_once_with(encr_path, SOME_FINGERPRINT)
 
 
-@pytest.mark.parametrize(
-    "path, isdir, encr_path_is_file, encrypt_ret, expected",
-    [
-        EncryptCase(
-            path="/a/b/c",
-            isdir=True,
-            encrpathisfile=True,
-            encryptret=ENCRYPT_RET_SUCCESS,
-            expected="success",
-        ),
-        EncryptCase(
-            path="/a/b/c",
-            isdir=False,
-            encrpathisfile=True,
-            encryptret=ENCRYPT_RET_SUCCESS,
-            expected="success",
-        ),
-        EncryptCase(
-            path="/a/b/c",
-            isdir=True,
-            encrpathisfile=False,
-            encryptret=ENCRYPT_RET_SUCCESS,
-            expected="fail",
+@pytest.fixture
+def gpg_key(tmp_path, mocker):
+    """Point ``gpgutils`` at a throwaway keyring holding one key and return
+    its fingerprint.
+    """
+    gnupghome = tmp_path / "gnupg"
+    gnupghome.mkdir(mode=0o700)
+    instance = gnupg.GPG(gnupghome=str(gnupghome))
+    mocker.patch.object(gpgutils.gpg, "_gpg", instance)
+    key = instance.gen_key(
+        instance.gen_key_input(
+            key_type="EDDSA",
+            key_curve="ed25519",
+            subkey_type="ECDH",
+            subkey_curve="cv25519",
+            name_real="Test",
+            no_protection=True,
+        )
+    )
+    return key.fingerprint
+
+
+@pytest.fixture
+def aip_dir(tmp_path):
+    path = tmp_path / "space" / "aip-1234"
+    (path / "data" / "objects").mkdir(parents=True)
+    (path / "bagit.txt").write_text("BagIt-Version: 0.97")
+    (path / "data" / "objects" / "file.bin").write_bytes(os.urandom(100000))
+    return path
+
+
+def _tree(path):
+    return {
+        str(p.relative_to(path)): p.read_bytes() if p.is_file() else None
+        for p in sorted(path.rglob("*"))
+    }
+
+
+def test__gpg_encrypt_and_decrypt_directory(gpg_key, aip_dir, mocker):
+    create_tar = mocker.spy(utils, "create_tar")
+    decrypt_stream = mocker.spy(gpgutils, "gpg_decrypt_stream")
+    contents = _tree(aip_dir)
+
+    ret = gpg._gpg_encrypt(str(aip_dir), gpg_key)
+
+    assert ret[0] == str(aip_dir)
+    assert ret[1].ok
+    assert aip_dir.is_file()
+    assert not tarfile.is_tarfile(aip_dir)
+    assert os.listdir(aip_dir.parent) == [aip_dir.name]
+    assert not create_tar.called
+
+    assert gpg._gpg_decrypt(str(aip_dir)) == str(aip_dir)
+
+    assert aip_dir.is_dir()
+    assert _tree(aip_dir) == contents
+    assert os.listdir(aip_dir.parent) == [aip_dir.name]
+    # The decrypted tarball was streamed into tar, not buffered.
+    assert decrypt_stream.spy_return.data == b""
+
+
+def test__gpg_encrypt_and_decrypt_file(gpg_key, tmp_path):
+    path = tmp_path / "aip-1234.7z"
+    contents = os.urandom(100000)
+    path.write_bytes(contents)
+
+    gpg._gpg_encrypt(str(path), gpg_key)
+
+    assert path.read_bytes() != contents
+    assert sorted(os.listdir(tmp_path)) == ["aip-1234.7z", "gnupg"]
+
+    gpg._gpg_decrypt(str(path))
+
+    assert path.read_bytes() == contents
+    assert sorted(os.listdir(tmp_path)) == ["aip-1234.7z", "gnupg"]
+
+
+def test__gpg_encrypt_failure_leaves_package_untouched(gpg_key, aip_dir):
+    contents = _tree(aip_dir)
+
+    with pytest.raises(gpg.GPGException) as excinfo:
+        gpg._gpg_encrypt(str(aip_dir), SOME_OTHER_FINGERPRINT)
+
+    assert f"An error occured when attempting to encrypt {aip_dir}" == str(
+        excinfo.value
+    )
+    assert _tree(aip_dir) == contents
+    assert os.listdir(aip_dir.parent) == [aip_dir.name]
+
+
+def test__gpg_decrypt_missing_file(tmp_path):
+    path = tmp_path / "aip-1234"
+
+    with pytest.raises(gpg.GPGException) as excinfo:
+        gpg._gpg_decrypt(str(path))
+
+    assert f"Cannot decrypt file at {path}; no such file." == str(excinfo.value)
+
+
+def test__gpg_decrypt_failure_leaves_package_untouched(gpg_key, aip_dir):
+    gpg._gpg_encrypt(str(aip_dir), gpg_key)
+    encrypted = aip_dir.read_bytes()
+    # Corrupt the end of the encrypted data so GnuPG fails half-way through.
+    aip_dir.write_bytes(encrypted[:-100] + bytes(100))
+
+    with pytest.raises(gpg.GPGException) as excinfo:
+        gpg._gpg_decrypt(str(aip_dir))
+
+    assert str(excinfo.value).startswith(f"Failed to decrypt {aip_dir}. Reason: ")
+    assert aip_dir.read_bytes() == encrypted[:-100] + bytes(100)
+    assert os.listdir(aip_dir.parent) == [aip_dir.name]
+
+
+def test_stream_decrypted(gpg_key, tmp_path):
+    path = tmp_path / "aip-1234.7z"
+    contents = os.urandom(100000)
+    path.write_bytes(contents)
+    gpg._gpg_encrypt(str(path), gpg_key)
+    encrypted = path.read_bytes()
+
+    chunks = list(gpg.GPG().stream_decrypted(str(path)))
+
+    assert len(chunks) > 1
+    assert b"".join(chunks) == contents
+    assert path.read_bytes() == encrypted
+    assert sorted(os.listdir(tmp_path)) == ["aip-1234.7z", "gnupg"]
+
+
+def test_stream_decrypted_failure(gpg_key, tmp_path):
+    path = tmp_path / "aip-1234.7z"
+    path.write_bytes(os.urandom(100000))
+    gpg._gpg_encrypt(str(path), gpg_key)
+    path.write_bytes(path.read_bytes()[:-100] + bytes(100))
+
+    with pytest.raises(gpg.GPGException) as excinfo:
+        list(gpg.GPG().stream_decrypted(str(path)))
+
+    assert str(excinfo.value).startswith(f"Failed to decrypt {path}. Reason: ")
+
+
+def test_stream_decrypted_can_be_abandoned(gpg_key, tmp_path, mocker):
+    mocker.patch.object(gpg, "DECRYPT_QUEUE_SIZE", 1)
+    path = tmp_path / "aip-1234.7z"
+    contents = os.urandom(4000000)
+    path.write_bytes(contents)
+    gpg._gpg_encrypt(str(path), gpg_key)
+    decrypt_results = queue.Queue()
+    gpg_decrypt_stream = gpgutils.gpg_decrypt_stream
+
+    def decrypt_stream(*args, **kwargs):
+        result = gpg_decrypt_stream(*args, **kwargs)
+        decrypt_results.put(result)
+        return result
+
+    mocker.patch.object(gpgutils, "gpg_decrypt_stream", side_effect=decrypt_stream)
+
+    chunks = gpg.GPG().stream_decrypted(str(path))
+    first = next(chunks)
+    chunks.close()
+
+    assert contents.startswith(first)
+    # GnuPG is stopped instead of decrypting the rest of the file.
+    assert not decrypt_results.get(timeout=10).ok
+
+
+def test_extract_decrypted(gpg_key, aip_dir, tmp_path):
+    gpg._gpg_encrypt(str(aip_dir), gpg_key)
+    extract_path = tmp_path / "extract"
+    extract_path.mkdir()
+
+    ret = gpg.GPG().extract_decrypted(
+        str(aip_dir), "aip-1234/bagit.txt", str(extract_path)
+    )
+
+    assert ret == str(extract_path / "aip-1234" / "bagit.txt")
+    assert _tree(extract_path) == {
+        "aip-1234": None,
+        "aip-1234/bagit.txt": b"BagIt-Version: 0.97",
+    }
+    assert aip_dir.is_file()
+
+
+def test_extract_decrypted_missing_member(gpg_key, aip_dir, tmp_path):
+    gpg._gpg_encrypt(str(aip_dir), gpg_key)
+
+    with pytest.raises(gpg.GPGMemberNotFoundException) as excinfo:
+        gpg.GPG().extract_decrypted(str(aip_dir), "aip-1234/missing", str(tmp_path))
+
+    assert str(excinfo.value) == f"aip-1234/missing not found in {aip_dir}"
+
+
+@pytest.fixture
+def internal_location(db, tmp_path):
+    path = tmp_path / "internal"
+    path.mkdir()
+    return Location.objects.create(
+        space=Space.objects.create(access_protocol=Space.LOCAL_FILESYSTEM, path="/"),
+        purpose=Location.STORAGE_SERVICE_INTERNAL,
+        relative_path=str(path).lstrip("/"),
+    )
+
+
+@pytest.fixture
+def encrypted_package(db, tmp_path, gpg_key, aip_dir):
+    space_ = Space.objects.create(
+        access_protocol=Space.GPG, path=str(tmp_path), staging_path=str(tmp_path)
+    )
+    gpg.GPG.objects.create(space=space_, key=gpg_key)
+    location = Location.objects.create(
+        space=space_, purpose=Location.AIP_STORAGE, relative_path="space"
+    )
+    gpg._gpg_encrypt(str(aip_dir), gpg_key)
+    return Package.objects.create(
+        current_location=location,
+        package_type=Package.AIP,
+        current_path=aip_dir.name,
+        encryption_key_fingerprint=gpg_key,
+    )
+
+
+def test_download_request_decrypts_on_the_fly(
+    admin_client, encrypted_package, internal_location, aip_dir, mocker
+):
+    fetch_local_path = mocker.spy(Package, "fetch_local_path")
+    contents = aip_dir.read_bytes()
+
+    response = admin_client.get(
+        reverse(
+            "download_request",
+            kwargs={
+                "api_name": "v2",
+                "resource_name": "file",
+                "uuid": encrypted_package.uuid,
+            },
+        )
+    )
+
+    assert response.status_code == 200
+    assert response["content-type"] == "application/x-tar"
+    assert response["content-disposition"] == 'attachment; filename="aip-1234.tar"'
+    with tarfile.open(fileobj=io.BytesIO(b"".join(response.streaming_content))) as t:
+        assert sorted(t.getnames()) == [
+            "aip-1234",
+            "aip-1234/bagit.txt",
+            "aip-1234/data",
+            "aip-1234/data/objects",
+            "aip-1234/data/objects/file.bin",
+        ]
+    assert aip_dir.read_bytes() == contents
+    assert not fetch_local_path.called
+
+
+def test_extract_file_request_decrypts_only_the_file(
+    admin_client, encrypted_package, internal_location, mocker
+):
+    fetch_local_path = mocker.spy(Package, "fetch_local_path")
+
+    response = admin_client.get(
+        reverse(
+            "extract_file_request",
+            kwargs={
+                "api_name": "v2",
+                "resource_name": "file",
+                "uuid": encrypted_package.uuid,
+            },
         ),
-        EncryptCase(
-            path="/a/b/c",
-            isdir=True,
-            encrpathisfile=True,
-            encryptret=ENCRYPT_RET_FAIL,
-            expected="fail",
+        {"relative_path_to_file": "aip-1234/bagit.txt"},
+    )
+
+    assert response.status_code == 200
+    assert response["content-disposition"] == 'attachment; filename="bagit.txt"'
+    assert b"".join(response.streaming_content) == b"BagIt-Version: 0.97"
+    assert list(pathlib.Path(internal_location.full_path).iterdir()) == []
+    assert not fetch_local_path.called
+
+
+def test_extract_file_request_returns_404_if_file_is_not_in_package(
+    admin_client, encrypted_package, internal_location
+):
+    response = admin_client.get(
+        reverse(
+            "extract_file_request",
+            kwargs={
+                "api_name": "v2",
+                "resource_name": "file",
+                "uuid": encrypted_package.uuid,
+            },
         ),
-    ],
-)
-def test__gpg_encrypt(mocker, path, isdir, encr_path_is_file, encrypt_ret, expected):
-    encr_path = f"{path}.gpg"
-    mocker.patch.object(os.path, "isdir", return_value=isdir)
-    mocker.patch.object(os, "remove")
-    mocker.patch.object(os, "rename")
-    mocker.patch.object(utils, "create_tar")
-    mocker.patch.object(utils, "extract_tar")
-    mocker.patch.object(
-        gpgutils, "gpg_encrypt_file", return_value=(encr_path, encrypt_ret)
+        {"relative_path_to_file": "aip-1234/missing.txt"},
     )
-    mocker.patch.object(os.path, "isfile", return_value=encr_path_is_file)
-    if expected == "success":
-        ret = gpg._gpg_encrypt(path, SOME_FINGERPRINT)
-        os.remove.assert_called_once_with(path)
-        os.rename.assert_called_once_with(encr_path, path)
-        assert ret == (path, encrypt_ret)
-        assert not utils.extract_tar.called
-    else:
-        with pytest.raises(gpg.GPGException) as excinfo:
-            gpg._gpg_encrypt(path, SOME_FINGERPRINT)
-        assert f"An error occured when attempting to encrypt {path}" == str(
-            excinfo.value
-        )
-        if isdir:
-            utils.extract_tar.assert_called_once_with(path)
-    os.path.isdir.assert_called_once_with(path)
-    os.path.isfile.assert_called_once_with(encr_path)
-    if isdir:
-        utils.create_tar.assert_called_once_with(path)
+
+    assert response.status_code == 404
+    assert response.content == b"Requested file, aip-1234/missing.txt, not found in AIP"
+    assert list(pathlib.Path(internal_location.full_path).iterdir()) == []
 
 
 def test__get_encrypted_path(monkeypatch):
@@ -367,76 +608,6 @@ def test__get_encrypted_path(monkeypatch):
     assert gpg._get_encrypted_path("/a/b") is None
 
 
-@pytest.mark.parametrize(
-    "path, isfile, will_create_decrypt_file, decrypt_ret, expected",
-    [
-        DecryptCase(
-            path="/a/b/c",
-            isfile=True,
-            createsdecryptfile=True,
-            decryptret=DECRYPT_RET_SUCCESS,
-            expected="success",
-        ),
-        DecryptCase(
-            path="/x/y/z",
-            isfile=False,
-            createsdecryptfile=False,
-            decryptret=DECRYPT_RET_FAIL,
-            expected="fail",
-        ),
-        DecryptCase(
-            path="/a/b/c",
-            isfile=True,
-            createsdecryptfile=False,
-            decryptret=DECRYPT_RET_FAIL,
-            expected="fail",
-        ),
-    ],
-)
-def test__gpg_decrypt(
-    mocker, path, isfile, will_create_decrypt_file, decrypt_ret, expected
-):
-    mocker.patch("os.remove")
-    mocker.patch("os.rename")
-    mocker.patch.object(tarfile, "is_tarfile", return_value=True)
-    mocker.patch.object(gpgutils, "gpg_decrypt_file", return_value=decrypt_ret)
-    mocker.patch.object(utils, "extract_tar")
-
-    def isfilemock(path_):
-        if path_ == path:
-            return isfile
-        return will_create_decrypt_file
-
-    mocker.patch.object(os.path, "isfile", side_effect=isfilemock)
-    assert not gpgutils.gpg_decrypt_file.called
-    decr_path = f"{path}.decrypted"
-    if expected == "success":
-        ret = gpg._gpg_decrypt(path)
-        os.remove.assert_called_once_with(path)
-        os.rename.assert_called_once_with(decr_path, path)
-        tarfile.is_tarfile.assert_called_once_with(path)
-        utils.extract_tar.assert_called_once_with(path)
-        assert ret == path
-    else:
-        with pytest.raises(gpg.GPGException) as excinfo:
-            gpg._gpg_decrypt(path)
-        if isfile:
-            assert (
-                f"Failed to decrypt {path}. Reason: {DECRYPT_RET_FAIL_STATUS}"
-                == str(excinfo.value)
-            )
-        else:
-            assert f"Cannot decrypt file at {path}; no such file." == str(excinfo.value)
-        assert not os.remove.called
-        assert not os.rename.called
-        assert not tarfile.is_tarfile.called
-        assert not utils.extract_tar.called
-    if isfile:
-        gpgutils.gpg_decrypt_file.assert_called_once_with(path, decr_path)
-    else:
-        assert not gpgutils.gpg_decrypt_file.called
-
-
 def test__parse_gpg_version():
     assert GPG_VERSION == gpg._parse_gpg_version(RAW_GPG_VERSION)
 
@@ -448,8 +619,7 @@ class TestGPG(TestCase):
     def test__encr_path2key_fingerprint(self):
         package = Package.objects.get(pk=8)
         exp_curr_path = (
-            "some/relative/path/to/"
-            "images-transfer-abcdabcd-97dd-48e0-8417-03be78359531"
+            "some/relative/path/to/images-transfer-abcdabcd-97dd-48e0-8417-03be78359531"
         )
         assert package.current_path == exp_curr_path
         assert package.encryption_key_fingerprint == EXP_FINGERPRINT
@@ -472,3 +642,50 @@ class TestGPG(TestCase):
         assert f"Unable to find package matching encrypted path {encr_path}" in str(
             excinfo.value
         )
+
+    def test__encr_path2key_fingerprint_records_package_path(self):
+        package = Package.objects.get(pk=8)
+        encr_path = package.full_path
+
+        # Packages encrypted before their path was recorded are found by
+        # scanning the package table once.
+        assert gpg._encr_path2key_fingerprint(encr_path) == EXP_FINGERPRINT
+        assert gpg.GPGPackagePath.objects.get().package == package
+
+        with self.assertNumQueries(1):
+            assert gpg._encr_path2key_fingerprint(encr_path) == EXP_FINGERPRINT
+        with self.assertNumQueries(1):
+            assert (
+                gpg._encr_path2key_fingerprint(f"{encr_path}/data/objects/some.jpg")
+                == EXP_FINGERPRINT
+            )
+
+    def test__encr_path2key_fingerprint_forgets_moved_package(self):
+        package = Package.objects.get(pk=8)
+        gpg.GPGPackagePath.record("/old/path/to/package", package)
+
+        with pytest.raises(gpg.GPGException):
+            gpg._encr_path2key_fingerprint("/old/path/to/package")
+        assert not gpg.GPGPackagePath.objects.exists()
+
+    def test_move_forgets_package_path(self):
+        package = Package.objects.get(pk=8)
+        gpg.GPGPackagePath.record(package.full_path, package)
+
+        with mock.patch.object(Space, "posix_move"):
+            package.move(
+                Location.objects.get(uuid="6e61aacf-8492-4382-8ef3-262cc5420259")
+            )
+
+        assert not gpg.GPGPackagePath.objects.exists()
+
+    @pytest.mark.skipif(
+        connection.vendor != "sqlite", reason="Inspects SQLite's query plan"
+    )
+    def test_gpg_package_path_lookup_is_indexed(self):
+        hashes = [gpg.GPGPackagePath.hash_path(p) for p in ("/a/b", "/a", "/")]
+
+        plan = gpg.GPGPackagePath.objects.filter(path_hash__in=hashes).explain()
+
+        assert "USING INDEX" in plan
+        assert "SCAN" not in plan
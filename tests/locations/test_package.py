@@ -312,6 +312,29 @@ class TestPackage(TestCase):
                 == "images-transfer-de1b31fa-97dd-48e0-8417-03be78359531/objects/pictures/Landing_zone.jpg"
             )
 
+    def test_stream_mets_reads_files_lazily(self):
+        mets_data = self.package._stream_mets(prefix=self.mets_path)
+        assert mets_data["transfer_uuid"] == "de1b31fa-97dd-48e0-8417-03be78359531"
+
+        first_file = next(mets_data["files"])
+        assert len(list(mets_data["files"])) == 10
+        assert first_file == {
+            "path": "images-transfer-de1b31fa-97dd-48e0-8417-03be78359531/objects/799px-Euroleague-LE_Roma_vs_Toulouse_IC-27.bmp",
+            "file_uuid": "a1d4aaa1-d850-4457-b0d7-c84c04a17e1c",
+        }
+
+    def test_stream_mets_requires_physical_structmap(self):
+        mets_path = os.path.join("metadata", "submissionDocumentation", "METS.xml")
+        os.makedirs(os.path.dirname(os.path.join(self.tmp_dir, mets_path)))
+        with open(os.path.join(self.mets_path, mets_path)) as f:
+            mets = f.read()
+        with open(os.path.join(self.tmp_dir, mets_path), "w") as f:
+            f.write(mets.replace('TYPE="physical"', 'TYPE="logical"'))
+
+        mets_data = self.package._stream_mets(prefix=self.tmp_dir)
+        with pytest.raises(models.StorageException, match="structMap"):
+            list(mets_data["files"])
+
     def test_files_are_added_to_database(self):
         self.package.index_file_data_from_transfer_mets(prefix=self.mets_path)
         assert (
@@ -324,6 +347,30 @@ class TestPackage(TestCase):
             == "742f10b0-768a-4158-b255-94847a97c465"
         )
 
+    @mock.patch("locations.models.package.FILE_INDEX_BATCH_SIZE", 5)
+    def test_files_are_added_to_database_in_batches(self):
+        # One query to find existing files and one to create the missing
+        # ones per batch of 5 files, plus the transaction savepoint.
+        with self.assertNumQueries(3 * 2 + 2):
+            self.package.index_file_data_from_transfer_mets(prefix=self.mets_path)
+        assert self.package.file_set.count() == 12
+
+        # Indexing the transfer again does not duplicate its files.
+        self.package.index_file_data_from_transfer_mets(prefix=self.mets_path)
+        assert self.package.file_set.count() == 12
+
+    @mock.patch("locations.models.package.AsyncManager.run_task")
+    def test_files_are_added_to_database_in_background(self, run_task):
+        self.package.index_file_data_from_transfer_mets(
+            prefix=self.mets_path, in_background=True
+        )
+        assert self.package.file_set.count() == 1
+
+        task_fn, file_data = run_task.call_args.args
+        assert len(file_data["files"]) == 11
+        task_fn(file_data)
+        assert self.package.file_set.count() == 12
+
     @mock.patch("common.utils.generate_checksum", return_value=_test_checksum())
     def test_stored_checksum(self, generate_checksum):
         package = models.Package.objects.get(
@@ -1444,6 +1491,239 @@ def test_get_fixity_check_report_send_signals_verifies_failed_fixity_check(
     }
 
 
+@pytest.mark.django_db
+def test_record_storage_metadata_of_uncompressed_package(package, tmp_path):
+    aip_dir = tmp_path / "aip-1234"
+    aip_dir.mkdir()
+
+    package.record_storage_metadata(f"{aip_dir}/", package.current_location.space)
+
+    assert package.is_file is False
+    assert package.compression is None
+    assert package.encrypted is False
+    assert package.base_directory == "aip-1234"
+
+
+@pytest.mark.django_db
+@mock.patch(
+    "subprocess.check_output",
+    return_value=b'{"lsarContents": [{"XADFileName": "aip-1234/data", "XADIsDirectory": 1},'
+    b' {"XADFileName": "aip-1234", "XADIsDirectory": 1},'
+    b' {"XADFileName": "aip-1234/bagit.txt"}]}',
+)
+def test_record_storage_metadata_of_compressed_package(check_output, package):
+    package.record_storage_metadata(
+        package.full_path, package.current_location.space, utils.COMPRESSION_7Z_BZIP
+    )
+
+    assert package.is_file is True
+    assert package.compression == utils.COMPRESSION_7Z_BZIP
+    assert package.encrypted is False
+    assert package.base_directory == "aip-1234"
+    check_output.assert_called_once_with(["lsar", "-ja", package.full_path])
+
+
+@pytest.mark.django_db
+def test_recorded_storage_metadata_is_used_without_accessing_package(package):
+    package.is_file = True
+    package.compression = utils.COMPRESSION_TAR_GZIP
+    package.encrypted = False
+    package.base_directory = "working_bag"
+
+    with mock.patch.object(
+        models.Package, "get_local_path", side_effect=AssertionError
+    ), mock.patch("common.utils.get_compression", side_effect=AssertionError):
+        assert package.is_compressed
+        assert package.get_compression() == utils.COMPRESSION_TAR_GZIP
+        assert package.get_base_directory() == "working_bag"
+        assert package._encrypted_tar_flags() is None
+
+
+@pytest.mark.django_db(transaction=True)
+def test_replicate_to_stages_the_package_once(package, space, internal_location):
+    replicator_locations = [
+        models.Location.objects.create(
+            space=space,
+            relative_path=f"replica-{i}",
+            purpose=models.Location.REPLICATOR,
+        )
+        for i in range(3)
+    ]
+
+    def move_to_storage_service(source_path, destination_path, destination_space):
+        staged_path = os.path.join(destination_space.staging_path, destination_path)
+        os.makedirs(os.path.dirname(staged_path))
+        shutil.copy(os.path.join(space.path, source_path), staged_path)
+
+    def move_from_storage_service(source_path, destination_path, package):
+        staged_path = os.path.join(space.staging_path, source_path)
+        os.makedirs(os.path.dirname(package.full_path))
+        shutil.copy(staged_path, package.full_path)
+
+    with mock.patch.object(
+        models.Space, "move_to_storage_service", side_effect=move_to_storage_service
+    ) as move_to, mock.patch.object(
+        models.Space, "move_from_storage_service", side_effect=move_from_storage_service
+    ) as move_from:
+        package.replicate_to(replicator_locations)
+
+    move_to.assert_called_once()
+    assert move_from.call_count == 3
+    replicas = list(package.replicas.all())
+    assert {replica.current_location for replica in replicas} == set(
+        replicator_locations
+    )
+    for replica in replicas:
+        assert replica.status == models.Package.UPLOADED
+        assert replica.stored_date is not None
+        assert os.path.isfile(replica.full_path)
+        # The staged copies have been removed.
+        assert not os.path.exists(
+            os.path.join(space.staging_path, replica.current_path)
+        )
+
+
+@pytest.mark.django_db
+def test_replicate_to_stores_all_replicas_before_raising(
+    package, space, internal_location, settings, tmp_path
+):
+    settings.REPLICATION_WORKERS = 2
+    package.uuid = "4781e745-96bc-4b06-995c-ee59fddf856d"
+    package.save()
+    pointer = tmp_path / "pointer.xml"
+    shutil.copy(
+        os.path.join(FIXTURES_DIR, "pointer.4781e745-96bc-4b06-995c-ee59fddf856d.xml"),
+        pointer,
+    )
+    replicator_locations = [
+        models.Location.objects.create(
+            space=space,
+            relative_path=f"replica-{i}",
+            purpose=models.Location.REPLICATOR,
+        )
+        for i in range(2)
+    ]
+
+    def move_to_storage_service(source_path, destination_path, destination_space):
+        staged_path = os.path.join(destination_space.staging_path, destination_path)
+        os.makedirs(os.path.dirname(staged_path))
+        shutil.copy(os.path.join(space.path, source_path), staged_path)
+
+    with mock.patch.object(
+        models.Space, "move_to_storage_service", side_effect=move_to_storage_service
+    ), mock.patch.object(
+        models.Space,
+        "move_from_storage_service",
+        side_effect=[OSError("unavailable"), None],
+    ) as move_from, mock.patch.object(
+        models.Space, "post_move_from_storage_service"
+    ), mock.patch.object(models.Package, "full_pointer_file_path", str(pointer)):
+        with pytest.raises(OSError, match="unavailable"):
+            package.replicate_to(replicator_locations)
+
+    assert move_from.call_count == 2
+    # The replica that was stored is finalized and recorded in the pointer
+    # file of the replicated package, the other one is left in staging.
+    stored, failed = sorted(
+        package.replicas.all(),
+        key=lambda replica: replica.status != models.Package.UPLOADED,
+    )
+    assert stored.status == models.Package.UPLOADED
+    assert stored.stored_date is not None
+    assert failed.status == models.Package.STAGING
+    assert failed.stored_date is None
+    master_pointer = pointer.read_text()
+    assert str(stored.uuid) in master_pointer
+    assert str(failed.uuid) not in master_pointer
+
+
+@pytest.fixture
+def replicated_bag(package, space, tmp_path):
+    """An uncompressed package updated by a reingest in ``tmp_path / "aip"``
+    and its replica, which has the content of the package before the
+    reingest.
+    """
+    aip = tmp_path / "aip"
+    (aip / "objects" / "removed").mkdir(parents=True)
+    (aip / "objects" / "unchanged.txt").write_text("unchanged")
+    (aip / "objects" / "changed.txt").write_text("original")
+    (aip / "objects" / "removed" / "removed.txt").write_text("removed")
+    bagit.make_bag(str(aip), checksums=["sha256"])
+
+    replicator_location = models.Location.objects.create(
+        space=space, relative_path="replicas", purpose=models.Location.REPLICATOR
+    )
+    package.current_location.replicators.add(replicator_location)
+    replica = models.Package.objects.create(
+        current_location=replicator_location,
+        current_path="replica",
+        package_type="AIP",
+        status=models.Package.UPLOADED,
+        replicated_package=package,
+        size=10,
+    )
+    shutil.copytree(aip, replica.full_path)
+
+    # Reingest.
+    objects = aip / "data" / "objects"
+    (objects / "changed.txt").write_text("updated")
+    shutil.rmtree(objects / "removed")
+    (objects / "added").mkdir()
+    (objects / "added" / "added.txt").write_text("added")
+    bag = bagit.Bag(str(aip))
+    bag.save(manifests=True)
+    package.checksum = utils.generate_checksum(aip, "sha256").hexdigest()
+    package.checksum_algorithm = "sha256"
+    package.size = 20
+    package.save()
+    return aip, replica
+
+
+@pytest.mark.django_db
+def test_update_replicas_copies_only_changed_files(replicated_bag, package):
+    aip, replica = replicated_bag
+
+    with mock.patch(
+        "locations.models.package.shutil.copy2", side_effect=shutil.copy2
+    ) as copy2, mock.patch.object(models.Package, "replicate_to") as replicate_to:
+        package.update_replicas(str(aip))
+
+    copied = {
+        os.path.relpath(call.args[1], replica.full_path)
+        for call in copy2.call_args_list
+    }
+    assert "data/objects/unchanged.txt" not in copied
+    assert {"data/objects/changed.txt", "data/objects/added/added.txt"} <= copied
+    replica_path = pathlib.Path(replica.full_path)
+    assert not (replica_path / "data" / "objects" / "removed").exists()
+    assert bagit.Bag(str(replica_path)).is_valid()
+    replicate_to.assert_called_once_with([])
+
+    replica.refresh_from_db()
+    assert replica.checksum == package.checksum
+    assert replica.size == package.size
+    assert replica.stored_date is not None
+    assert replica.current_location.used == package.size - 10
+
+
+@pytest.mark.django_db
+def test_update_replicas_replaces_replicas_that_cannot_be_updated(
+    replicated_bag, package
+):
+    aip, replica = replicated_bag
+    shutil.rmtree(replica.full_path)
+
+    with mock.patch.object(
+        models.Package, "delete_from_storage", return_value=(True, None)
+    ) as delete_from_storage, mock.patch.object(
+        models.Package, "replicate_to"
+    ) as replicate_to:
+        package.update_replicas(str(aip))
+
+    delete_from_storage.assert_called_once()
+    replicate_to.assert_called_once_with([replica.current_location])
+
+
 class TestTransferPackage(TestCase):
     """Test integration of transfer reading and indexing.
 
@@ -1,8 +1,11 @@
 import pathlib
+from unittest import mock
 from uuid import uuid4
 
 import metsrw
+from common import pointer_validation
 from django.test import TestCase
+from django.test import override_settings
 from locations import models
 from metsrw.plugins import premisrw
 
@@ -177,3 +180,61 @@ class TestPackagePointer(TestCase):
             pointer_file.serialize(), schematron=metsrw.AM_PNTR_SCT_PATH
         )
         assert is_valid
+
+    def _create_pointer_file(self):
+        return self.package.create_pointer_file(
+            TEST_PREMIS_OBJECT,
+            [TEST_PREMIS_EVENT],
+            premis_agents=[TEST_PREMIS_AGENT_1, TEST_PREMIS_AGENT_2],
+            validate=False,
+        )
+
+    @mock.patch.object(pointer_validation, "_schematron", None)
+    @mock.patch.dict(pointer_validation._xmlschemas, clear=True)
+    def test_pointer_file_validators_are_compiled_once(self):
+        pointer_file = self._create_pointer_file()
+
+        with mock.patch(
+            "metsrw.get_xmlschema", wraps=metsrw.get_xmlschema
+        ) as get_xmlschema, mock.patch(
+            "metsrw.get_schematron", wraps=metsrw.get_schematron
+        ) as get_schematron:
+            for _ in range(2):
+                is_valid, report = pointer_validation.validate(pointer_file.serialize())
+                assert is_valid, report["report"]
+
+        get_xmlschema.assert_called_once()
+        get_schematron.assert_called_once()
+
+    def test_pointer_file_validation_reports_errors(self):
+        pointer_file = self._create_pointer_file().serialize()
+        for struct_map in pointer_file.findall("mets:structMap", metsrw.NAMESPACES):
+            pointer_file.remove(struct_map)
+
+        is_valid, report = pointer_validation.validate(pointer_file)
+
+        assert not is_valid
+        assert not report["is_xsd_valid"]
+        assert "structMap" in report["report"]
+
+    @override_settings(POINTER_FILE_VALIDATION_IN_BACKGROUND=True)
+    @mock.patch("locations.models.package.LOGGER")
+    def test_create_pointer_file_validates_in_background(self, logger):
+        with mock.patch(
+            "common.pointer_validation.validate",
+            return_value=(False, {"report": ""}),
+        ) as validate, mock.patch("metsrw.report_string", return_value="report"):
+            pointer_file = self.package.create_pointer_file(
+                TEST_PREMIS_OBJECT,
+                [TEST_PREMIS_EVENT],
+                premis_agents=[TEST_PREMIS_AGENT_1, TEST_PREMIS_AGENT_2],
+            )
+            pointer_validation.wait_for_background_validation()
+
+        assert pointer_file is not None
+        validate.assert_called_once()
+        logger.error.assert_called_once_with(
+            "Pointer file constructed for %s is not valid.\n%s",
+            self.package.uuid,
+            "report",
+        )
@@ -0,0 +1,87 @@
+import os
+
+import pytest
+from locations.models import PipelineLocalFS
+from locations.models import Space
+
+
+@pytest.fixture
+def pipeline_local_fs(db, tmp_path, mocker):
+    mocker.patch.object(
+        PipelineLocalFS, "SSH_CONTROL_DIR", str(tmp_path / "ss-ssh-{uid}")
+    )
+    space = Space.objects.create(
+        access_protocol=Space.PIPELINE_LOCAL_FS, path="/", staging_path="/staging"
+    )
+    return PipelineLocalFS.objects.create(
+        space=space,
+        remote_user="archivematica",
+        remote_name="pipeline",
+        ssh_multiplexing=True,
+    )
+
+
+def test_ssh_multiplexing_is_disabled_by_default():
+    assert PipelineLocalFS().ssh_options == []
+
+
+def test_ssh_options_multiplex_connections(pipeline_local_fs, tmp_path):
+    options = pipeline_local_fs.ssh_options
+
+    control_path = [o for o in options if o.startswith("ControlPath=")][0]
+    control_dir = os.path.dirname(control_path.split("=", 1)[1])
+    assert options[:2] == ["-o", "ControlMaster=auto"]
+    assert control_dir == pipeline_local_fs.ssh_control_dir
+    assert control_path == f"ControlPath={tmp_path}/ss-ssh-{os.getuid()}/%C"
+    assert "ControlPersist=10m" in options
+    # Building the options has no side effects.
+    assert not os.path.exists(control_dir)
+
+
+def test_ssh_control_socket_path_fits_unix_socket_limit():
+    control_dir = PipelineLocalFS.SSH_CONTROL_DIR.format(uid=2**32 - 1)
+
+    # ssh binds "<ControlPath>.<16 random characters>" and %C expands to a
+    # 40 character hash. Unix socket paths hold at most 107 characters.
+    assert len(f"{control_dir}/{'x' * 40}.{'x' * 16}") <= 107
+
+
+@pytest.mark.parametrize(
+    "attributes",
+    [{"ssh_multiplexing": False}, {"assume_rsync_daemon": True}],
+    ids=["disabled", "rsync_daemon"],
+)
+def test_ssh_options_are_empty_without_multiplexing(pipeline_local_fs, attributes):
+    for name, value in attributes.items():
+        setattr(pipeline_local_fs, name, value)
+
+    assert pipeline_local_fs.ssh_options == []
+    assert pipeline_local_fs.ssh_control_dir is None
+
+
+def test_move_from_storage_service_uses_multiplexing_and_workers(
+    pipeline_local_fs, mocker
+):
+    create_rsync_directory = mocker.patch(
+        "locations.models.Space.create_rsync_directory"
+    )
+    move_rsync = mocker.patch("locations.models.Space.move_rsync")
+    pipeline_local_fs.rsync_workers = 4
+
+    pipeline_local_fs.move_from_storage_service("/staging/aip/", "/aips/aip/")
+
+    ssh_options = pipeline_local_fs.ssh_options
+    create_rsync_directory.assert_called_once_with(
+        "/aips/aip/", "archivematica", "pipeline", ssh_options=ssh_options
+    )
+    move_rsync.assert_called_once_with(
+        "/staging/aip/",
+        "archivematica@pipeline:/aips/aip/",
+        assume_rsync_daemon=False,
+        rsync_password="",
+        ssh_options=ssh_options,
+        workers=4,
+    )
+    control_dir = pipeline_local_fs.ssh_control_dir
+    assert os.path.isdir(control_dir)
+    assert os.stat(control_dir).st_mode & 0o777 == 0o700
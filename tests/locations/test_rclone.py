@@ -1,3 +1,8 @@
+import http.server
+import json
+import pathlib
+import shutil
+import threading
 import uuid
 
 import pytest
@@ -529,3 +534,272 @@ def test_rclone_browse_no_container(
     else:
         with pytest.raises(models.StorageException):
             rclone_space_no_container.browse("/")
+
+
+def test_rclone_copy_uses_configured_concurrency(mocker, rclone_space, settings):
+    settings.RCLONE_TRANSFERS = 16
+    settings.RCLONE_CHECKERS = 32
+    exec_subprocess = mocker.patch(
+        "locations.models.rclone.RClone._execute_rclone_subcommand"
+    )
+    mocker.patch(
+        "locations.models.rclone.RClone.remote_prefix",
+        return_value="testremote:",
+        new_callable=mocker.PropertyMock,
+    )
+    mocker.patch("locations.models.rclone.RClone._ensure_container_exists")
+
+    rclone_space.move_from_storage_service(
+        UNCOMPRESSED_SRC_PATH, UNCOMPRESSED_DEST_PATH
+    )
+
+    exec_subprocess.assert_called_with(
+        [
+            "copy",
+            UNCOMPRESSED_SRC_PATH,
+            "testremote:testcontainer/path/to/dest/aip",
+            "--transfers=16",
+            "--checkers=32",
+        ]
+    )
+
+
+class StandInRcd(http.server.ThreadingHTTPServer):
+    """Minimal stand-in for the remote control API of ``rclone rcd``.
+
+    The ``testremote:`` remote is backed by a local directory. Jobs finish
+    the second time their status is checked so progress is reported once.
+    """
+
+    def __init__(self, remote_root):
+        super().__init__(("127.0.0.1", 0), StandInRcdHandler)
+        self.remote_root = remote_root
+        self.calls = []
+        self.jobs = {}
+        self.fail_jobs = False
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}/"
+
+    def path(self, fs, remote=""):
+        if fs.startswith("testremote:"):
+            return self.remote_root / fs[len("testremote:") :] / remote
+        return pathlib.Path(fs) / remote
+
+    def run(self, command, params):
+        if command == "config/listremotes":
+            return {"remotes": ["testremote"]}
+        if command == "operations/list":
+            path = self.path(params["fs"], params["remote"])
+            if not path.is_dir():
+                raise FileNotFoundError("directory not found")
+            return {
+                "list": [
+                    {
+                        "Name": entry.name,
+                        "IsDir": entry.is_dir(),
+                        "Size": -1 if entry.is_dir() else entry.stat().st_size,
+                        "ModTime": "2024-01-01T00:00:00Z",
+                        "MimeType": "inode/directory"
+                        if entry.is_dir()
+                        else "text/plain",
+                    }
+                    for entry in path.iterdir()
+                ]
+            }
+        if command == "operations/mkdir":
+            self.path(params["fs"], params["remote"]).mkdir(parents=True)
+            return {}
+        if command == "job/status":
+            job = self.jobs[params["jobid"]]
+            job["checks"] += 1
+            finished = job["checks"] > 1
+            return {
+                "finished": finished,
+                "success": finished and job["error"] is None,
+                "error": job["error"] or "",
+                "output": {},
+            }
+        if command == "core/stats":
+            return {"bytes": 5, "totalBytes": 10, "transfers": 1, "totalTransfers": 2}
+        if params.pop("_async", False):
+            jobid = len(self.jobs) + 1
+            self.jobs[jobid] = {"checks": 0, "error": None}
+            if self.fail_jobs:
+                self.jobs[jobid]["error"] = "permission denied"
+            else:
+                self.run(command, params)
+            return {"jobid": jobid}
+        if command == "operations/copyfile":
+            dest = self.path(params["dstFs"], params["dstRemote"])
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy(self.path(params["srcFs"], params["srcRemote"]), dest)
+            return {}
+        if command == "sync/copy":
+            shutil.copytree(
+                self.path(params["srcFs"]),
+                self.path(params["dstFs"]),
+                dirs_exist_ok=True,
+            )
+            return {}
+        if command == "operations/delete":
+            path = self.path(params["fs"])
+            if path.is_file():
+                raise NotADirectoryError(f"{params['fs']} is a file not a directory")
+            for f in path.rglob("*"):
+                if f.is_file():
+                    f.unlink()
+            return {}
+        if command == "operations/deletefile":
+            self.path(params["fs"], params["remote"]).unlink()
+            return {}
+        raise NotImplementedError(command)
+
+
+class StandInRcdHandler(http.server.BaseHTTPRequestHandler):
+    def do_POST(self):
+        command = self.path.lstrip("/")
+        length = int(self.headers.get("Content-Length", 0))
+        params = json.loads(self.rfile.read(length) or b"{}")
+        self.server.calls.append((command, dict(params)))
+        try:
+            status, output = 200, self.server.run(command, params)
+        except Exception as err:
+            status, output = 500, {"error": str(err)}
+        body = json.dumps(output).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def rcd(tmp_path, settings, mocker):
+    remote_root = tmp_path / "remote"
+    remote_root.mkdir()
+    server = StandInRcd(remote_root)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    settings.RCLONE_RCD_URL = server.url
+    mocker.patch.object(models.RClone, "RCD_POLL_INTERVAL", 0)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_rclone_rcd_browse(rclone_space, rcd):
+    (rcd.remote_root / "testcontainer" / "dir1").mkdir(parents=True)
+    (rcd.remote_root / "testcontainer" / "obj1.txt").write_text("object")
+
+    result = rclone_space.browse("/")
+
+    assert sorted(result["entries"]) == ["dir1", "obj1.txt"]
+    assert result["directories"] == ["dir1"]
+    assert result["properties"]["obj1.txt"]["size"] == 6
+    assert ("operations/list", {"fs": "testremote:testcontainer/", "remote": ""}) in (
+        rcd.calls
+    )
+
+
+def test_rclone_rcd_creates_missing_container(rclone_space, rcd):
+    rclone_space.browse("/")
+
+    assert (rcd.remote_root / "testcontainer").is_dir()
+    assert (
+        "operations/mkdir",
+        {"fs": "testremote:testcontainer", "remote": ""},
+    ) in rcd.calls
+
+
+def test_rclone_rcd_move_from_storage_service_file(
+    rclone_space, rcd, settings, tmp_path
+):
+    settings.RCLONE_TRANSFERS = 16
+    settings.RCLONE_CHECKERS = 32
+    (rcd.remote_root / "testcontainer").mkdir()
+    src = tmp_path / "staging" / "aip.7z"
+    src.parent.mkdir()
+    src.write_text("aip")
+
+    rclone_space.move_from_storage_service(str(src), "/aips/aip.7z")
+
+    assert (rcd.remote_root / "testcontainer" / "aips" / "aip.7z").read_text() == (
+        "aip"
+    )
+    assert (
+        "operations/copyfile",
+        {
+            "srcFs": f"{src.parent}/",
+            "srcRemote": "aip.7z",
+            "dstFs": "testremote:testcontainer/aips/",
+            "dstRemote": "aip.7z",
+            "_async": True,
+            "_config": {"Transfers": 16, "Checkers": 32},
+        },
+    ) in rcd.calls
+    # The job was polled until finished, reporting its progress.
+    commands = [command for command, _ in rcd.calls]
+    assert commands.count("job/status") == 2
+    assert commands.count("core/stats") == 1
+
+
+def test_rclone_rcd_move_to_storage_service_directory(rclone_space, rcd, tmp_path):
+    aip = rcd.remote_root / "testcontainer" / "aips" / "aip"
+    (aip / "data").mkdir(parents=True)
+    (aip / "data" / "file.txt").write_text("file")
+    dest = tmp_path / "staging" / "aip"
+
+    rclone_space.move_to_storage_service("/aips/aip", str(dest), None)
+
+    assert (dest / "data" / "file.txt").read_text() == "file"
+    assert "sync/copy" in [command for command, _ in rcd.calls]
+
+
+def test_rclone_rcd_delete(rclone_space, rcd):
+    aip = rcd.remote_root / "testcontainer" / "aips" / "aip.7z"
+    aip.parent.mkdir(parents=True)
+    aip.write_text("aip")
+
+    rclone_space.delete_path("/aips/aip.7z")
+
+    assert not aip.exists()
+    assert (
+        "operations/deletefile",
+        {"fs": "testremote:testcontainer/aips/", "remote": "aip.7z", "_async": True},
+    ) in rcd.calls
+
+
+def test_rclone_rcd_delete_directory(rclone_space, rcd):
+    aip = rcd.remote_root / "testcontainer" / "aips" / "aip"
+    (aip / "data").mkdir(parents=True)
+    (aip / "data" / "file.txt").write_text("file")
+
+    rclone_space.delete_path("/aips/aip/")
+
+    assert not (aip / "data" / "file.txt").exists()
+    assert (
+        "operations/delete",
+        {"fs": "testremote:testcontainer/aips/aip/", "_async": True},
+    ) in rcd.calls
+
+
+def test_rclone_rcd_failed_job_raises_storage_exception(rclone_space, rcd, tmp_path):
+    (rcd.remote_root / "testcontainer").mkdir()
+    rcd.fail_jobs = True
+    src = tmp_path / "aip.7z"
+    src.write_text("aip")
+
+    with pytest.raises(models.StorageException, match="permission denied"):
+        rclone_space.move_from_storage_service(str(src), "aips/aip.7z")
+
+
+def test_rclone_rcd_unreachable_raises_storage_exception(rclone_space, settings):
+    settings.RCLONE_RCD_URL = "http://127.0.0.1:1/"
+
+    with pytest.raises(models.StorageException, match="Unable to reach rclone rcd"):
+        rclone_space.browse("/")
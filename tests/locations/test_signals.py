@@ -50,6 +50,31 @@ def test_report_failed_fixity_check(_notify_users: mock.Mock):
         ).count()
         == 1
     )
+    package.refresh_from_db()
+    assert package.last_fixity_at == expected_time
+    assert package.last_fixity_success is False
+
+
+@pytest.mark.django_db
+def test_report_not_run_fixity_check_records_latest_fixity_check():
+    package = models.Package.objects.create(
+        current_location=models.Location.objects.create(
+            space=models.Space.objects.create()
+        ),
+        last_fixity_success=True,
+    )
+
+    signals.report_not_run_fixity_check(
+        None,
+        uuid=str(package.uuid),
+        report=json.dumps({"success": None, "message": "Package is not local"}),
+    )
+
+    fixity_log = models.FixityLog.objects.get(package=package.uuid)
+    package.refresh_from_db()
+    assert package.last_fixity_at == fixity_log.datetime_reported
+    assert package.last_fixity_success is None
+    assert package.latest_fixity_check_datetime == fixity_log.datetime_reported
 
 
 @pytest.fixture
@@ -7,6 +7,7 @@ from os import scandir
 import pytest
 from locations.models import LocalFilesystem
 from locations.models import Space
+from locations.models import StorageException
 from locations.models.space import path2browse_dict
 
 
@@ -610,6 +611,162 @@ def test_create_rsync_directory_commands_decode_paths(tmp_path, mocker):
     )
 
 
+def test_move_rsync_command_uses_ssh_options(mocker):
+    popen = mocker.patch(
+        "subprocess.Popen",
+        return_value=mocker.Mock(
+            **{"communicate.return_value": ("command output", None), "returncode": 0}
+        ),
+    )
+    space = Space()
+    space.move_rsync(
+        "user@host:/source_dir",
+        "destination_dir",
+        ssh_options=["-o", "ControlMaster=auto"],
+    )
+
+    command = popen.call_args.args[0]
+    assert command[-4:] == [
+        "--rsh",
+        "ssh -o ControlMaster=auto",
+        "user@host:/source_dir",
+        "destination_dir",
+    ]
+
+
+def test_move_rsync_command_quotes_ssh_options(mocker):
+    popen = mocker.patch(
+        "subprocess.Popen",
+        return_value=mocker.Mock(
+            **{"communicate.return_value": ("command output", None), "returncode": 0}
+        ),
+    )
+    space = Space()
+    space.move_rsync(
+        "user@host:/source_dir",
+        "destination_dir",
+        ssh_options=["-o", "ControlPath=/tmp/ss ssh/%C"],
+    )
+
+    command = popen.call_args.args[0]
+    assert command[-3] == "ssh -o 'ControlPath=/tmp/ss ssh/%C'"
+
+
+def test_rsync_list_files_strips_symlink_targets(mocker):
+    mocker.patch(
+        "subprocess.check_output",
+        return_value=b"""\
+drwxr-xr-x          4,096 2024/01/01 00:00:00 .
+lrwxrwxrwx             11 2024/01/01 00:00:00 link.txt -> objects/a.txt
+-rw-r--r--          1,000 2024/01/01 00:00:00 with -> arrow.txt
+""",
+    )
+
+    assert Space._rsync_list_files("/aip", []) == [
+        ("l", 11, "link.txt"),
+        ("-", 1000, "with -> arrow.txt"),
+    ]
+
+
+RSYNC_RECURSIVE_LISTING = b"""\
+drwxr-xr-x          4,096 2024/01/01 00:00:00 .
+drwxr-xr-x          4,096 2024/01/01 00:00:00 data
+drwxr-xr-x          4,096 2024/01/01 00:00:00 data/empty
+-rw-r--r--      3,000,000 2024/01/01 00:00:00 data/big.bin
+-rw-r--r--      2,000,000 2024/01/01 00:00:00 data/medium.bin
+-rw-r--r--      1,000,000 2024/01/01 00:00:00 data/small.bin
+-rw-r--r--      1,000,000 2024/01/01 00:00:00 bagit.txt
+"""
+
+
+def _mock_rsync_workers(mocker, returncodes):
+    """Mock rsync processes, recording the files each one was given."""
+    files_from = []
+    processes = []
+
+    def popen(command, **kwargs):
+        (path,) = (a for a in command if a.startswith("--files-from="))
+        with open(path.split("=", 1)[1]) as f:
+            files_from.append(f.read().split())
+        process = mocker.Mock(returncode=returncodes[len(processes)])
+        process.communicate.return_value = ("command output", None)
+        process.poll.return_value = None
+        processes.append(process)
+        return process
+
+    mocker.patch("subprocess.check_output", return_value=RSYNC_RECURSIVE_LISTING)
+    popen = mocker.patch("subprocess.Popen", side_effect=popen)
+    return popen, files_from, processes
+
+
+def test_move_rsync_splits_directory_between_workers(mocker):
+    popen, files_from, _ = _mock_rsync_workers(mocker, [0, 0])
+    space = Space()
+
+    space.move_rsync("user@host:/aips/aip", "/staging/", workers=2)
+
+    # The files are balanced by size and directories created by the first one.
+    assert sorted(files_from) == [
+        ["aip/data/big.bin", "aip/bagit.txt"],
+        ["aip/data/medium.bin", "aip/data/small.bin"]
+        + ["aip/data", "aip/data/empty", "aip"],
+    ]
+    for call in popen.call_args_list:
+        assert call.args[0][-2:] == ["user@host:/aips/", "/staging/"]
+
+
+def test_move_rsync_splits_directory_contents_between_workers(mocker):
+    popen, files_from, _ = _mock_rsync_workers(mocker, [0, 0, 0])
+    space = Space()
+
+    space.move_rsync("/staging/aip/", "user@host:/aips/aip/", workers=3)
+
+    assert sorted(f for names in files_from for f in names) == [
+        "bagit.txt",
+        "data",
+        "data/big.bin",
+        "data/empty",
+        "data/medium.bin",
+        "data/small.bin",
+    ]
+    for call in popen.call_args_list:
+        assert call.args[0][-2:] == ["/staging/aip/", "user@host:/aips/aip/"]
+
+
+def test_move_rsync_parallel_failure_stops_workers(mocker):
+    _, _, processes = _mock_rsync_workers(mocker, [0, 23])
+    space = Space()
+
+    with pytest.raises(StorageException, match="Rsync failed with status 23"):
+        space.move_rsync("/staging/aip/", "user@host:/aips/aip/", workers=2)
+
+    for process in processes:
+        process.terminate.assert_called_once()
+
+
+def test_move_rsync_parallel_falls_back_for_files(mocker):
+    mocker.patch(
+        "subprocess.check_output",
+        side_effect=subprocess.CalledProcessError(23, "rsync"),
+    )
+    popen = mocker.patch(
+        "subprocess.Popen",
+        return_value=mocker.Mock(
+            **{"communicate.return_value": ("command output", None), "returncode": 0}
+        ),
+    )
+    space = Space()
+
+    space.move_rsync("/staging/aip.7z", "user@host:/aips/aip.7z", workers=4)
+
+    popen.assert_called_once()
+    assert popen.call_args.args[0][-3:] == [
+        "-r",
+        "/staging/aip.7z",
+        "user@host:/aips/aip.7z",
+    ]
+
+
 @pytest.mark.django_db
 def test_delete_path_logs_deletion_attempt_error(tmp_path, caplog):
     space_dir = tmp_path / "dir"
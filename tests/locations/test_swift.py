@@ -1,3 +1,5 @@
+import hashlib
+import json
 import os
 import pathlib
 from unittest import mock
@@ -12,6 +14,12 @@ from . import TempDirMixin
 FIXTURES_DIR = pathlib.Path(__file__).parent / "fixtures"
 
 
+def _put_object(container, obj, contents, content_length=None, **kwargs):
+    """Consume the uploaded contents and return their MD5 like Swift does."""
+    data = contents.read() if hasattr(contents, "read") else contents.encode()
+    return hashlib.md5(data).hexdigest()
+
+
 class TestSwift(TempDirMixin, TestCase):
     fixture_files = ["base.json", "swift.json"]
     fixtures = [FIXTURES_DIR / f for f in fixture_files]
@@ -156,7 +164,7 @@ class TestSwift(TempDirMixin, TestCase):
         )
 
     @mock.patch(
-        "swiftclient.client.Connection.get_object", side_effect=[({}, b"%percent\n")]
+        "swiftclient.client.Connection.get_object", side_effect=[({}, [b"%percent\n"])]
     )
     def test_move_to_ss(self, _get_object):
         test_file = self.tmpdir / "test" / "%percent.txt"
@@ -196,8 +204,8 @@ class TestSwift(TempDirMixin, TestCase):
         "swiftclient.client.Connection.get_object",
         side_effect=[
             swiftclient.exceptions.ClientException("error"),
-            ({}, b"data\n"),
-            ({}, b"test file\n"),
+            ({}, [b"data\n"]),
+            ({}, [b"test file\n"]),
         ],
     )
     @mock.patch(
@@ -242,7 +250,7 @@ class TestSwift(TempDirMixin, TestCase):
     @mock.patch(
         "swiftclient.client.Connection.get_object",
         side_effect=[
-            ({"etag": "badbadbadbadbadbadbadbadbadbadbadbad"}, b"%percent\n"),
+            ({"etag": "badbadbadbadbadbadbadbadbadbadbadbad"}, [b"%percent\n"]),
         ],
     )
     def test_move_to_ss_bad_etag(self, _get_object):
@@ -256,7 +264,7 @@ class TestSwift(TempDirMixin, TestCase):
                 None,
             )
 
-    @mock.patch("swiftclient.client.Connection.put_object")
+    @mock.patch("swiftclient.client.Connection.put_object", side_effect=_put_object)
     @mock.patch(
         "swiftclient.client.Connection.get_container",
         side_effect=[
@@ -283,8 +291,11 @@ class TestSwift(TempDirMixin, TestCase):
             )
         ],
     )
+    @mock.patch("swiftclient.client.Connection.head_object", return_value={})
     @mock.patch("swiftclient.client.Connection.delete_object")
-    def test_move_from_ss(self, _delete_object, _get_container, _put_object):
+    def test_move_from_ss(
+        self, _delete_object, _head_object, _get_container, _put_object
+    ):
         # create test.txt
         test_file = self.tmpdir / "test.txt"
         test_file.open("w").write("test file\n")
@@ -339,8 +350,9 @@ class TestSwift(TempDirMixin, TestCase):
             ),
         ],
     )
+    @mock.patch("swiftclient.client.Connection.head_object", return_value={})
     @mock.patch("swiftclient.client.Connection.delete_object")
-    def test_delete_path(self, _delete_object, _get_container):
+    def test_delete_path(self, _delete_object, _head_object, _get_container):
         # Setup
         test_file = "transfers/SampleTransfers/test.txt"
         resp = self.swift_object.browse("transfers/SampleTransfers/")
@@ -397,8 +409,12 @@ class TestSwift(TempDirMixin, TestCase):
             ),
         ],
     )
+    @mock.patch(
+        "swiftclient.client.Connection.head_object",
+        side_effect=[swiftclient.exceptions.ClientException("error"), {}],
+    )
     @mock.patch("swiftclient.client.Connection.delete_object")
-    def test_delete_folder(self, _delete_object, _get_container):
+    def test_delete_folder(self, _delete_object, _head_object, _get_container):
         # Check that exists already
         test_file = "transfers/SampleTransfers/test/"
         resp = self.swift_object.browse("transfers/SampleTransfers/")
@@ -408,3 +424,166 @@ class TestSwift(TempDirMixin, TestCase):
         # Verify deleted
         resp = self.swift_object.browse("transfers/SampleTransfers/")
         assert "test" not in resp["directories"]
+
+    @mock.patch(
+        "swiftclient.client.Connection.head_object",
+        return_value={"x-static-large-object": "True"},
+    )
+    @mock.patch("swiftclient.client.Connection.delete_object")
+    def test_delete_large_object_deletes_segments(self, _delete_object, _head_object):
+        self.swift_object.delete_path("aips/large.7z")
+
+        _delete_object.assert_called_once_with(
+            "artefactual", "aips/large.7z", query_string="multipart-manifest=delete"
+        )
+
+    @mock.patch(
+        "swiftclient.client.Connection.get_object",
+        return_value=(
+            {"etag": hashlib.md5(b"first chunk\nsecond chunk\n").hexdigest()},
+            [b"first chunk\n", b"second chunk\n"],
+        ),
+    )
+    def test_move_to_ss_streams_chunks(self, _get_object):
+        test_file = self.tmpdir / "test" / "chunks.txt"
+
+        self.swift_object.move_to_storage_service(
+            "transfers/chunks.txt", str(test_file), None
+        )
+
+        assert test_file.read_bytes() == b"first chunk\nsecond chunk\n"
+        assert _get_object.call_args.kwargs["resp_chunk_size"]
+
+    @mock.patch(
+        "swiftclient.client.Connection.get_object",
+        return_value=(
+            {"etag": '"not-the-md5-of-the-content"', "x-static-large-object": "True"},
+            [b"segment 1\n", b"segment 2\n"],
+        ),
+    )
+    def test_move_to_ss_large_object_skips_etag(self, _get_object):
+        test_file = self.tmpdir / "test" / "large.7z"
+
+        self.swift_object.move_to_storage_service("aips/large.7z", str(test_file), None)
+
+        assert test_file.read_bytes() == b"segment 1\nsegment 2\n"
+
+    @mock.patch("time.sleep")
+    @mock.patch("swiftclient.client.Connection.put_object", return_value="bad")
+    def test_move_from_ss_bad_etag(self, _put_object, _sleep):
+        test_file = self.tmpdir / "test.txt"
+        test_file.write_text("test file\n")
+
+        with pytest.raises(models.StorageException):
+            self.swift_object.move_from_storage_service(
+                str(test_file), "transfers/SampleTransfers/test.txt"
+            )
+        assert _put_object.call_count == models.swift.UPLOAD_ATTEMPTS
+
+    @mock.patch("swiftclient.client.Connection.put_container")
+    @mock.patch("swiftclient.client.Connection.put_object", side_effect=_put_object)
+    def test_move_from_ss_large_file(self, _put_object, _put_container):
+        test_file = self.tmpdir / "large.7z"
+        test_file.write_bytes(b"0123456789" * 2 + b"01234")
+
+        with self.settings(SWIFT_SEGMENT_SIZE=10, SWIFT_UPLOAD_THREADS=2):
+            self.swift_object.move_from_storage_service(str(test_file), "aips/large.7z")
+
+        _put_container.assert_called_once_with("artefactual_segments")
+        segment_calls = [
+            c for c in _put_object.call_args_list if c.args[0] == "artefactual_segments"
+        ]
+        assert sorted(c.kwargs["content_length"] for c in segment_calls) == [5, 10, 10]
+        manifest_call = _put_object.call_args_list[-1]
+        assert manifest_call.args[0] == "artefactual"
+        assert manifest_call.kwargs["obj"] == "aips/large.7z"
+        assert manifest_call.kwargs["query_string"] == "multipart-manifest=put"
+        manifest = json.loads(manifest_call.kwargs["contents"])
+        assert [segment["size_bytes"] for segment in manifest] == [10, 10, 5]
+        assert [segment["etag"] for segment in manifest] == [
+            hashlib.md5(b"0123456789").hexdigest(),
+            hashlib.md5(b"0123456789").hexdigest(),
+            hashlib.md5(b"01234").hexdigest(),
+        ]
+        assert all(
+            segment["path"].startswith("/artefactual_segments/aips/large.7z/")
+            for segment in manifest
+        )
+
+    @mock.patch("time.sleep")
+    @mock.patch("swiftclient.client.Connection.delete_object")
+    @mock.patch("swiftclient.client.Connection.put_container")
+    @mock.patch("swiftclient.client.Connection.put_object")
+    def test_move_from_ss_large_file_deletes_segments_on_failure(
+        self, _put, _put_container, _delete_object, _sleep
+    ):
+        test_file = self.tmpdir / "large.7z"
+        test_file.write_bytes(b"0123456789" * 2 + b"01234")
+
+        def flaky_put_object(container, obj, contents, **kwargs):
+            if obj.endswith("/00000001"):
+                raise swiftclient.exceptions.ClientException("timeout")
+            return _put_object(container, obj, contents, **kwargs)
+
+        _put.side_effect = flaky_put_object
+
+        with self.settings(SWIFT_SEGMENT_SIZE=10, SWIFT_UPLOAD_THREADS=1):
+            with pytest.raises(swiftclient.exceptions.ClientException):
+                self.swift_object.move_from_storage_service(
+                    str(test_file), "aips/large.7z"
+                )
+
+        uploaded = [
+            c.kwargs["obj"]
+            for c in _put.call_args_list
+            if not c.kwargs["obj"].endswith("/00000001")
+        ]
+        deleted = [c.args[1] for c in _delete_object.call_args_list]
+        assert uploaded
+        assert sorted(deleted) == sorted(uploaded)
+        assert all(
+            c.args[0] == "artefactual_segments" for c in _delete_object.call_args_list
+        )
+
+    @mock.patch("swiftclient.client.Connection.put_object", side_effect=_put_object)
+    def test_move_from_ss_folder_uploads_concurrently(self, _put_object):
+        source = self.tmpdir / "aip"
+        (source / "data" / "objects").mkdir(parents=True)
+        for i in range(10):
+            (source / "data" / "objects" / f"file{i}.txt").write_text(f"file {i}\n")
+        (source / "bagit.txt").write_text("BagIt-Version: 0.97\n")
+
+        with self.settings(SWIFT_UPLOAD_THREADS=4):
+            self.swift_object.move_from_storage_service(f"{source}/", "aips/aip/")
+
+        uploaded = sorted(c.kwargs["obj"] for c in _put_object.call_args_list)
+        assert uploaded == ["aips/aip/bagit.txt"] + sorted(
+            f"aips/aip/data/objects/file{i}.txt" for i in range(10)
+        )
+
+    @mock.patch("time.sleep")
+    @mock.patch("swiftclient.client.Connection.put_object")
+    def test_move_from_ss_folder_retries_failed_file_only(self, _put, _sleep):
+        source = self.tmpdir / "aip"
+        source.mkdir()
+        (source / "a.txt").write_text("a\n")
+        (source / "b.txt").write_text("b\n")
+        failures = []
+
+        def flaky_put_object(container, obj, contents, **kwargs):
+            if obj.endswith("a.txt") and not failures:
+                failures.append(obj)
+                raise swiftclient.exceptions.ClientException("timeout")
+            return _put_object(container, obj, contents, **kwargs)
+
+        _put.side_effect = flaky_put_object
+
+        self.swift_object.move_from_storage_service(f"{source}/", "aips/aip/")
+
+        uploaded = [c.kwargs["obj"] for c in _put.call_args_list]
+        assert sorted(uploaded) == [
+            "aips/aip/a.txt",
+            "aips/aip/a.txt",
+            "aips/aip/b.txt",
+        ]
+        _sleep.assert_called_once()